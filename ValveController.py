@@ -118,20 +118,38 @@ class ValveApp:
             self.valve_text_map[v] = self.canvas.create_text(cx, cy+r+45, text="Idle", font=("Arial", 8), width=180)
 
     def moveValve(self, v, p_port):
-        """Moves valve, restores red highlight, and logs full description."""
-        p_port = str(p_port)
-        if p_port.endswith('.0'): p_port = p_port[:-2]
-        
-        info = self.port_data.get((v, p_port))
-        if not info: return
+        """Moves a single valve (see moveValves)."""
+        self.moveValves([(v, p_port)])
+
+    def moveValves(self, moves):
+        """Moves several valves together, waits for the slowest one, then restores red highlights and logs descriptions."""
+        targets = {}
+        for v, p_port in moves:
+            p_port = str(p_port)
+            if p_port.endswith('.0'): p_port = p_port[:-2]
+            info = self.port_data.get((v, p_port))
+            if not info: continue
+            targets[v] = (p_port, info)
+            self.canvas.itemconfig(self.valve_shapes[v], fill="yellow")
+        if not targets: return
 
-        self.canvas.itemconfig(self.valve_shapes[v], fill="yellow")
-        
         if self.hardware_enabled:
-            self.vc.setValvePort(v, info['py_port'])
+            handle = self.vc.setValvePorts({v: info['py_port'] for v, (_, info) in targets.items()})
+            try:
+                handle.wait()
+            except Exception as e:
+                self.log(f"ERROR during valve transition: {e}")
+                return
+            if handle.durations:
+                timings = ", ".join(f"{v} {t:.2f}s" for v, t in handle.durations.items())
+                self.log(f"Transition done in {handle.elapsed:.2f}s ({timings})")
         else:
             time.sleep(0.1)
 
+        for v, (p_port, info) in targets.items():
+            self.showValvePort(v, p_port, info)
+
+    def showValvePort(self, v, p_port, info):
         # Update Highlighting
         for (vid, pid), tid in self.port_ids.items():
             if vid == v:
@@ -267,20 +285,18 @@ class ValveApp:
                 self.pulse_ttl() # or self.vc.pulse_ttl() depending on where you put the method
                 self.log("TTL Trigger Branch Executed")
             
-            # If it's a valve move, iterate ONLY the valves in THIS preset
+            # If it's a valve move, move ONLY the valves in THIS preset, all together (returns once they have arrived)
             if isinstance(preset_data, list):
-                for v_label, _, p_port in preset_data:
-                    # Call YOUR moveValve which calls YOUR setValvePort independently
-                    self.moveValve(v_label, p_port)
+                self.moveValves([(v_label, p_port) for v_label, _, p_port in preset_data])
             
-            # Wait for the duration defined for this specific step
+            # Wait for the duration defined for this specific step, counted from the valves' arrival
             time.sleep(dur)
 
     def run_preset_data(self, name):
         data = self.presets.get(name)
         if isinstance(data, list) and len(data) > 0:
             if isinstance(data[0], list):
-                for v, _, p in data: threading.Thread(target=self.moveValve, args=(v, p), daemon=True).start()
+                threading.Thread(target=self.moveValves, args=([(v, p) for v, _, p in data],), daemon=True).start()
             else:
                 for s in data: self.run_preset_data(s['name']); time.sleep(float(s['time']))
 
@@ -406,4 +422,14 @@ class ValveApp:
             self.log("TTL Pulse Executed.")
 
 if __name__ == "__main__":
-    root = tk.Tk(); app = ValveApp(root); root.mainloop()
\ No newline at end of file
+    import sys
+    simulator = None
+    if "--simulate" in sys.argv:
+        # Virtual valves (pseudo-terminals) built from valve_config.json, so the full stack runs without hardware
+        from amfTools.simulator import AMFSimulator
+        simulator = AMFSimulator.fromConfig("valve_config.json")
+        simulator.start(); simulator.install()
+    try:
+        root = tk.Tk(); app = ValveApp(root); root.mainloop()
+    finally:
+        if simulator: simulator.stop()
\ No newline at end of file
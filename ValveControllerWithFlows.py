@@ -161,9 +161,30 @@ class ValveApp:
         if not info: return
 
         self.canvas.itemconfig(self.valve_shapes[v], fill="yellow")
-        if self.hardware_enabled: threading.Thread(target=lambda: self.vc.setValvePort(v, info['py_port']), daemon=True).start()
+        if self.hardware_enabled:
+            try: self.vc.setValvePort(v, info['py_port']).wait()  # returns once the valve has arrived
+            except Exception as e: self.log(f"ERROR moving valve {v}: {e}"); return
         else: time.sleep(0.05)
+        self.showValvePort(v, p_port, info)
 
+    def moveValves(self, moves):
+        """Moves the valves of a preset together (one setValvePorts barrier), then paints them once they have all arrived."""
+        targets = {}
+        for v, p_port in moves:
+            p_port = str(p_port).split('.')[0] if '.' in str(p_port) and str(p_port).endswith('.0') else str(p_port)
+            info = self.port_data.get((v, p_port))
+            if not info: continue
+            targets[v] = (p_port, info)
+            self.canvas.itemconfig(self.valve_shapes[v], fill="yellow")
+        if not targets: return
+
+        if self.hardware_enabled:
+            try: self.vc.setValvePorts({v: info['py_port'] for v, (_, info) in targets.items()}).wait()
+            except Exception as e: self.log(f"ERROR during valve transition: {e}"); return
+        else: time.sleep(0.05)
+        for v, (p_port, info) in targets.items(): self.showValvePort(v, p_port, info)
+
+    def showValvePort(self, v, p_port, info):
         for (vid, pid), tid in self.port_ids.items():
             if vid == v: self.canvas.itemconfig(tid, fill="#ccc" if ".5" in pid else "black")
         
@@ -242,7 +263,7 @@ class ValveApp:
         data = self.presets.get(name)
         if isinstance(data, list) and len(data) > 0:
             if isinstance(data[0], list):
-                for v, _, p in data: self.moveValve(v, p)
+                self.moveValves([(v, p) for v, _, p in data])
             else:
                 for s in data: self.run_preset_data(s['name']); time.sleep(float(s['time']))
     def load_library(self):
@@ -18,10 +18,13 @@ __credits__ = 'Advanced Microfluidics S.A.'
 
 import time
 import os
+import json
 import serial
 import serial.tools.list_ports
 import re
 import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # If Windows OS
 if os.name == 'nt':
@@ -43,6 +46,815 @@ class Device:
         else:
             return f"Device {self.deviceType} on port {self.comPort} with serial number {self.serialnumber} and connected by {self.connectionMode}"
 
+    def toDict(self) -> dict:
+        return {"serialnumber": self.serialnumber, "comPort": self.comPort, "deviceType": self.deviceType,
+                "deviceFamily": self.deviceFamily, "connectionMode": self.connectionMode, "productAddress": self.productAddress}
+
+    @staticmethod
+    def fromDict(values: dict) -> "Device":
+        dev = Device()
+        for key in ("serialnumber", "comPort", "deviceType", "deviceFamily", "connectionMode", "productAddress"):
+            if key in values:
+                setattr(dev, key, values[key])
+        return dev
+
+
+class MoveTimeModel:
+    """
+        Move-duration model of one valve, calibrated from observed moves.
+        For each (number of ports, speed mode) the duration is fitted as: base + perPosition * distance
+        """
+    MIN_SAMPLES = 3     # Samples needed before a prediction is made
+    MAX_SAMPLES = 100   # Samples kept per (number of ports, speed mode), oldest are dropped
+
+    def __init__(self) -> None:
+        self.samples = {}   # (portnumber, speedMode) -> deque of (distance, duration)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def distance(start: int, target: int, portnumber: int, mode: int = 0, enforced: bool = False) -> int:
+        """
+        Number of positions crossed by a move (mode 0: shortest path, 1: incremental, 2: decremental)
+        """
+        clockwise = (target - start) % portnumber
+        counter = (start - target) % portnumber
+        if mode == 1:
+            dist = clockwise
+        elif mode == 2:
+            dist = counter
+        else:
+            dist = min(clockwise, counter)
+        if dist == 0 and enforced:
+            dist = portnumber
+        return dist
+
+    def record(self, distance: int, portnumber: int, speedMode: str, duration: float) -> None:
+        with self.lock:
+            key = (portnumber, speedMode)
+            if key not in self.samples:
+                self.samples[key] = deque(maxlen=self.MAX_SAMPLES)
+            self.samples[key].append((distance, duration))
+
+    def predict(self, distance: int, portnumber: int, speedMode: str) -> float:
+        """
+        Predicted duration in s, or None if the model is not calibrated yet for this configuration
+        """
+        if distance == 0:
+            return 0.0
+        with self.lock:
+            samples = list(self.samples.get((portnumber, speedMode), ()))
+        if len(samples) < self.MIN_SAMPLES:
+            return None
+
+        n = len(samples)
+        mean_d = sum(d for d, _ in samples) / n
+        mean_t = sum(t for _, t in samples) / n
+        var_d = sum((d - mean_d)**2 for d, _ in samples)
+        if var_d > 0:
+            # Least squares fit over the observed distances
+            slope = sum((d - mean_d)*(t - mean_t) for d, t in samples) / var_d
+            base = mean_t - slope*mean_d
+        elif distance == mean_d:
+            # Only one distance observed so far: we can only predict that same distance
+            return mean_t
+        else:
+            return None
+        return max(0.0, base + slope*distance)
+
+
+class Response:
+    """
+        One product answer "/0<status><data><ETX><CR>", kept as the bytes received.
+        The status and an integer payload are read directly from the bytes, strings are only built on demand.
+        """
+    __slots__ = ('frame', 'start', 'end')
+    INTEGER = re.compile(rb"-?\d+")
+
+    def __init__(self, frame: bytes) -> None:
+        self.frame = frame
+        start = frame.find(b"/0")
+        self.start = start + 2 if start >= 0 else 0     # Index of the status byte
+        end = frame.find(b"\x03", self.start)
+        self.end = end if end >= 0 else len(frame.rstrip(b"\r\n"))   # End of the data
+
+    @property
+    def status(self) -> int:
+        return self.frame[self.start] if self.end > self.start else None
+
+    @property
+    def statusChar(self) -> str:
+        return chr(self.frame[self.start]) if self.end > self.start else ""
+
+    @property
+    def ready(self) -> bool:
+        return self.status is not None and bool(self.status & 0x20)
+
+    @property
+    def framed(self) -> bool:
+        """ True if the answer has its "/0" header, status byte and <ETX> """
+        return self.frame.startswith(b"/0") and self.frame.find(b"\x03", self.start) > self.start
+
+    @property
+    def errorCode(self) -> int:
+        return self.status & 0x0F if self.status is not None else None
+
+    @property
+    def data(self) -> str:
+        """ Data without the status byte """
+        return self.frame[self.start + 1:self.end].decode("ascii", errors="ignore")
+
+    @property
+    def text(self) -> str:
+        """ Status byte and data """
+        return self.frame[self.start:self.end].decode("ascii", errors="ignore")
+
+    @property
+    def raw(self) -> str:
+        """ Answer as received """
+        return self.frame.decode("ascii", errors="ignore")
+
+    @property
+    def integer(self) -> int:
+        """ First integer of the answer """
+        match = self.INTEGER.search(self.frame, self.start, self.end)
+        if match is None:
+            raise ValueError(f"No numeric value found in response: '{self.text}'")
+        return int(match.group())
+
+    def __repr__(self) -> str:
+        return f"Response({self.frame!r})"
+
+
+class FrameReader:
+    """
+        Buffered reader of the product answers on one serial connection.
+        The bytes are accumulated in a reusable buffer and each complete frame is returned as soon as its <CR> arrives.
+
+        INPUTS:
+            serialObj: serial.Serial - Open serial connection
+            size: int - Initial size of the buffer (it grows if needed)
+        """
+    def __init__(self, serialObj, size: int = 256) -> None:
+        self.serial = serialObj
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.length = 0     # Number of bytes held in the buffer
+        self.firstByteTime = None   # time.monotonic() at which the first byte after an empty buffer was read
+
+    def reset(self) -> None:
+        """
+        Drop everything received so far (call before sending a command)
+        """
+        self.length = 0
+        self.serial.reset_input_buffer()
+
+    def readFrame(self, timeout: float) -> Response:
+        """
+        Next answer frame, or None if no complete frame arrived within timeout (s)
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            frame = self.extract()
+            if frame is not None:
+                return frame
+            if time.monotonic() >= deadline:
+                return None
+            # Blocks until at least one byte arrives (or the serial timeout), then takes everything already received
+            chunk = self.serial.read(self.serial.in_waiting or 1)
+            if chunk:
+                self.append(chunk)
+
+    def append(self, chunk: bytes) -> None:
+        if not self.length:
+            self.firstByteTime = time.monotonic()
+        size = len(chunk)
+        if self.length + size > len(self.buffer):
+            self.view.release()
+            self.buffer.extend(bytes(max(self.length + size - len(self.buffer), len(self.buffer))))
+            self.view = memoryview(self.buffer)
+        self.view[self.length:self.length + size] = chunk
+        self.length += size
+
+    def extract(self) -> Response:
+        """
+        Remove the first complete frame from the buffer and return it, None if there is none yet
+        """
+        end = self.buffer.find(b"\r", 0, self.length)
+        if end < 0:
+            return None
+        start = self.buffer.find(b"/", 0, end)
+        frame = Response(bytes(self.view[max(start, 0):end + 1]))
+        consumed = end + 1
+        if consumed < self.length and self.buffer[consumed] == 0x0A:    # <LF> ending the frame
+            consumed += 1
+        remaining = self.length - consumed
+        if remaining:
+            self.view[:remaining] = self.view[consumed:self.length]
+        self.length = remaining
+        return frame
+
+
+class AnswerReader:
+    """
+        Background reader of a product in asynchronous answer mode (answer modes 1 and 2, see AMF.setAnswerMode).
+
+        In these modes the product answers each command immediately, then sends one more frame, unrequested, when an
+        executed command string is done (mode 2 adds the number of sub-commands it processed). The reader thread owns
+        the serial input: it hands the immediate answers to the waiting send() calls in order, and resolves the
+        completion Future of the command string in progress with the unrequested frame.
+        A ready frame received while a string is in progress is its completion: the answers to the queries sent
+        meanwhile report busy until the completion has been sent.
+
+        INPUTS:
+            amf: AMF - Connected product, the only one using its serial port
+        """
+    READ_TIMEOUT = 0.1  # Serial timeout of the reader thread, in s (how fast it notices stop())
+
+    def __init__(self, amf: "AMF") -> None:
+        self.amf = amf
+        self.serial = amf.productserial
+        self.frameReader = FrameReader(self.serial)
+        self.lock = threading.RLock()
+        self.waiters = deque()      # [Future of the immediate answer, completion record or None], in send order
+        self.completion = None      # Command string in progress: {'future', 'command', 'expected'}
+        self.lastCompletionTime = None  # time.monotonic() at which the last completion frame was received
+        self.unsolicited = 0        # Frames that matched no command
+        self.previousTimeout = self.serial.timeout
+        self.serial.timeout = self.READ_TIMEOUT
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True, name=f"AnswerReader {amf.serialPort}")
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+        self.serial.timeout = self.previousTimeout
+        with self.lock:
+            while self.waiters:
+                self.waiters.popleft()[0].cancel()
+            self.interrupt("Asynchronous answer mode stopped")
+
+    @staticmethod
+    def subcommandCount(body: str) -> int:
+        """
+        Number of sub-commands reported in mode 2 for a command string (None if it loops: depends on the repeats)
+        """
+        if 'g' in body or 'G' in body:
+            return None
+        return len(re.findall(r"[A-Za-z+\-?]", body[:-1]))
+
+    def expect(self, command: str) -> list:
+        """
+        Register the wait for the answer of a command before writing it. Executed strings (ending with R) also get a
+        completion record, installed when the product accepts them.
+        """
+        body = command[len(self.amf.FIRST_CHAR) + 1:].rstrip(self.amf.LAST_CHAR)
+        record = None
+        if body.endswith('R') and body != 'R' and body[0] not in self.amf.CONFIGURATION_COMMANDS:
+            record = {'future': Future(), 'command': body, 'expected': self.subcommandCount(body)}
+        waiter = [Future(), record]
+        with self.lock:
+            if body == 'T':
+                self.interrupt(f"Command interrupted by a hard stop on port {self.amf.serialPort}")
+            self.waiters.append(waiter)
+        return waiter
+
+    def wait(self, waiter: list, timeout: float) -> Response:
+        """
+        Immediate answer of the command (None if none in time)
+        """
+        try:
+            return waiter[0].result(timeout)
+        except Exception:
+            with self.lock:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+            return None
+
+    def interrupt(self, reason: str) -> None:
+        # Caller holds self.lock
+        completion, self.completion = self.completion, None
+        if completion is not None and not completion['future'].done():
+            completion['future'].set_exception(RuntimeError(reason))
+
+    def _run(self) -> None:
+        while self.running:
+            try:
+                frame = self.frameReader.readFrame(self.READ_TIMEOUT)
+            except Exception as e:
+                with self.lock:
+                    self.interrupt(f"Serial port {self.amf.serialPort} failed: {e}")
+                return
+            if frame is None:
+                continue
+            arrival = time.monotonic()
+            completion = waiter = None
+            with self.lock:
+                head = self.waiters[0] if self.waiters else None
+                if self.completion is not None and frame.ready and (head is None or head[1] is None):
+                    completion, self.completion = self.completion, None
+                    self.lastCompletionTime = arrival
+                elif head is not None:
+                    waiter = self.waiters.popleft()
+                    if waiter[1] is not None and frame.errorCode == 0:
+                        self.interrupt(f"Superseded by {waiter[1]['command']}")
+                        self.completion = waiter[1]
+                else:
+                    self.unsolicited += 1
+            # Futures are resolved out of the lock: their callbacks may send commands (not from this thread though)
+            if completion is not None:
+                self._complete(completion, frame)
+            elif waiter is not None:
+                waiter[0].set_result(frame)
+
+    def _complete(self, completion: dict, frame: Response) -> None:
+        busy, error = StatusPoller.decodeStatusByte(frame.text, self.amf.ERROR_CODES)
+        if error:
+            completion['future'].set_exception(Exception(error))
+            return
+        if self.amf.answerMode == 2 and completion['expected'] is not None and frame.data:
+            processed = frame.integer
+            if processed != completion['expected']:
+                completion['future'].set_exception(RuntimeError(
+                    f"{completion['command']} stopped after {processed} of {completion['expected']} sub-commands"))
+                return
+        completion['future'].set_result(frame)
+
+
+class CommandSequence:
+    """
+        Builder of a compound command run by the product itself, e.g. "b3M500g b5M200b6 G3R".
+        Moves, delays and loops are sent in one write, so their timing does not depend on the host or on the serial latency.
+
+        INPUTS:
+            portnumber: int - Number of ports of the valve, to validate the move targets (None: not checked)
+
+        seq = amf.sequence().shortestPath(3).delay(500).beginLoop().shortestPath(5).shortestPath(6).endLoop(3)
+        amf.runSequence(seq)
+        """
+    MAX_LENGTH = 512        # Max length of a command string accepted by the product (with its final R)
+    MAX_LOOP_DEPTH = 10     # Max nesting of g/G loops
+    MOVES = {(0, False): 'b', (0, True): 'B', (1, False): 'i', (1, True): 'I', (2, False): 'o', (2, True): 'O'}
+
+    def __init__(self, portnumber: int = None) -> None:
+        self.portnumber = portnumber
+        self.tokens = []    # (op, argument) in execution order
+        self.depth = 0      # Loops currently open
+        self.length = 1     # Characters of the command, with its final R
+
+    def append(self, op: str, argument: int = None) -> "CommandSequence":
+        token = op + ("" if argument is None else str(argument))
+        if self.length + len(token) > self.MAX_LENGTH:
+            raise ValueError(f"Command sequence longer than {self.MAX_LENGTH} characters")
+        self.tokens.append((op, argument))
+        self.length += len(token)
+        return self
+
+    def move(self, target: int, mode: int = 0, enforced: bool = False) -> "CommandSequence":
+        """
+        Move the valve to the target port (mode 0: ShortestPath, 1: IncrementalMove, 2: DecrementalMove)
+        """
+        if mode not in (0, 1, 2):
+            raise ValueError("Mode must be between 0 and 2")
+        if target < 1 or (self.portnumber is not None and target > self.portnumber):
+            raise ValueError("Target must be between 1 and "+str(self.portnumber))
+        return self.append(self.MOVES[(mode, bool(enforced))], int(target))
+
+    def shortestPath(self, target: int, enforced: bool = False) -> "CommandSequence":
+        return self.move(target, 0, enforced)
+
+    def incrementalMove(self, target: int, enforced: bool = False) -> "CommandSequence":
+        return self.move(target, 1, enforced)
+
+    def decrementalMove(self, target: int, enforced: bool = False) -> "CommandSequence":
+        return self.move(target, 2, enforced)
+
+    def delay(self, delay: int) -> "CommandSequence":
+        """
+        Wait on the product for some time in ms [0; +inf]
+        """
+        if delay < 0:
+            raise ValueError("Delay must be positive")
+        return self.append('M', int(delay))
+
+    def beginLoop(self) -> "CommandSequence":
+        if self.depth >= self.MAX_LOOP_DEPTH:
+            raise ValueError(f"Loops cannot be nested more than {self.MAX_LOOP_DEPTH} times")
+        self.depth += 1
+        return self.append('g')
+
+    def endLoop(self, count: int = 0) -> "CommandSequence":
+        """
+        Close the last loop, its content is run count times (0: until the product is stopped)
+        """
+        if self.depth == 0:
+            raise ValueError("No loop to close")
+        if count < 0:
+            raise ValueError("Loop count must be positive")
+        self.depth -= 1
+        return self.append('G', int(count))
+
+    def build(self) -> str:
+        """
+        Command string, without the address, e.g. "b3M500R"
+        """
+        if self.depth:
+            raise ValueError(f"{self.depth} loop(s) not closed")
+        if not self.tokens:
+            raise ValueError("Empty command sequence")
+        return "".join(op + ("" if argument is None else str(argument)) for op, argument in self.tokens) + "R"
+
+    def finalTarget(self) -> int:
+        """
+        Port reached at the end of the sequence (None if it makes no move)
+        """
+        for op, argument in reversed(self.tokens):
+            if op in "bBiIoO":
+                return argument
+        return None
+
+    def predictDuration(self, start: int, portnumber: int, model: MoveTimeModel, speedMode: str) -> float:
+        """
+        Predicted duration in s from the move time model, None if a move cannot be predicted yet or a loop never ends
+        """
+        duration = 0.0
+        position = start
+        loops = []      # [index after g, repeats left]
+        pc = 0
+        steps = 0
+        while pc < len(self.tokens):
+            op, argument = self.tokens[pc]
+            pc += 1
+            steps += 1
+            if steps > 100000:
+                return None
+            if op == 'g':
+                loops.append([pc, None])
+            elif op == 'G':
+                if argument == 0:
+                    return None
+                loop = loops[-1]
+                if loop[1] is None:
+                    loop[1] = argument - 1
+                if loop[1] > 0:
+                    loop[1] -= 1
+                    pc = loop[0]
+                else:
+                    loops.pop()
+            elif op == 'M':
+                duration += argument / 1000
+            else:
+                if not position or not portnumber:
+                    return None
+                mode = "bio".index(op.lower())
+                predicted = model.predict(MoveTimeModel.distance(position, argument, portnumber, mode, op.isupper()), portnumber, speedMode)
+                if predicted is None:
+                    return None
+                duration += predicted
+                position = argument
+        return duration
+
+    def __str__(self) -> str:
+        return self.build()
+
+    def __len__(self) -> int:
+        return self.length
+
+
+class SnapshotCache:
+    """
+        Static product information (firmware and identity) kept on disk per serial number.
+        An entry stays valid as long as the firmware checksum of the product does not change.
+
+        INPUTS:
+            path: str - JSON file of the cache (default: ~/.amfTools/snapshot_cache.json)
+        """
+    DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".amfTools", "snapshot_cache.json")
+    default = None  # Instance shared by the products, see shared()
+
+    def __init__(self, path: str = None) -> None:
+        self.path = path or self.DEFAULT_PATH
+        self.lock = threading.Lock()
+        self.entries = None     # Key -> {'firmwareChecksum', 'static'}, read from the file on first use
+
+    @classmethod
+    def shared(cls) -> "SnapshotCache":
+        if cls.default is None:
+            cls.default = SnapshotCache()
+        return cls.default
+
+    def _load(self) -> dict:
+        # Caller holds self.lock
+        if self.entries is None:
+            try:
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def get(self, key: str, checksum: str) -> dict:
+        """
+        Cached static fields of a product, None if unknown or if its firmware checksum changed
+        """
+        with self.lock:
+            entry = self._load().get(key)
+            if entry is None or checksum is None or entry.get('firmwareChecksum') != checksum:
+                return None
+            return dict(entry['static'])
+
+    def put(self, key: str, checksum: str, static: dict) -> None:
+        with self.lock:
+            self._load()[key] = {'firmwareChecksum': checksum, 'static': dict(static)}
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path + ".tmp", 'w') as f:
+                    json.dump(self.entries, f, indent=4)
+                os.replace(self.path + ".tmp", self.path)
+            except OSError as e:
+                print(f"Warning: could not write the snapshot cache {self.path}: {e}")
+
+
+class DeviceSnapshot:
+    """
+        Information of a product at one time (see AMF.getSnapshot): static fields, cached per serial number and
+        firmware checksum, and dynamic fields, read in one batch.
+
+        INPUTS:
+            full: bool - Full device information (False: short device information, see AMF.getDeviceInformation)
+        """
+    SHORT_KEYS = ("serialNumber", "serialPort", "typeProduct", "portNumber", "productAddress", "currentStatus",
+                  "homed", "valveStatus", "speedModeValve", "pumpStatus")
+    FULL_KEYS = SHORT_KEYS + ("firmwareVersion", "valvePosition", "productConfiguration", "numberValveMovements",
+                              "numberValveMovementsSinceLastReport", "answerMode", "syringeSize", "pumpSpeed",
+                              "pumpSpeedMode", "plungerPosition", "realPlungerPosition", "microstepResolution",
+                              "plungerCurrent", "acceleration", "deceleration", "uniqueID", "firmwareChecksum",
+                              "Supply Voltage")
+    CACHED_KEYS = ("typeProduct", "productAddress", "firmwareVersion", "uniqueID")  # Static fields kept in the SnapshotCache
+
+    def __init__(self, full: bool = True) -> None:
+        self.full = full
+        self.static : dict = {}     # Firmware and identity
+        self.dynamic : dict = {}    # Status, position, counters...
+        self.errors : dict = {}     # Field -> error message, for the fields that could not be read
+        self.fromCache : bool = False   # True if the static fields come from the cache
+        self.time : float = None    # time.monotonic() at which the dynamic fields were read
+        self.duration : float = None    # s taken to read the snapshot
+
+    def toDict(self) -> dict:
+        """
+        Fields in the order of AMF.getDeviceInformation (None for the fields that could not be read)
+        """
+        info = {}
+        for key in (self.FULL_KEYS if self.full else self.SHORT_KEYS):
+            if key in self.dynamic:
+                info[key] = self.dynamic[key]
+            elif key in self.static:
+                info[key] = self.static[key]
+        return info
+
+    def __getitem__(self, key: str):
+        return self.dynamic[key] if key in self.dynamic else self.static[key]
+
+    def __str__(self) -> str:
+        return "\n".join(f"{key}: {value}" for key, value in self.toDict().items())
+
+
+class CircuitOpenError(ConnectionError):
+    """
+        Raised without sending anything while the circuit breaker of a product is open (see CircuitBreaker)
+        """
+
+
+class FramingError(ValueError):
+    """
+        Raised when an answer is garbled: no "/0" header, status byte or <ETX> (see Response.framed)
+        """
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+        Raised when a call runs past its deadline (see Deadline and TransactionPolicy.callTimeout)
+        """
+
+
+class TransactionPolicy:
+    """
+        How AMF.send handles a product that does not answer.
+
+        Queries (?, Q, *) are idempotent: they are sent again after a missing or garbled answer (see FramingError),
+        with a growing delay. A well-formed answer is never asked again, even an error one. Actions (moves,
+        configuration) are sent once, as the product may have executed them.
+
+        INPUTS:
+            queryRetries: int - Extra attempts for a query
+            backoff: float - Delay before the first retry, doubled at each retry (s)
+            backoffMax: float - Longest delay between two attempts (s)
+            attemptTimeout: float - Longest wait for one answer (s), None for max(responseTimeout, serialTimeout)
+            callTimeout: float - Longest time of one send call, retries included (s), None for no limit
+            failureThreshold: int - Consecutive unanswered send calls opening the circuit breaker, None to disable it
+            resetTime: float - Time the breaker stays open before one trial transaction is allowed (s)
+        """
+    def __init__(self, queryRetries: int = 2, backoff: float = 0.02, backoffMax: float = 0.2, attemptTimeout: float = None,
+                 callTimeout: float = None, failureThreshold: int = 3, resetTime: float = 2.0) -> None:
+        self.queryRetries = queryRetries
+        self.backoff = backoff
+        self.backoffMax = backoffMax
+        self.attemptTimeout = attemptTimeout
+        self.callTimeout = callTimeout
+        self.failureThreshold = failureThreshold
+        self.resetTime = resetTime
+
+    def retryDelay(self, attempt: int) -> float:
+        return min(self.backoff * 2 ** attempt, self.backoffMax)
+
+
+class CircuitBreaker:
+    """
+        Per-product breaker: after failureThreshold consecutive unanswered send calls the product is considered
+        gone and every call fails at once with CircuitOpenError. After resetTime, one trial transaction is let
+        through: an answer closes the breaker, a failure opens it again.
+
+        INPUTS:
+            failureThreshold: int - Consecutive failed calls opening the breaker
+            resetTime: float - Time before the trial transaction (s)
+        """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failureThreshold: int = 3, resetTime: float = 2.0) -> None:
+        self.failureThreshold = failureThreshold
+        self.resetTime = resetTime
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.openedAt = None    # time.monotonic() at which the breaker opened
+        self.trialRunning = False
+
+    def check(self, name: str = "product") -> None:
+        """
+        Raise CircuitOpenError if no transaction may be sent now
+        """
+        with self.lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN:
+                wait = self.openedAt + self.resetTime - time.monotonic()
+                if wait > 0:
+                    raise CircuitOpenError(f"No answer from the {name} to the last {self.failures} commands, next try in {wait:.1f} s")
+                self.state = self.HALF_OPEN
+            if self.trialRunning:
+                raise CircuitOpenError(f"No answer from the {name}, a trial transaction is in progress")
+            self.trialRunning = True
+
+    def success(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Close the breaker, e.g. when the product was plugged back in
+        """
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trialRunning = False
+
+    def failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            self.trialRunning = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failureThreshold:
+                self.state = self.OPEN
+                self.openedAt = time.monotonic()
+
+    @property
+    def isOpen(self) -> bool:
+        return self.state != self.CLOSED
+
+
+class Deadline:
+    """
+        Time limit of everything the current thread sends inside the block, retries and waits included.
+
+            with Deadline(5):
+                amf.valveShortestPath(3)    # raises DeadlineExceeded instead of running past 5 s
+
+        Nested deadlines cannot extend the enclosing one.
+
+        INPUTS:
+            seconds: float - Time allowed from the creation of the deadline
+        """
+    local = threading.local()
+
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+        self.end = time.monotonic() + seconds
+
+    @classmethod
+    def current(cls) -> "Deadline":
+        stack = getattr(cls.local, 'stack', None)
+        return stack[-1] if stack else None
+
+    def remaining(self) -> float:
+        return self.end - time.monotonic()
+
+    def check(self, what: str = "Call") -> None:
+        if time.monotonic() >= self.end:
+            raise DeadlineExceeded(f"{what} exceeded its {self.seconds} s deadline")
+
+    def __enter__(self) -> "Deadline":
+        outer = Deadline.current()
+        if outer is not None and outer.end < self.end:
+            self.end = outer.end
+        if getattr(Deadline.local, 'stack', None) is None:
+            Deadline.local.stack = []
+        Deadline.local.stack.append(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        Deadline.local.stack.remove(self)
+
+
+class SerialBus:
+    """
+        Shared serial connection of one RS485 bus (one serial port), with its reference count and its transaction lock.
+        Buses are kept in a registry keyed by serial port, so products on independent buses communicate in parallel.
+        """
+    registry = {}   # Serial port -> SerialBus
+    registryLock = threading.Lock()
+
+    def __init__(self, port: str) -> None:
+        self.port = port
+        self.serial : serial.Serial = None
+        self.reader : FrameReader = None
+        self.refCount = 0
+        self.lock = threading.RLock()   # Only one transaction at a time on the bus
+
+    @classmethod
+    def acquire(cls, port: str, baudrate: int = 9600, timeout: float = 1) -> "SerialBus":
+        """
+        Get the bus of a serial port, opening its connection if needed, and add a reference to it.
+        Raise serial.SerialException if the port cannot be opened.
+        """
+        with cls.registryLock:
+            bus = cls.registry.get(port)
+            if bus is None:
+                bus = cls.registry[port] = SerialBus(port)
+            if bus.serial is None or not bus.serial.is_open:
+                bus.serial = serial.Serial(port, baudrate, timeout=timeout)
+                bus.reader = FrameReader(bus.serial)
+                bus.refCount = 0
+                AMF.sharedSerial = bus.serial
+            bus.refCount += 1
+            if bus.serial is AMF.sharedSerial:
+                AMF.sharedSerialRefCount = bus.refCount
+            return bus
+
+    def release(self) -> None:
+        """
+        Remove a reference to the bus, its connection is closed with the last one
+        """
+        with SerialBus.registryLock:
+            self.refCount -= 1
+            if self.serial is AMF.sharedSerial:
+                AMF.sharedSerialRefCount = max(self.refCount, 0)
+            if self.refCount < 1:
+                self.close()
+
+    def close(self) -> None:
+        try:
+            if self.serial is not None:
+                self.serial.close()
+        finally:
+            if self.serial is AMF.sharedSerial:
+                AMF.sharedSerial = None
+                AMF.sharedSerialRefCount = 0
+            self.serial = None
+            self.reader = None
+            self.refCount = 0
+            if SerialBus.registry.get(self.port) is self:
+                del SerialBus.registry[self.port]
+
+    @classmethod
+    def get(cls, port: str) -> "SerialBus":
+        """
+        Bus of a serial port if its connection is open, else None
+        """
+        with cls.registryLock:
+            bus = cls.registry.get(port)
+            return bus if bus is not None and bus.serial is not None and bus.serial.is_open else None
+
+    @classmethod
+    def closeAll(cls) -> None:
+        with cls.registryLock:
+            for bus in list(cls.registry.values()):
+                try:
+                    bus.close()
+                except:
+                    pass
+
 
 class AMF:        
     """
@@ -59,7 +871,13 @@ class AMF:
             silentMode: bool - If True, no warnings are printed in case some arguments passed have incorrect values
         """
     
-    TIME_BETWEEN_COMMANDS = 0.1  # Delay after sending a command
+    TIME_BETWEEN_COMMANDS = 0.1  # Delay after a command whose answer is not read back (noAns / broadcast) or that writes the configuration
+    # Gap enforced after a command whose answer has been received, per connection mode.
+    # On a dedicated USB link the answer proves the product is ready; on RS485 the bus needs a short turnaround.
+    PACING_AFTER_ANSWER = {"USB/RS232": 0.0, "RS485": 0.002}
+    CONFIGURATION_COMMANDS = ('!', '@', '$')    # Commands writing the product memory keep the full TIME_BETWEEN_COMMANDS
+    minCommandInterval : float = 0.0    # Per-device floor between two consecutive commands, in s
+    nextCommandTime : dict = {}     # Earliest time the next command may be written, per serial port (shared on RS485)
     serialNumber : str = None
     firmwareVersion : str = None
     serialPort : str = None     # Port to connect
@@ -84,18 +902,33 @@ class AMF:
     valvePosition : int = None
     noAns : bool = False
     addressRange : list = ["1","2","3","4","5","6","7","8","9","A","B","C","D","E"]
-    sharedSerial : serial.Serial = None
-    sharedSerialRefCount : int = 0
+    sharedSerial : serial.Serial = None     # Deprecated, see SerialBus: connection of the last RS485 bus opened
+    sharedSerialRefCount : int = 0          # Deprecated, see SerialBus: reference count of that bus
+    bus : SerialBus = None      # RS485 bus of the product, once connected
+    answerReader : AnswerReader = None  # Reader thread in asynchronous answer mode (modes 1 and 2)
+    pendingCompletion : Future = None   # Completion of the last command string sent in asynchronous answer mode
+    frameReader : FrameReader = None    # Reader of the answers on productserial (the bus one in RS485 mode)
     productFamily : str = None
     pullAndWaitDetailedMode : bool = True # Detailed mode will check 9100 & 9200, Quick mode will check Q status only
     maxCountError = 2   # Max allowed number of communication errors
     RS485_BroadcastMode: bool = False # If the product is using RS485 broadcast, receive function will never be called
+    moveTimeModel : MoveTimeModel = None    # Calibrated move durations, shared by all the AMF objects of a product
+    moveTimeModels : dict = {}  # Serial number (or port) -> MoveTimeModel
+    pendingMove : dict = None   # Last valve move sent and not yet confirmed by pullAndWait
+    lastWriteTime : float = None    # time.monotonic() of the last command written
+    lastActionTime : float = None   # time.monotonic() of the last command written that was not a query
+    recorder = None     # amfTools.trace.TraceRecorder receiving the timings of the command path, None to disable
+    policy : TransactionPolicy = None   # Retries, timeouts and circuit breaker of send(), one per AMF object
+    circuitBreaker : CircuitBreaker = None  # Breaker of the product, see getCircuitBreaker
+    circuitBreakers : dict = {}     # Serial number (or port) / address -> CircuitBreaker, shared by the AMF objects of a product
+    POLL_INTERVAL = 0.02    # Status polling period once a predicted move is about to end, in s
+    PREDICTION_MARGIN = 0.1 # Fraction of the predicted move duration at which polling starts before the end (at least POLL_INTERVAL)
 
     FIRST_CHAR = '/'
     LAST_CHAR = '\r'
 
     # =============================================================================
-    # Global Serial Lock for RS485 thread-safe communication
+    # Serial Locks for RS485 thread-safe communication
     # =============================================================================
     # RS485 is a shared bus protocol, meaning only one device should communicate
     # on the bus at any given time.
@@ -103,9 +936,10 @@ class AMF:
     # In this library, multiple AMF devices may attempt to send()
     # or receive() commands in parallel (via threads for instance).
     #
-    # To prevent collisions or corrupted responses, we introduce a global
-    # RLock (Reentrant Lock) named `serial_lock`, which ensures that only one
-    # device at a time accesses the RS485 bus. While threads cannot acquire the RLock simultaneously, 
+    # To prevent collisions or corrupted responses, every RS485 bus (SerialBus)
+    # has its own RLock (Reentrant Lock), which ensures that only one
+    # device at a time accesses that bus, while independent buses work in parallel.
+    # While threads cannot acquire the RLock simultaneously, 
     # the order in which they acquire it is non-deterministic when no condition variables or queuing logic are in place.
     # 
     # This allows us to safely use the standard amfTools functions
@@ -119,14 +953,14 @@ class AMF:
     # omitting the lock may result in data collisions or message corruption due to concurrent access.
     # =============================================================================
     
-    serial_lock = threading.RLock()  # Global lock for all RS485 accesses
+    serial_lock = threading.RLock()  # Deprecated: former global lock for all RS485 accesses, no longer taken by send/receive
 
 
     functions = {
         'setAddress' : "@ADDR=#R", #Define the Address of the product
         'setAnswerMode' : "!50#", #Define the answer mode of the product
         'setPortNumber' : "!80#", #Set the port number of the product
-        'stopOnMiddle' : "!81", 
+        'stopOnMiddle' : "!81", #Enable the stop on middle function (only for RVMFS)
         'setPlungerForce' : "!30#", #Set the plunger force (only for SPM and LSPone)
         'slowMode' : "-R", #Set the slow mode (only for the RVMFS)
         'fastMode' : "+R", #Set the fast mode (only for the RVMFS)
@@ -150,6 +984,7 @@ class AMF:
         'getReductionRatio' : "?333", #Get the pump motor reduction ratio
         'getAnswerMode' : "?500", #Get the answer mode
         'getPortNumber' : "?801", #Get the number of valve ports
+        'getStopOnMiddle' : "?80", #Get the stop on middle activation state (only for RVMFS)
         'internalReset' : "$", #Restart the product
         'getSupplyVoltage' : "*", #Get the supply voltage
         'getUniqueID' : "?9000", #Get the unique ID
@@ -186,6 +1021,10 @@ class AMF:
         'getSyringeSize' : "?600", #Get the syringe size (only for SPM and LSPone)
         'dummyCommand' : "c0R", #Dummy command that will be accepted but will trigger no move
     }
+    functions.update({key.lower(): value for key, value in list(functions.items())})    # Lowercase aliases, once at import
+    # Command templates split around the parameter placeholder: name -> (head, tail), tail None if no parameter
+    COMMAND_TEMPLATES = {key: (value.split('#', 1)[0], value.split('#', 1)[1] if '#' in value else None)
+                         for key, value in functions.items()}
 
     ERROR_CODES = {'@': [0, 'No Error'],
                 "`": [0, 'No Error'],
@@ -280,11 +1119,9 @@ class AMF:
             silentMode: bool - If True, no warnings are printed in case some arguments passed have incorrect values
         """
         
-        # Prepare the internal function dictionary
-        # We add lowercase keys
-        fun = self.functions.copy()
-        for key, value in fun.items():
-            self.functions[key.lower()] = value
+        self.commandLock = threading.RLock()    # Serializes transactions on this object in USB/RS232 mode
+        self.configuration = {}     # Configuration settings read from or written to the product (see getConfigFingerprint)
+        self.policy = TransactionPolicy()
         
         # Parse the 'product' input as a Device
         if isinstance(product, Device):
@@ -375,15 +1212,69 @@ class AMF:
             if not silentMode:
                 print("Device using RS485 broadcast mode. No answer will be returned by the device and blocking functions will not block\n")
         
+        # Move durations are learnt per product, so they survive reconnections
+        modelKey = self.serialNumber if self.serialNumber else self.serialPort
+        self.moveTimeModel = AMF.moveTimeModels.setdefault(f"{modelKey}/{self.productAddress}", MoveTimeModel())
+        
         # Open the connection unless already handled via RS485 auto mode
         if autoconnect:
             self.connect()
             
+    @classmethod
+    def fromDescriptor(cls, descriptor, portnumber: int = None, syringeVolume: int = None, autoconnect: bool = True) -> "AMF":
+        """
+        Create the AMF object of a fully known product, without any query: no serial number or port lookup, 
+        and the connection only opens the serial port (see connect(probe=False))
+        
+        INPUTS:
+            descriptor: Device or dict (see Device.toDict) - Serial port, serial number, type, connection mode and address of the product
+            portnumber: int - Valve number of ports, as configured in the product (not checked nor written)
+            syringeVolume: int - Syringe size in µL (not written to the product)
+            autoconnect: bool - If True, open the serial port immediately
+        """
+        device = Device.fromDict(descriptor) if isinstance(descriptor, dict) else descriptor
+        if portnumber is None and isinstance(descriptor, dict):
+            portnumber = descriptor.get('portnumber')
+        if device.comPort is None:
+            raise ValueError("The descriptor needs the serial port of the product")
+        
+        amf = cls.__new__(cls)
+        amf.commandLock = threading.RLock()
+        amf.configuration = {}
+        amf.policy = TransactionPolicy()
+        amf.serialNumber = device.serialnumber
+        amf.serialPort = device.comPort
+        amf.typeProduct = device.deviceType
+        amf.productAddress = device.productAddress
+        amf.connectionMode = "RS485" if device.connectionMode and "RS485" in device.connectionMode.upper() else "USB/RS232"
+        if amf.typeProduct is None and amf.serialNumber:
+            amf.typeProduct = cls.SERIAL_TYPE_MAPPING.get(amf.serialNumber[:6])
+        if amf.typeProduct is None:
+            raise ValueError(f"The descriptor of the product on port {device.comPort} needs its type")
+        amf.productFamily = device.deviceFamily or next((fam for key, fam in cls.FAMILY_MAPPING.items() if key in amf.typeProduct), "Unknown")
+        if portnumber is not None:
+            amf.portnumber = portnumber
+        if syringeVolume is not None:
+            amf.syringeSize = syringeVolume
+        if amf.connectionMode == "RS485" and amf.productAddress == "_":
+            amf.RS485_BroadcastMode = True
+            amf.setNoAnswer()
+        modelKey = amf.serialNumber if amf.serialNumber else amf.serialPort
+        amf.moveTimeModel = cls.moveTimeModels.setdefault(f"{modelKey}/{amf.productAddress}", MoveTimeModel())
+        
+        if autoconnect:
+            amf.connect(probe = False)
+        return amf
 
-    def connect(self, serialTimeout: float = None) -> bool:
+    def connect(self, serialTimeout: float = None, probe: bool = True) -> bool:
         """
         Establish a connection to the device.
+        
+        INPUTS:
+            serialTimeout: float # Timeout of the serial read function, in s
+            probe: bool # If False, only open the serial connection (the product type, number of ports and syringe size are not read/written)
         """
+        connectStart = time.monotonic()
         try:
             self.disconnect()  # In case of a previous connection
         except:
@@ -396,24 +1287,23 @@ class AMF:
         elif self.serialPort is None:
             raise ConnectionError("No serial port or serial number specified")
         try:
-            # Reuse shared RS485 connection if available
-            # This function won't work on multiple RS485 cables connected in parallel
-            if (self.connectionMode == "RS485" and AMF.sharedSerial and 
-                AMF.sharedSerial.is_open and AMF.sharedSerial.port == self.serialPort):            
-                self.productserial = AMF.sharedSerial
-                AMF.sharedSerialRefCount += 1
+            # In RS485 mode, the connection of the bus is shared with the other products on the same serial port
+            if self.connectionMode == "RS485":
+                try:
+                    self.bus = SerialBus.acquire(self.serialPort, self.serialBaudrate, self.answerTimeout())
+                except serial.SerialException as e:
+                    self.connected = False
+                    raise ConnectionError(f"Could not connect to product on port {self.serialPort}: {e}")
+                self.productserial = self.bus.serial
                 self.connected = True
+                if self.bus.refCount == 1:
+                    time.sleep(0.05)    # Bus just opened
         
             else:
-                # Open new serial connection (shared or not)
+                # Open new serial connection
                 try:
-                    serial_obj = serial.Serial(self.serialPort, self.serialBaudrate, timeout=self.serialTimeout)
+                    serial_obj = serial.Serial(self.serialPort, self.serialBaudrate, timeout=self.answerTimeout())
                     self.productserial = serial_obj
-            
-                    #  Create a shared serial object in case RS485 mode is used
-                    if self.connectionMode == "RS485":
-                        AMF.sharedSerial = serial_obj
-                        AMF.sharedSerialRefCount = 1
                     self.connected = True                                
                     time.sleep(0.05)
                     
@@ -423,13 +1313,18 @@ class AMF:
                 except Exception as e:
                     raise Exception(e)
             
+            if not probe:
+                if self.recorder is not None:
+                    self.recorder.span(self, 'connect', connectStart, time.monotonic(), {'probe': False})
+                return True
+            
             if self.typeProduct is None:
                 self.getType()
                 
             if self.portnumber is None:
                 self.getPortNumber()     
             else: 
-                self.setPortNumber(self.portnumber)
+                self.syncConfiguration(portnumber = self.portnumber)    # Only written if the product uses another value
                
             if self.productFamily == "Pump":
                 if self.syringeSize is None:
@@ -443,6 +1338,8 @@ class AMF:
             finally:
                 raise ConnectionError(e)
         
+        if self.recorder is not None:
+            self.recorder.span(self, 'connect', connectStart, time.monotonic(), {'probe': True})
         return True
     
     
@@ -451,15 +1348,14 @@ class AMF:
         Disconnect from the product.
         """
         try : 
-            if self.connected and self.productserial:
-                if self.productserial == AMF.sharedSerial:
-                    AMF.sharedSerialRefCount -= 1
-                    if AMF.sharedSerialRefCount < 1:
-                        AMF.sharedSerial.close()
-                        AMF.sharedSerial = None
-                        AMF.sharedSerialRefCount = 0
-                else:
-                    self.productserial.close()
+            if self.answerReader is not None:
+                reader, self.answerReader = self.answerReader, None
+                reader.stop()
+            if self.connected and self.bus is not None:
+                bus, self.bus = self.bus, None
+                bus.release()
+            elif self.connected and self.productserial:
+                self.productserial.close()
             self.connected = False
     
         except Exception as e:
@@ -469,18 +1365,12 @@ class AMF:
     @staticmethod
     def closeSharedSerial()->None:
         """
-        Close the serial connection for RS485 mode
+        Close the serial connections of all the RS485 buses
         """
-        if AMF.sharedSerial:
-            try:
-                AMF.sharedSerial.close()
-                AMF.sharedSerial = None
-                AMF.sharedSerialRefCount = 0
-            except:
-                pass
+        SerialBus.closeAll()
                
     
-    def send(self, command: str, data: bool = False, integer: bool = False, full_ans: bool = False, force_ans: bool = False) -> None:
+    def send(self, command: str, data: bool = False, integer: bool = False, full_ans: bool = False, force_ans: bool = False, frame: bool = False) -> None:
         """
         Send a command to the product and returns its response.
     
@@ -490,37 +1380,154 @@ class AMF:
             integer: bool # If True, extract an int from the product response
             full_ans: bool # If True, the response will be returned as is, without removing the leading and trailing characters
             force_ans: bool # If True, returns the product repsonse even if the attribute noAns is set to False
+            frame: bool # If True, returns the Response object of the answer
         OUTPUTS:
-            str or int or None # Depends on flags
+            str or int or Response or None # Depends on flags
         """
         if not self.connected or not self.productserial:
             raise ConnectionError("Product is not connected")
 
         command = command + self.LAST_CHAR
-        response = None
+        query = self.isQueryCommand(command)
+        if not query:
+            self.pendingMove = None     # Any new action supersedes the move being tracked
+        
+        # Only an answered transaction tells whether the product is there, and only queries can safely be sent twice
+        policy = self.policy
+        breaker = self.getCircuitBreaker() if policy.failureThreshold is not None else None
+        if breaker is not None:
+            breaker.check(f"product on port {self.serialPort}")
+        answered = not self.noAns or force_ans
+        attempts = 1 + policy.queryRetries if query and answered else 1
+        end = None if policy.callTimeout is None else time.monotonic() + policy.callTimeout
+        deadline = Deadline.current()
+        if deadline is not None and (end is None or deadline.end < end):
+            end = deadline.end
         
-        # In RS485 mode, we use serial_lock to ensure shared serial is not used by another thread
-        if self.connectionMode == "RS485":
-            with AMF.serial_lock:
-                self.productserial.reset_input_buffer()  # Clear input buffer BEFORE sending
+        try:
+            for attempt in range(attempts):
+                try:
+                    response = self.exchange(command, data, integer, full_ans, force_ans, frame, end)
+                except (ConnectionError, FramingError):     # No answer, or a garbled one
+                    if attempt + 1 == attempts:
+                        raise
+                except ValueError:      # Answered, but not the expected value (e.g. a non-numeric or error answer)
+                    if breaker is not None:
+                        breaker.success()
+                    raise
+                else:
+                    if breaker is not None and answered:
+                        breaker.success()
+                    return response
+                if self.recorder is not None:
+                    self.recorder.count(self, 'retries')
+                delay = policy.retryDelay(attempt)
+                time.sleep(delay if end is None else max(0.0, min(delay, end - time.monotonic())))
+        except (ConnectionError, FramingError, TimeoutError, serial.SerialException):
+            if breaker is not None:
+                breaker.failure()   # One failure per call, whatever its number of attempts
+            raise
+    
+    def exchange(self, command: str, data: bool, integer: bool, full_ans: bool, force_ans: bool, frame: bool, end: float = None):
+        """
+        One attempt of send(): write the command (ending with LAST_CHAR) and read its answer, 
+        within answerTimeout() and before end (time.monotonic(), None for no limit)
+        """
+        response = None
+        recorder = self.recorder
+        # In RS485 mode, we use the bus lock to ensure shared serial is not used by another thread
+        # In USB/RS232 mode, the product's own lock protects it when several threads use the same AMF object
+        with self.transactionLock():
+            if recorder is not None:
+                pacingStart = time.monotonic()
+            self.waitForPacing()
+            timeout = self.answerTimeout()
+            if end is not None:
+                if end - time.monotonic() <= 0:
+                    raise DeadlineExceeded(f"Command {command.strip()} to the product on port {self.serialPort} ran out of time")
+                timeout = min(timeout, end - time.monotonic())
+            try:
+                if self.answerReader is not None:
+                    # Asynchronous answer mode: the reader thread owns the input (completions may arrive at any time)
+                    waiter = self.answerReader.expect(command)
+                else:
+                    self.getFrameReader().reset()  # Clear input buffer BEFORE sending
+                if recorder is not None:
+                    writeStart = time.monotonic()
                 self.productserial.write(command.encode())
+                self.lastWriteTime = time.monotonic()
+                if not self.isQueryCommand(command):
+                    self.lastActionTime = self.lastWriteTime
                 
-                if not self.noAns or force_ans:
-                    response = self.receive(data=data, integer=integer, full=full_ans)
-        else:
-            self.productserial.reset_input_buffer()  # Clear input buffer BEFORE sending
-            self.productserial.write(command.encode())
-            
-            if not self.noAns or force_ans:
-                response = self.receive(data=data, integer=integer, full=full_ans)
-                
-        time.sleep(self.TIME_BETWEEN_COMMANDS)
+                if self.answerReader is not None:
+                    answer = self.answerReader.wait(waiter, timeout)
+                    if answer is not None and waiter[1] is not None and answer.errorCode == 0:
+                        self.pendingCompletion = waiter[1]['future']
+                    if not self.noAns or force_ans:
+                        response = self.parseResponse(answer, data=data, integer=integer, full=full_ans, frame=frame)
+                elif not self.noAns or force_ans:
+                    response = self.receive(data=data, integer=integer, full=full_ans, frame=frame, timeout=timeout)
+            finally:
+                self.schedulePacing(command, answered = response is not None)
+                if recorder is not None and self.lastWriteTime is not None and self.lastWriteTime >= pacingStart:
+                    frameEnd = time.monotonic() if response is not None else None
+                    firstByte = self.getFrameReader().firstByteTime if response is not None and self.answerReader is None else None
+                    recorder.transaction(self, command, pacingStart, writeStart, self.lastWriteTime, firstByte, frameEnd)
         
-        if response is not None:
-            return response
+        return response
 
+    def answerTimeout(self) -> float:
+        """
+        Longest wait for one answer, in s (see TransactionPolicy.attemptTimeout)
+        """
+        timeout = max(self.responseTimeout, self.serialTimeout)
+        if self.policy.attemptTimeout is not None:
+            timeout = min(timeout, self.policy.attemptTimeout)
+        return timeout
+
+    def getCircuitBreaker(self) -> CircuitBreaker:
+        """
+        Circuit breaker of the product, shared by all its AMF objects (it survives reconnections)
+        """
+        if self.circuitBreaker is None:
+            key = f"{self.serialNumber if self.serialNumber else self.serialPort}/{self.productAddress}"
+            self.circuitBreaker = AMF.circuitBreakers.setdefault(key, CircuitBreaker(self.policy.failureThreshold, self.policy.resetTime))
+        return self.circuitBreaker
     
-    def receive(self, data=False, integer=False, full=False) -> str:
+    def transactionLock(self) -> threading.RLock:
+        """
+        Lock to hold during a command/answer transaction: the bus lock in RS485 mode, the product lock otherwise
+        """
+        if self.bus is not None:
+            return self.bus.lock
+        return self.commandLock
+
+    def isQueryCommand(self, command: str) -> bool:
+        """
+        True if the prepared command only reports information (?, Q, *) and does not act on the product
+        """
+        return command[len(self.FIRST_CHAR) + 1:][:1] in ('?', 'Q', '*')
+
+    def waitForPacing(self) -> None:
+        """
+        Sleep until the gap required after the previous command on this serial port has elapsed
+        """
+        delay = AMF.nextCommandTime.get(self.serialPort, 0) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def schedulePacing(self, command: str, answered: bool) -> None:
+        """
+        Record when the next command may be sent, depending on the connection mode and on whether
+        the product answered. Commands that were not answered are assumed to still be processed.
+        """
+        if not answered or command[len(self.FIRST_CHAR) + 1:][:1] in self.CONFIGURATION_COMMANDS:
+            gap = self.TIME_BETWEEN_COMMANDS
+        else:
+            gap = self.PACING_AFTER_ANSWER.get(self.connectionMode, self.TIME_BETWEEN_COMMANDS)
+        AMF.nextCommandTime[self.serialPort] = time.monotonic() + max(gap, self.minCommandInterval)
+    
+    def receive(self, data=False, integer=False, full=False, frame=False, timeout: float = None) -> str:
         """
         Receive a response from the device.
     
@@ -528,63 +1535,59 @@ class AMF:
             data: bool # If True, remove the status bit from the product response
             integer: bool # If True, extract an int from the product response
             full: bool # If True, the response will be returned as is, without removing the leading and trailing characters
+            frame: bool # If True, return the Response object (status byte, data...)
+            timeout: float # Longest wait for the answer, in s (default: answerTimeout())
         OUTPUTS:
-            str or int # Response from the product
+            str or int or Response # Response from the product
         """
         if not self.connected or self.productserial is None:
             raise ConnectionError("Attempted to read from device while not connected")
         
-        response = ""
-        timeout = time.time() + self.responseTimeout
+        # In RS485 mode, we use the bus lock to ensure shared serial is not used by another thread
+        with self.transactionLock():
+            response = self.getFrameReader().readFrame(self.answerTimeout() if timeout is None else timeout)
+        if response is None and self.recorder is not None:
+            self.recorder.count(self, 'timeouts')
         
-        # In RS485 mode, we use serial_lock to ensure shared serial is not used by another thread
-        if self.connectionMode == "RS485":
-            with AMF.serial_lock:
-                response = self.productserial.read_until(b"\r").decode("ascii", errors="ignore")
-                
-                while response == "" and time.time() < timeout:
-                    response = self.productserial.read_until(b"\r").decode("ascii", errors="ignore")
-                    if response.endswith('\r'):
-                        break
-                    time.sleep(0.1)
-        else:
-            response = self.productserial.read_until(b"\r").decode("ascii", errors="ignore")
-            
-            while response == "" and time.time() < timeout:
-                response = self.productserial.read_until(b"\r").decode("ascii", errors="ignore")
-                if response.endswith('\r'):
-                    break
-                time.sleep(0.1)            
-  
-        if response != "":
-            if full:
-                return response
-            
-            # Remove the leading and trailng characters
-            response = response.replace("/0", "").replace("\x03", "").replace("\r", "").replace("\n", "")
-            
-            if data:
-                try:
-                    return response[1:] # Remove the status bit
-                except Exception as e:
-                    raise ValueError(f"Unable to extract data from '{response}': {e}")
+        if frame:
+            return self.parseResponse(response, frame=True)
+        return self.parseResponse(response, data=data, integer=integer, full=full)
 
-            if integer:
-                try:
-                    match = re.search(r"\-?\d+", response)      # Search the first number in the response string
-                    if match:
-                        val = int(match.group())
-                        return val           
-                    else:
-                        raise ValueError(f"No numeric value found in response: '{response}'")
-                except ValueError as e:
-                    raise ValueError(f"Failed to convert response to integer: {e}")
-                except Exception as e:
-                    raise Exception(e)
+    def getFrameReader(self) -> FrameReader:
+        """
+        Reader of the answers on the current serial connection (shared by the products of an RS485 bus)
+        """
+        if self.frameReader is None or self.frameReader.serial is not self.productserial:
+            if self.bus is not None and self.bus.serial is self.productserial:
+                self.frameReader = self.bus.reader
+            else:
+                self.frameReader = FrameReader(self.productserial)
+        return self.frameReader
 
-            return response
-        else:
+    def parseResponse(self, response: Response, data=False, integer=False, full=False, frame=False):
+        """
+        Extract the requested part of a product answer ("/0<status><data><ETX><CR><LF>"), see receive()
+        A missing answer (None or empty) means the product did not answer in time.
+        """
+        if isinstance(response, (str, bytes)):
+            response = Response(response.encode("ascii", errors="ignore") if isinstance(response, str) else response) if response else None
+        if response is None or not response.frame:
             raise ConnectionError(f"No answer from the product on port {self.serialPort}. Check that the product is properly connected")
+        
+        if frame:
+            return response
+        if full:
+            return response.raw
+        if data:
+            return response.data
+        if integer:
+            try:
+                return response.integer
+            except ValueError as e:
+                if not response.framed:
+                    raise FramingError(f"Garbled answer from the product on port {self.serialPort}: {response.raw!r}")
+                raise ValueError(f"Failed to convert response to integer: {e}")
+        return response.text
 
 
     def prepareCommand(self, command : str, parameter = None, customCmd : bool = False) -> str:
@@ -601,14 +1604,21 @@ class AMF:
         """
         if customCmd:
             preparedCommand : str = self.FIRST_CHAR + str(self.productAddress) + command
-        else:
-            preparedCommand : str = self.FIRST_CHAR + str(self.productAddress) + self.functions[command.lower()]
-        
-        if '#' in  preparedCommand and parameter is not None:
-             preparedCommand =  preparedCommand.replace('#', str(parameter))
-        elif '#' in  preparedCommand and parameter is None:
+            if '#' in  preparedCommand and parameter is not None:
+                 preparedCommand =  preparedCommand.replace('#', str(parameter))
+            elif '#' in  preparedCommand and parameter is None:
+                raise ValueError("Command "+command+ " needs a parameter")
+            return preparedCommand
+        
+        template = self.COMMAND_TEMPLATES.get(command)
+        if template is None:
+            template = self.COMMAND_TEMPLATES[command.lower()]
+        head, tail = template
+        if tail is None:
+            return self.FIRST_CHAR + str(self.productAddress) + head
+        if parameter is None:
             raise ValueError("Command "+command+ " needs a parameter")
-        return preparedCommand      
+        return self.FIRST_CHAR + str(self.productAddress) + head + str(parameter) + tail
 
     def sendBrute(self, command : str, block : bool = True, check_ans : bool = True, force_ans : bool = False, ans_type: str = 'default') -> None:
         """
@@ -668,6 +1678,14 @@ class AMF:
         if self.RS485_BroadcastMode:
             return
         
+        waitStart = time.monotonic()
+        deadline = Deadline.current()
+        if self.answerReader is not None and self.pendingCompletion is not None:
+            self.waitForCompletion(None if deadline is None else max(0.0, deadline.remaining()))
+            if self.recorder is not None:
+                self.recorder.span(self, 'pullAndWait', waitStart, time.monotonic(), {'polls': 0, 'completion': True})
+            return
+        
         valvebusy = True
         pumpbusy = True
         
@@ -677,13 +1695,39 @@ class AMF:
         if detailed_mode is None:
             detailed_mode = self.pullAndWaitDetailedMode
         
+        # If the duration of the move can be predicted, we sleep until just before its end and then poll densely.
+        # A move the model cannot predict yet is polled densely from the start, so that its end is bracketed by a
+        # busy and a done status (the samples that calibrate the model). Otherwise we poll every 2 x TIME_BETWEEN_COMMANDS.
+        move = self.pendingMove
+        tracked = move is not None and not homing_mode
+        predicted = move['predicted'] if tracked else None
+        if predicted is not None:
+            wakeTime = move['start'] + predicted - max(self.POLL_INTERVAL, predicted*self.PREDICTION_MARGIN)
+            pollDelay = max(0.0, wakeTime - time.monotonic())
+        elif tracked:
+            wakeTime = None
+            pollDelay = self.POLL_INTERVAL
+        else:
+            wakeTime = None
+            pollDelay = self.TIME_BETWEEN_COMMANDS*2
+        lastBusyTime = None
+        polls = 0
+        retries = 0
+        
         while valvebusy or pumpbusy:
             try:
                 try:
-                    time.sleep(self.TIME_BETWEEN_COMMANDS*2)
-                except Exception as e:
+                    if deadline is not None:
+                        deadline.check(f"Wait for the product on port {self.serialPort}")
+                        pollDelay = min(pollDelay, max(0.0, deadline.remaining()))
+                    time.sleep(pollDelay)
+                    polls += 1
+                    if tracked:
+                        # Past the predicted end (or the start of an unpredicted move), the polling period grows back progressively
+                        pollDelay = min(self.POLL_INTERVAL * 1.5**(polls - 1), self.TIME_BETWEEN_COMMANDS*2)
+                except Exception:
                     countValveError += 1
-                    raise Exception(e)
+                    raise
                 
                 if detailed_mode:
                     # Detailed mode is checking detailed status of valve (and pump if the product is a pump)
@@ -696,8 +1740,6 @@ class AMF:
                             valve_status_code = self.VALVE_ERROR[str(responseValve)]
                         except KeyError:
                             raise KeyError(f"Unknown valve error code: {responseValve}")
-                        except Exception as e:
-                            raise Exception(e)
                             
                         if valve_status_code[0] == 0:
                             valvebusy = False
@@ -710,9 +1752,9 @@ class AMF:
                         else: 
                             valvebusy = True
                             countValveError = 0
-                    except Exception as e:
+                    except Exception:
                         countValveError += 1
-                        raise Exception(e)
+                        raise
     
                     ##################### Checking Pump #####################
                     try:
@@ -723,8 +1765,6 @@ class AMF:
                                     pump_status_code = self.PUMP_ERROR[str(responsePump)]
                                 except KeyError: 
                                     raise KeyError(f"Unknown pump error code: {responsePump}")
-                                except Exception as e:
-                                    raise Exception(e)
                                     
                                 if pump_status_code[0] == 0:
                                     pumpbusy = False
@@ -744,9 +1784,9 @@ class AMF:
                         else:
                             pumpbusy = False
                             
-                    except Exception as e:
+                    except Exception:
                         countPumpError += 1
-                        raise Exception(e)
+                        raise
                      
                 # pullAndWait quick mode, only the status bit is checked (Q command)
                 # It will fail to detect available product if hardstop command is used
@@ -773,18 +1813,88 @@ class AMF:
                         elif status_bit == "`":                        
                             valvebusy = False
                             pumpbusy = False     
-                    except Exception as e:
+                    except Exception:
                         countValveError += 1
-                        raise Exception(e)
-                        
+                        raise
                         
+                if valvebusy or pumpbusy:
+                    lastBusyTime = self.lastWriteTime   # The product sampled its status when the query was sent
                                 
+            except DeadlineExceeded:
+                raise   # Out of time: no point in polling again
             except Exception as e:
                 countError = countValveError + countPumpError
                 if countError > self.maxCountError:
+                    if isinstance(e, CircuitOpenError):
+                        raise   # Keeps its type: the callers fail fast on it instead of reconnecting
                     raise Exception(f"PullAndWait error: {e}")
                 elif warning_error:                    
                     print(f"WARNING: PullAndWait error ({countError}/{self.maxCountError} allowed): {e}")
+                retries += 1
+        
+        if move is not None and move is self.pendingMove and not homing_mode:
+            self.completeMove(move, lastBusyTime, wakeTime)
+        if self.recorder is not None:
+            self.recorder.span(self, 'pullAndWait', waitStart, time.monotonic(), {'polls': polls, 'retries': retries, 'predicted': predicted})
+            self.recorder.record(self, 'polls', polls)
+            if retries:
+                self.recorder.count(self, 'retries', retries)
+            
+    def waitForCompletion(self, timeout: float = None) -> None:
+        """
+        Asynchronous answer mode: wait for the product to report the end of the last command string (no polling)
+        Raise the error it reported, or TimeoutError after timeout (s).
+        """
+        future, move = self.pendingCompletion, self.pendingMove
+        if future is None:
+            return
+        try:
+            future.result(timeout)
+        except TimeoutError:
+            raise TimeoutError(f"Product on port {self.serialPort} did not report the end of its command after {timeout} s")
+        finally:
+            if future.done() and self.pendingCompletion is future:
+                self.pendingCompletion = None
+        if move is not None and move is self.pendingMove:
+            doneTime = self.answerReader.lastCompletionTime if self.answerReader is not None else None
+            self.completeMove(move, None, None, doneTime = doneTime)
+
+    def startMove(self, target: int, mode: int = 0, enforced: bool = False) -> None:
+        """
+        Remember the valve move that was just sent, and its predicted duration, so that pullAndWait can use them
+        """
+        distance = None
+        predicted = None
+        if self.valvePosition and self.portnumber:
+            distance = MoveTimeModel.distance(self.valvePosition, target, self.portnumber, mode, enforced)
+            predicted = self.moveTimeModel.predict(distance, self.portnumber, self.valveSpeed)
+        self.pendingMove = {'target': target, 'distance': distance, 'start': self.lastActionTime, 'predicted': predicted}
+        self.valvePosition = None   # Unknown until the move is confirmed
+    
+    def completeMove(self, move: dict, lastBusyTime: float, wakeTime: float, doneTime: float = None) -> None:
+        """
+        Confirm the tracked move and feed its observed duration to the move time model
+        doneTime is the end of the move when it is known exactly (completion frame of the asynchronous answer mode)
+        """
+        exact = doneTime is not None
+        if doneTime is None:
+            doneTime = self.lastWriteTime   # Write time of the status query that reported the move done
+        self.pendingMove = None
+        self.valvePosition = move['target']
+        if not move['distance']:
+            return
+        if exact:
+            duration = doneTime - move['start']
+        elif lastBusyTime is not None:
+            # The move ended between the last busy status and the done status
+            duration = (lastBusyTime + doneTime)/2 - move['start']
+        elif wakeTime is not None:
+            # Already done at the first poll: we only know it ended before we woke up, so we learn a duration
+            # one margin shorter (the model then drifts down until the first poll sees the valve busy again)
+            duration = wakeTime - move['start'] - max(self.POLL_INTERVAL, move['predicted']*self.PREDICTION_MARGIN)
+        else:
+            return  # Done at the first poll of an unpredicted move: only an upper bound of its duration, not learnt
+        self.moveTimeModel.record(move['distance'], self.portnumber, self.valveSpeed, max(0.0, duration))
     
     def setPullAndWaitDetailedMode(self, detailed_mode: bool = True) -> None: 
         """
@@ -852,6 +1962,14 @@ class AMF:
         
         self.__check_status__(self.send(self.prepareCommand('setAnswerMode', mode)))
         self.answerMode = mode
+        if mode and self.answerReader is None:
+            if self.bus is not None and self.bus.refCount > 1:
+                raise ValueError("Asynchronous answers cannot be told apart on an RS485 bus shared by several products")
+            self.answerReader = AnswerReader(self)
+        elif not mode and self.answerReader is not None:
+            reader, self.answerReader = self.answerReader, None
+            reader.stop()
+            self.pendingCompletion = None
 
     def setPortNumber(self, portnumber : int = None) -> None:
         """
@@ -863,18 +1981,66 @@ class AMF:
             
         self.__check_status__(self.send(self.prepareCommand('setPortNumber', portnumber)))        
         self.portnumber = portnumber
+        self.configuration['portnumber'] = portnumber
+        
+    def setStopOnMiddle(self, enable=1):
+        """
+        Configures the stop-on-middle behavior for the valve.
+        enable: 1 to stop the motor between two positions (closed valve). Disabling is not supported:
+        "!80" is the prefix of the set port number command (!80#)
+        """
+        if not int(enable):
+            raise ValueError("Only enabling the stop on middle function (!81) is supported")
+        # 1. Format the command using the internal dictionary logic
+        # This adds the '/' and the address automatically
+        command = self.prepareCommand('stopOnMiddle')
+        
+        # 2. Send it and return the response
+        response = self.send(command)
+        self.configuration['stopOnMiddle'] = int(enable)
+        return response
+    
+    def syncConfiguration(self, portnumber: int = None, stopOnMiddle: int = None) -> list:
+        """
+        Bring the valve configuration to the requested values. The settings in effect are read first and only
+        the ones that differ are written, which avoids needless configuration memory writes (and the homing
+        a new number of ports requires). A stop on middle state already known (written by this object or loaded
+        with loadConfigFingerprint) is not read again, as not every firmware answers ?80.
         
-    def setStopOnMiddle(self, enable=None):
+        INPUTS:
+            portnumber: int # Number of valve positions [1; 48], None to leave it unchanged
+            stopOnMiddle: int # Stop on middle state, 1 to enable it (only for RVMFS), None to leave it unchanged
+        OUTPUTS:
+            list # Settings that were written, empty if the configuration was already in effect
+        """
+        written = []
+        if portnumber is not None:
+            if self.getPortNumber() != portnumber:
+                self.setPortNumber(portnumber)
+                written.append(f"portnumber={portnumber}")
+        if stopOnMiddle is not None:
+            current = self.configuration.get('stopOnMiddle')
+            if current is None:
+                current = self.getStopOnMiddle()
+            if current != int(stopOnMiddle):    # None (unreadable) is written as well
+                self.setStopOnMiddle(stopOnMiddle)
+                written.append(f"stopOnMiddle={int(stopOnMiddle)}")
+        return written
+    
+    def getConfigFingerprint(self) -> str:
+        """
+        Summary of the known configuration settings of the product, e.g. "portnumber=12;stopOnMiddle=1"
+        """
+        return ";".join(f"{key}={value}" for key, value in sorted(self.configuration.items()))
+    
+    def loadConfigFingerprint(self, fingerprint: str) -> None:
         """
-        Configures the stop-on-middle behavior for the valve.
-        If the command requires a parameter (0 or 1), pass it as 'enable'.
+        Take the settings of a fingerprint recorded earlier (see getConfigFingerprint) as known, e.g. from a cache
         """
-        # 1. Format the command using the internal dictionary logic
-        # This adds the '/' and the address automatically
-        command = self.prepareCommand('stopOnMiddle', parameter=enable)
-        
-        # 2. Send it and return the response
-        return self.send(command)
+        for item in (fingerprint or "").split(";"):
+            key, _, value = item.partition("=")
+            if key and value.lstrip("-").isdigit():
+                self.configuration[key] = int(value)
         
 
     def setSpeed(self, speed : int) -> None:
@@ -1152,6 +2318,14 @@ class AMF:
             raise ValueError("Plunger force is only for SPM and LSPone")
         self.__check_status__(self.send(self.prepareCommand('setPlungerForce', force)))
 
+    def setMinCommandInterval(self, interval : float = 0.0) -> None:
+        """
+        Minimum delay in s enforced between two consecutive commands sent to this product, whatever the connection mode
+        """
+        if interval < 0:
+            raise ValueError("Interval must be positive")
+        self.minCommandInterval = interval
+
     def setNoAnswer(self, noAns = True) -> None:
         """
         If True, disable answers for the AMF object (answers can be forced by using the force_ans parameter)
@@ -1317,8 +2491,24 @@ class AMF:
             return
         
         self.portnumber = self.send(self.prepareCommand('getPortNumber'), integer = True, force_ans=True)
+        self.configuration['portnumber'] = self.portnumber
         return self.portnumber
     
+    def getStopOnMiddle(self) -> int:
+        """
+        Stop on middle activation state (?80), only for RVMFS. None if the product does not give a readable state
+        """
+        if self.RS485_BroadcastMode:
+            return
+        
+        try:
+            state = self.send(self.prepareCommand('getStopOnMiddle'), integer = True, force_ans=True)
+        except ValueError:  # Error or non-numeric answer: state unknown
+            self.configuration.pop('stopOnMiddle', None)
+            return None
+        self.configuration['stopOnMiddle'] = state
+        return state
+    
     def getCurrentStatus(self) -> str:
         """
         Current status of the product (Q)
@@ -1335,7 +2525,8 @@ class AMF:
         if self.RS485_BroadcastMode:
             return
         
-        return self.send(self.prepareCommand('getValvePosition'), integer = True, force_ans=True)
+        self.valvePosition = self.send(self.prepareCommand('getValvePosition'), integer = True, force_ans=True)
+        return self.valvePosition
     
     def getNumberValveMovements(self) -> int:
         """
@@ -1694,80 +2885,112 @@ class AMF:
             
     def getDeviceInformation(self, full : bool = False ) -> dict:
         """
-        Read device information (short or full)
+        Read device information (short or full), see getSnapshot
         """
         if self.RS485_BroadcastMode:
             return
         
-        info = {}
-        
-        try: info["serialNumber"] = self.getSerialNumber() 
-        except : info["serialNumber"] = None
-        try : info["serialPort"] = self.getSerialPort()
-        except : info["serialPort"] = None
-        try: info["typeProduct"] = self.getType()
-        except : info["typeProduct"] = None
-        try: info["portNumber"] = self.getPortNumber()
-        except : info["portNumber"] = None
-        try: info["productAddress"] = self.getAddress()
-        except : info["productAddress"] = None
-        try: info["currentStatus"] = self.getCurrentStatus()
-        except : info["currentStatus"] = None
-        try: info["homed"] = self.getHomeStatus()
-        except : info["homed"] = None
-        try: info["valveStatus"] = self.getValveStatus()
-        except : info["valveStatus"] = None
-        
-        if self.productFamily == "RVMFS" :
-            try: info["speedModeValve"] = self.getSpeedModeValve() 
-            except : info["speedModeValve"] = None
-        
-        elif self.productFamily == "Pump":
-            try: info["pumpStatus"] = self.getPumpStatus() 
-            except : info["pumpStatus"] = None
-        
-        if full:           
-            try: info["firmwareVersion"] = self.getFirmwareVersion()
-            except : info["firmwareVersion"] = None
-            try: info["valvePosition"] = self.getValvePosition()
-            except : info["valvePosition"] = None
-            try: info["productConfiguration"] = self.getProductConfiguration()
-            except : info["productConfiguration"] = None
-            try: info["numberValveMovements"] = self.getNumberValveMovements()
-            except : info["numberValveMovements"] = None            
-            try: info["numberValveMovementsSinceLastReport"] = self.getNumberValveMovementsSinceLastReport()
-            except : info["numberValveMovementsSinceLastReport"] = None
-            try: info["answerMode"] = self.getAnswerMode()
-            except : info["answerMode"] = None
+        return self.getSnapshot(full = full).toDict()
 
-            if self.productFamily == "Pump":
-                try: info["syringeSize"] = self.syringeSize 
-                except : info["syringeSize"] = None
-                try: info["pumpSpeed"] = self.getSpeedPump() 
-                except : info["pumpSpeed"] = None
-                try: info["pumpSpeedMode"] = self.getSpeedModePump() 
-                except : info["pumpSpeedMode"] = None
-                try: info["plungerPosition"] = self.getPlungerPosition() 
-                except : info["plungerPosition"] = None
-                try: info["realPlungerPosition"] = self.getRealPlungerPosition() 
-                except : info["realPlungerPosition"] = None
-                try: info["microstepResolution"] = self.getMicrostepResolution() 
-                except : info["microstepResolution"] = None
-                try: info["plungerCurrent"] = self.getPlungerCurrent() 
-                except : info["plungerCurrent"] = None            
-                try : info['acceleration'] = self.getAcceleration() 
-                except : info['acceleration'] = None
-                try : info['deceleration'] = self.getDeceleration() 
-                except : info['deceleration'] = None
-                
-            try: info["uniqueID"] = self.getUniqueID()
-            except : info["uniqueID"] = None
-            try: info["firmwareChecksum"] = self.getFirmwareChecksum()
-            except : info["firmwareChecksum"] = None
-            try : info['Supply Voltage'] = self.getSupplyVoltage()
-            except : info['Supply Voltage'] = None
+    def getSnapshotKey(self) -> str:
+        """
+        Key of the product in the snapshot cache: its serial number (+ address on an RS485 bus, where the adapter serial number is shared)
+        """
+        serialNumber = self.serialNumber
+        if serialNumber is None:
+            try:
+                serialNumber = self.getSerialNumber()
+            except Exception:
+                return None
+        if self.connectionMode == "RS485":
+            return f"{serialNumber}/{self.productAddress}"
+        return serialNumber
+
+    def getSnapshot(self, full : bool = True, cache : SnapshotCache = None, refresh : bool = False) -> DeviceSnapshot:
+        """
+        Read the product information, static fields from the cache when the firmware checksum is unchanged
+        
+        INPUTS:
+            full: bool # If False, only the fields of the short device information are read
+            cache: SnapshotCache # Cache of the static fields (default: SnapshotCache.shared())
+            refresh: bool # If True, read the static fields from the product even if they are cached
+        OUTPUTS:
+            DeviceSnapshot
+        """
+        if self.RS485_BroadcastMode:
+            return
+        
+        if cache is None:
+            cache = SnapshotCache.shared()
+        snapshot = DeviceSnapshot(full = full)
+        start = time.monotonic()
+        
+        def read(fields: dict, name: str, getter, *args):
+            try:
+                fields[name] = getter(*args)
+            except Exception as e:
+                fields[name] = None
+                snapshot.errors[name] = str(e)
+        
+        static = snapshot.static
+        read(static, "serialNumber", self.getSerialNumber)
+        read(static, "serialPort", self.getSerialPort)
+        key = self.getSnapshotKey()
+        toCache = None
+        
+        # One transaction lock for the whole batch: no other thread interleaves its commands
+        with self.transactionLock():
+            read(static, "firmwareChecksum", self.getFirmwareChecksum)
+            cached = None if refresh or key is None else cache.get(key, static["firmwareChecksum"])
+            if cached is not None:
+                static.update({name: cached[name] for name in DeviceSnapshot.CACHED_KEYS if name in cached})
+                snapshot.fromCache = True
+            else:
+                read(static, "typeProduct", self.getType)
+                read(static, "productAddress", self.getAddress)
+                read(static, "firmwareVersion", self.getFirmwareVersion)
+                read(static, "uniqueID", self.getUniqueID)
+                if key is not None and static["firmwareChecksum"] is not None and not snapshot.errors:
+                    toCache = {name: static[name] for name in DeviceSnapshot.CACHED_KEYS}
             
-        return info
+            # The port configuration can be changed without a firmware change (setPortNumber): never cached
+            dynamic = snapshot.dynamic
+            snapshot.time = time.monotonic()
+            read(dynamic, "portNumber", self.getPortNumber)
+            if full:
+                read(dynamic, "productConfiguration", self.getProductConfiguration)
+            read(dynamic, "currentStatus", self.getCurrentStatus)
+            read(dynamic, "valveStatus", self.getValveStatus)
+            read(dynamic, "valvePosition", self.getValvePosition)
+            if self.productFamily is not None and "RVM" in self.productFamily:
+                dynamic["homed"] = None if dynamic["valvePosition"] is None else dynamic["valvePosition"] != 0
+            else:
+                read(dynamic, "homed", self.getHomeStatus)
+            if self.productFamily == "RVMFS":
+                read(dynamic, "speedModeValve", self.getSpeedModeValve)
+            elif self.productFamily == "Pump":
+                read(dynamic, "pumpStatus", self.getPumpStatus)
+            
+            if full:
+                read(dynamic, "numberValveMovements", self.getNumberValveMovements)
+                read(dynamic, "numberValveMovementsSinceLastReport", self.getNumberValveMovementsSinceLastReport)
+                read(dynamic, "answerMode", self.getAnswerMode)
+                if self.productFamily == "Pump":
+                    dynamic["syringeSize"] = self.syringeSize
+                    read(dynamic, "pumpSpeed", self.getSpeedPump)
+                    read(dynamic, "pumpSpeedMode", self.getSpeedModePump)
+                    read(dynamic, "plungerPosition", self.getPlungerPosition)
+                    read(dynamic, "realPlungerPosition", self.getRealPlungerPosition)
+                    read(dynamic, "microstepResolution", self.getMicrostepResolution)
+                    read(dynamic, "plungerCurrent", self.getPlungerCurrent)
+                    read(dynamic, "acceleration", self.getAcceleration)
+                    read(dynamic, "deceleration", self.getDeceleration)
+                read(dynamic, "Supply Voltage", self.getSupplyVoltage)
+        
+        if toCache is not None:
+            cache.put(key, static["firmwareChecksum"], toCache)     # Disk write outside of the transaction lock
+        snapshot.duration = time.monotonic() - start
+        return snapshot
 
 
 ############################################################################################################
@@ -1819,6 +3042,38 @@ class AMF:
         if block :
             self.pullAndWait()
             
+    def sequence(self) -> CommandSequence:
+        """
+        New command sequence builder for this product, see runSequence()
+        """
+        return CommandSequence(self.portnumber)
+
+    def runSequence(self, sequence: CommandSequence, block: bool = True) -> None:
+        """
+        Send a whole command sequence (moves, delays, loops) in one write; the product runs it on its own
+        
+        INPUTS:
+            sequence: CommandSequence # Sequence to run, see sequence()
+            block: If True, function will block until the product has run the whole sequence (quick mode status polling)
+        """
+        self.__check_status__(self.send(self.prepareCommand(sequence.build(), customCmd=True)))
+        self.startSequence(sequence)
+        if block:
+            self.pullAndWait(detailed_mode = False)
+
+    def startSequence(self, sequence: CommandSequence) -> None:
+        """
+        Remember the command sequence that was just started, like startMove does for a single move
+        """
+        predicted = sequence.predictDuration(self.valvePosition, self.portnumber, self.moveTimeModel, self.valveSpeed)
+        target = sequence.finalTarget()
+        if target is None:
+            target = self.valvePosition
+        # Tracked as a move with no distance: pullAndWait sleeps until its predicted end, and the model is not fed with it.
+        # Its end must be detected with the status byte (Q), the detailed valve status reports done between the moves.
+        self.pendingMove = {'target': target, 'distance': None, 'start': self.lastActionTime, 'predicted': predicted, 'sequence': True}
+        self.valvePosition = None
+
     def delay(self, delay : int, block : bool = True) -> None:
         """
         Ask the product to wait for some time in ms [0; +inf]
@@ -1838,7 +3093,10 @@ class AMF:
             block: If True, function will block until the product is ready for a new command
         """
         self.__check_status__(self.send(self.prepareCommand('home')))
-        if block: self.pullAndWait(homing_mode=True)
+        self.valvePosition = None
+        if block: 
+            self.pullAndWait(homing_mode=True)
+            self.valvePosition = 1
 
     def valveShortestPath(self, target: int, enforced : bool = False, block : bool = True) -> None:
         """
@@ -1850,12 +3108,12 @@ class AMF:
             block: If True, function will block until the product is ready for a new command
         """
         if target < 1 or target > self.portnumber:
-            breakpoint()
             raise ValueError("Target must be between 1 and "+str(self.portnumber))
         if enforced:
             self.__check_status__(self.send(self.prepareCommand('enforcedShortestPath', target)))
         else:
             self.__check_status__(self.send(self.prepareCommand('ShortestPath', target)))
+        self.startMove(target, 0, enforced)
         
         if block: self.pullAndWait()
     
@@ -1874,6 +3132,7 @@ class AMF:
             self.__check_status__(self.send(self.prepareCommand('enforcedIncrementalMove', target)))
         else:
             self.__check_status__(self.send(self.prepareCommand('incrementalMove', target)))
+        self.startMove(target, 1, enforced)
 
         if block: self.pullAndWait()
         
@@ -1898,6 +3157,7 @@ class AMF:
             self.__check_status__(self.send(self.prepareCommand('enforcedDecrementalMove', target)))
         else:
             self.__check_status__(self.send(self.prepareCommand('decrementalMove', target)))
+        self.startMove(target, 2, enforced)
 
         if block: self.pullAndWait()
         
@@ -1975,12 +3235,13 @@ class AMF:
         if clear_status:
             # We will send a dummy command to clear the busy status
             # In case the valve was moving, we need to wait until the end of the move to send it, so we keep sending this command until the product is not busy
-            # We wait for a maximum of 2.5 seconds if TIME_BETWEEN_COMMANDS is set to 0.1 s
+            # We wait for a maximum of 25 x TIME_BETWEEN_COMMANDS (2.5 seconds by default)
             for cnt in range(25):
                 ans = self.send(self.prepareCommand('dummyCommand'))
                 # Return when the product is not busy anymore, or if the product is in noAns mode
                 if self.noAns or ans is not None and ans != '' and ans[0] == "`": 
                     return
+                time.sleep(self.TIME_BETWEEN_COMMANDS)
             print("Failed to clear busy status after hard stop.")
                 
     def resume(self) -> None:
@@ -2162,11 +3423,748 @@ class AMF:
         self.send(self.prepareCommand('powerOff'))
     
     
+class DeviceStatus:
+    """
+        Latest status of a product, as published by the StatusPoller
+        """
+    def __init__(self) -> None:
+        self.valveStatus : int = None   # ?9200 code
+        self.pumpStatus : int = None    # ?9100 code (pumps only)
+        self.statusByte : str = None    # Status character of the last answer (Q)
+        self.position : int = None      # ?6
+        self.busy : bool = None
+        self.error : str = None         # Error description, None if the product reports no error
+        self.queryTime : float = None   # time.monotonic() at which the status query was sent
+        self.lastBusyTime : float = None    # Query time of the last status that reported the product busy
+        self.doneTime : float = None    # Query time of the status that reported the end of the last move
+        self.commErrors : int = 0       # Consecutive communication failures
+        self.seq : int = 0              # Incremented on every poll of this product
+
+    def copy(self) -> "DeviceStatus":
+        status = DeviceStatus()
+        status.__dict__.update(self.__dict__)
+        return status
+
+    def __str__(self) -> str:
+        state = "error" if self.error else ("busy" if self.busy else "done")
+        return f"{state} (valve status: {self.valveStatus}, position: {self.position})"
+
+
+class StatusPoller:
+    """
+        Background service polling the status of all registered products from a single thread.
+        
+        Products are visited in round robin: products being waited on or moving are polled as often as the rate
+        allows, idle products every idleInterval (by default not at all: a move sent to them is noticed within
+        IDLE_CHECK). Products with a predicted move end (see pullAndWait) are not polled before it. Waiters block on the published status instead of polling themselves, and subscribers
+        receive the state events "moveStarted", "moveDone", "error" and "commError".
+    
+        INPUTS:
+            rate: float - Maximum number of status visits per second on each serial port (0 = no limit)
+            queries: tuple - Status queries made at each visit: "valveStatus" (?9200, + ?9100 for pumps) or "status" (Q),
+                             and optionally "position" (?6). The position is always read when a move ends.
+            idleInterval: float - Polling period of products that are neither moving nor waited on, in s, None to leave them alone
+        """
+    EVENTS = ("moveStarted", "moveDone", "error", "commError")
+    IDLE_CHECK = 0.1    # Longest sleep of the polling thread while no product is due, in s (no serial traffic)
+
+    def __init__(self, rate: float = 50, queries: tuple = ("valveStatus",), idleInterval: float = None, autostart: bool = True) -> None:
+        self.rate = rate
+        self.queries = tuple(queries)
+        self.idleInterval = idleInterval
+        self.entries = {}           # id(AMF) -> _PollerEntry
+        self.subscribers = []
+        self.cond = threading.Condition()
+        self.thread = None
+        self.running = False
+        if autostart:
+            self.start()
+
+    class _PollerEntry:
+        def __init__(self, amf) -> None:
+            self.amf = amf
+            self.status = DeviceStatus()
+            self.waiters = 0
+            self.homing = False
+            self.nextPoll = 0.0     # None while idle: polled again only once waited on or moving
+            self.lastPoll = 0.0
+
+    # ------------------------------------------------------------------ registration
+
+    def register(self, amf: AMF) -> None:
+        """
+        Add a product to the polling round (registering twice has no effect)
+        """
+        with self.cond:
+            if id(amf) not in self.entries:
+                self.entries[id(amf)] = self._PollerEntry(amf)
+                self.cond.notify_all()
+
+    def unregister(self, amf: AMF) -> None:
+        with self.cond:
+            self.entries.pop(id(amf), None)
+            self.cond.notify_all()
+
+    def subscribe(self, callback) -> None:
+        """
+        callback(event, amf, status) is called from the polling thread for each state event
+        """
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def status(self, amf: AMF) -> DeviceStatus:
+        """
+        Latest status of a registered product (copy)
+        """
+        with self.cond:
+            return self._entry(amf).status.copy()
+
+    def _entry(self, amf: AMF) -> "_PollerEntry":
+        entry = self.entries.get(id(amf))
+        if entry is None:
+            raise KeyError(f"Product on port {amf.serialPort} is not registered in the status poller")
+        return entry
+
+    # ------------------------------------------------------------------ waiting
+
+    def waitForMove(self, amf: AMF, timeout: float = None, after: float = None, homing: bool = False) -> DeviceStatus:
+        """
+        Block until the product reports it is done, using only statuses queried after 'after'
+        (time.monotonic(), by default the time of the last action command written to the product).
+        Raise an Exception if the product reports an error, TimeoutError if timeout (s) expires.
+        
+        homing: bool # If True, the 'Not homed' status is considered busy (as in pullAndWait homing mode)
+        """
+        return self.waitAll([amf], timeout, None if after is None else {amf: after}, homing)[0]
+
+    def waitAll(self, amfs: list, timeout: float = None, after: dict = None, homing: bool = False) -> list:
+        """
+        Block until every product in amfs is done (see waitForMove), all of them being polled meanwhile.
+        Returns their statuses in the same order.
+        after: optional {amf: time} giving, per product, the time after which statuses are valid
+        """
+        for amf in amfs:
+            self.register(amf)
+        after = {id(amf): (after or {}).get(amf, amf.lastActionTime or 0.0) for amf in amfs}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            entries = [self._entry(amf) for amf in amfs]
+            for entry in entries:
+                entry.waiters += 1
+                entry.homing = entry.homing or homing
+                entry.nextPoll = 0.0
+            self.cond.notify_all()
+            try:
+                while True:
+                    pending = []
+                    for entry in entries:
+                        status = entry.status
+                        if status.queryTime is None or status.queryTime <= after[id(entry.amf)]:
+                            pending.append(entry)
+                        elif status.error:
+                            raise Exception(status.error)
+                        elif status.busy:
+                            pending.append(entry)
+                    if not pending:
+                        return [entry.status.copy() for entry in entries]
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"Product on port {pending[0].amf.serialPort} still busy after {timeout} s")
+                    self.cond.wait(remaining)
+            finally:
+                for entry in entries:
+                    entry.waiters -= 1
+                    if entry.waiters == 0:
+                        entry.homing = False
+                        if not entry.status.busy:   # Idle from now on, unless a move is sent (see _dueTime)
+                            entry.nextPoll = None if self.idleInterval is None else time.monotonic() + self.idleInterval
+
+    # ------------------------------------------------------------------ polling thread
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True, name="amfTools StatusPoller")
+        self.thread.start()
+
+    def stop(self) -> None:
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+        self.thread = None
+
+    def _dueTime(self, entry: "_PollerEntry") -> float:
+        due = entry.nextPoll
+        move = entry.amf.pendingMove
+        if due is None:
+            if move is None:
+                return None     # Idle
+            due = move['start']
+        if move is not None and move['predicted'] is not None:
+            # No need to ask before the predicted end of the move
+            due = max(due, move['start'] + move['predicted'] - max(AMF.POLL_INTERVAL, move['predicted']*AMF.PREDICTION_MARGIN))
+        return due
+
+    def _run(self) -> None:
+        lastVisit = {}  # serial port -> time of the last visit, the rate is enforced per bus
+        while True:
+            with self.cond:
+                if not self.running:
+                    return
+                entries = [e for e in self.entries.values() if e.amf.connected and not e.amf.RS485_BroadcastMode]
+                if not entries:
+                    self.cond.wait(0.5)
+                    continue
+                # Earliest due product first, least recently polled on ties (round robin)
+                period = 1/self.rate if self.rate else 0.0
+                dueTimes = {id(e): self._dueTime(e) for e in entries}
+                dueTime = lambda e: max(dueTimes[id(e)], lastVisit.get(e.amf.serialPort, 0.0) + period)
+                entries = [e for e in entries if dueTimes[id(e)] is not None]
+                if not entries:
+                    self.cond.wait(self.IDLE_CHECK)
+                    continue
+                entry = min(entries, key=lambda e: (dueTime(e), e.lastPoll))
+                now = time.monotonic()
+                due = dueTime(entry)
+                if due > now:
+                    self.cond.wait(min(due - now, self.IDLE_CHECK))
+                    continue
+            lastVisit[entry.amf.serialPort] = time.monotonic()
+            events = self._poll(entry)
+            for event in events:
+                for callback in list(self.subscribers):
+                    try:
+                        callback(event, entry.amf, entry.status.copy())
+                    except Exception as e:
+                        print(f"Warning: status subscriber failed: {e}")
+
+    def _poll(self, entry: "_PollerEntry") -> list:
+        """
+        Query the status of one product, update its DeviceStatus and return the events to publish
+        """
+        amf = entry.amf
+        previous = entry.status
+        status = previous.copy()
+        events = []
+        try:
+            with amf.transactionLock():
+                move = amf.pendingMove
+                if "status" in self.queries or (move is not None and move.get('sequence')):
+                    response = amf.getCurrentStatus()
+                    queryTime = amf.lastWriteTime
+                    status.statusByte = response[0]
+                    status.busy, status.error = self.decodeStatusByte(response, amf.ERROR_CODES)
+                else:
+                    status.valveStatus = amf.getValveStatus()
+                    queryTime = amf.lastWriteTime
+                    status.busy, status.error = self.decodeStatus(status.valveStatus, amf.VALVE_ERROR, "Valve", entry.homing)
+                    if amf.productFamily == "Pump" and not status.error:
+                        status.pumpStatus = amf.getPumpStatus()
+                        pumpBusy, status.error = self.decodeStatus(status.pumpStatus, amf.PUMP_ERROR, "Pump", entry.homing)
+                        status.busy = status.busy or pumpBusy
+                moveEnded = not status.busy and not status.error and (previous.busy or
+                            (move is not None and move is amf.pendingMove and queryTime > move['start']))
+                if moveEnded and move is not None and move is amf.pendingMove:
+                    lastBusyTime = previous.lastBusyTime if previous.busy else None
+                    wakeTime = queryTime if lastBusyTime is None and move['predicted'] is not None else None
+                    amf.completeMove(move, lastBusyTime, wakeTime)
+                if "position" in self.queries or moveEnded:
+                    status.position = amf.getValvePosition()
+            status.commErrors = 0
+        except Exception as e:
+            status.commErrors += 1
+            events.append("commError")
+            if status.commErrors > amf.maxCountError:
+                status.error = f"Communication error: {e}"
+                status.queryTime = time.monotonic()
+            self._publish(entry, status)
+            return events
+
+        status.queryTime = queryTime
+        if status.busy:
+            status.lastBusyTime = queryTime
+            if not previous.busy:
+                events.append("moveStarted")
+        elif moveEnded:
+            status.doneTime = queryTime
+            events.append("moveDone")
+        if status.error and status.error != previous.error:
+            events.append("error")
+        self._publish(entry, status)
+        return events
+
+    @staticmethod
+    def decodeStatus(code: int, table: dict, name: str, homing: bool) -> tuple:
+        """
+        (busy, error message) from a detailed status code
+        """
+        if code == 255 or (homing and code == 144):
+            return True, None
+        if code == 0 or (name == "Pump" and code == 138):
+            return False, None
+        description = table.get(str(code))
+        if description is None:
+            return False, f"Unknown {name.lower()} error code: {code}"
+        return False, f"{name} error: {description[1]}: {description[2]}"
+
+    @staticmethod
+    def decodeStatusByte(response: str, table: dict) -> tuple:
+        """
+        (busy, error message) from the status byte of an answer (e.g. to Q)
+        """
+        code = table.get(response[0].upper(), [None, "Unknown status"])
+        return not (ord(response[0]) & 0x20), None if code[0] == 0 else f"Error: {code[1]} (error code: {response[0]})"
+
+    def _publish(self, entry: "_PollerEntry", status: DeviceStatus) -> None:
+        with self.cond:
+            status.seq = entry.status.seq + 1
+            entry.status = status
+            now = time.monotonic()
+            entry.lastPoll = now
+            if entry.waiters or status.busy or entry.amf.pendingMove is not None:
+                entry.nextPoll = now
+            else:
+                entry.nextPoll = None if self.idleInterval is None else now + self.idleInterval
+            self.cond.notify_all()
+
+
+class BroadcastGroup:
+    """
+        Products of one RS485 bus started together by a single broadcast frame.
+
+        Each member is first loaded with its own command, sent without its final R (the product stores it),
+        then one "/_R" broadcast starts all of them at the same time. The end of each command is polled on its address.
+
+            group = BroadcastGroup([valve1, valve2, valve3])
+            group.valveShortestPath({valve1: 3, valve2: 5, "3": 1})     # Members by AMF object or by address
+
+        INPUTS:
+            members: list - Connected AMF products on the same RS485 serial port, with distinct addresses
+        """
+    def __init__(self, members: list = ()) -> None:
+        self.members = {}           # Address -> AMF
+        self.serialPort = None
+        self.lastTriggerTime = None # time.monotonic() of the last broadcast
+        for amf in members:
+            self.add(amf)
+
+    def add(self, amf: "AMF") -> None:
+        address = str(amf.productAddress).upper()
+        if amf.connectionMode != "RS485":
+            raise ValueError(f"Product on port {amf.serialPort} is not in RS485 mode")
+        if address == "_":
+            raise ValueError("Group members must be addressed products, not the broadcast address")
+        if self.serialPort is not None and amf.serialPort != self.serialPort:
+            raise ValueError(f"Product {address} is on port {amf.serialPort}, the group bus is on port {self.serialPort}")
+        if self.members.get(address, amf) is not amf:
+            raise ValueError(f"Address {address} is already used in the group")
+        self.serialPort = amf.serialPort
+        self.members[address] = amf
+
+    def remove(self, amf: "AMF") -> None:
+        self.members.pop(str(amf.productAddress).upper(), None)
+
+    def member(self, key) -> "AMF":
+        """
+        Member from its AMF object or its address
+        """
+        amf = self.members.get(str(key.productAddress if isinstance(key, AMF) else key).upper())
+        if amf is None or (isinstance(key, AMF) and amf is not key):
+            raise KeyError(f"Product {key} is not in the group")
+        return amf
+
+    def load(self, key, command) -> None:
+        """
+        Store a command on one member without starting it
+        
+        INPUTS:
+            key: AMF or str - Member or its address
+            command: str or CommandSequence - Prepared command (ex: "/1b3R", the final R is removed) or sequence
+        """
+        amf = self.member(key)
+        if isinstance(command, CommandSequence):
+            command = amf.prepareCommand(command.build(), customCmd=True)
+        if command.endswith("R"):
+            command = command[:-1]
+        amf.__check_status__(amf.send(command))
+
+    def trigger(self) -> float:
+        """
+        Start the commands loaded on every member with one broadcast R. Returns the time of the write (time.monotonic())
+        """
+        if not self.members:
+            raise ValueError("Empty group")
+        lead = next(iter(self.members.values()))
+        command = lead.FIRST_CHAR + "_" + lead.functions['resume'] + lead.LAST_CHAR
+        with lead.transactionLock():
+            lead.waitForPacing()
+            lead.getFrameReader().reset()
+            try:
+                lead.productserial.write(command.encode())
+                self.lastTriggerTime = time.monotonic()
+            finally:
+                lead.schedulePacing(command, answered = False)   # Broadcasts are never answered
+        for amf in self.members.values():
+            amf.lastWriteTime = amf.lastActionTime = self.lastTriggerTime
+            amf.pendingMove = None
+        return self.lastTriggerTime
+
+    def valveMove(self, targets: dict, mode: int = 0, enforced: bool = False, block: bool = True, timeout: float = None) -> dict:
+        """
+        Move several valves at once (mode 0: ShortestPath, 1: IncrementalMove, 2: DecrementalMove)
+        
+        INPUTS:
+            targets: dict - {member or address: target port}
+            block: If True, wait for every valve to be done and return {address: duration in s}
+            timeout: float - Max wait in s (None: no limit)
+        """
+        if mode not in (0, 1, 2):
+            raise ValueError("Mode must be between 0 and 2")
+        name = ('ShortestPath', 'incrementalMove', 'decrementalMove')[mode]
+        if enforced:
+            name = 'enforced' + name[0].upper() + name[1:]
+        moves = {}
+        for key, target in targets.items():
+            amf = self.member(key)
+            if target < 1 or target > amf.portnumber:
+                raise ValueError("Target must be between 1 and "+str(amf.portnumber))
+            moves[amf] = target
+        for amf, target in moves.items():
+            self.load(amf, amf.prepareCommand(name, target))
+        self.trigger()
+        for amf, target in moves.items():
+            amf.startMove(target, mode, enforced)
+        if block:
+            return self.wait(list(moves), timeout)
+
+    def valveShortestPath(self, targets: dict, enforced: bool = False, block: bool = True, timeout: float = None) -> dict:
+        return self.valveMove(targets, 0, enforced, block, timeout)
+
+    def runSequences(self, sequences: dict, block: bool = True, timeout: float = None) -> dict:
+        """
+        Start a CommandSequence on several members at once ({member or address: sequence}), see AMF.runSequence
+        """
+        members = {self.member(key): sequence for key, sequence in sequences.items()}
+        for amf, sequence in members.items():
+            self.load(amf, sequence)
+        self.trigger()
+        for amf, sequence in members.items():
+            amf.startSequence(sequence)
+        if block:
+            return self.wait(list(members), timeout)
+
+    def home(self, block: bool = True, timeout: float = None) -> dict:
+        """
+        Home every member at once
+        """
+        for amf in self.members.values():
+            self.load(amf, amf.prepareCommand('home'))
+        self.trigger()
+        for amf in self.members.values():
+            amf.valvePosition = None
+        if block:
+            durations = self.wait(timeout = timeout, homing = True)
+            for amf in self.members.values():
+                amf.valvePosition = 1
+            return durations
+
+    def wait(self, members: list = None, timeout: float = None, homing: bool = False) -> dict:
+        """
+        Poll each member on its own address until its command is done.
+        Returns {address: s between the broadcast and the status query reporting done}.
+        Raise the first product error, or TimeoutError after timeout (s).
+        """
+        pending = {str(amf.productAddress).upper(): amf for amf in (members if members is not None else self.members.values())}
+        moves = {address: amf.pendingMove for address, amf in pending.items()}
+        nextPoll = {}
+        lastBusy = {}
+        errors = {}
+        durations = {}
+        for address, move in moves.items():
+            nextPoll[address] = self.lastTriggerTime + AMF.POLL_INTERVAL
+            if move is not None and move['predicted'] is not None:
+                nextPoll[address] = max(nextPoll[address], move['start'] + move['predicted'] - max(AMF.POLL_INTERVAL, move['predicted']*AMF.PREDICTION_MARGIN))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while pending:
+            address = min(pending, key=nextPoll.get)
+            delay = nextPoll[address] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            amf = pending[address]
+            move = moves[address]
+            try:
+                if move is not None and move.get('sequence'):
+                    busy, error = StatusPoller.decodeStatusByte(amf.getCurrentStatus(), amf.ERROR_CODES)
+                else:
+                    busy, error = StatusPoller.decodeStatus(amf.getValveStatus(), amf.VALVE_ERROR, "Valve", homing)
+                queryTime = amf.lastWriteTime
+                if amf.productFamily == "Pump" and not error:
+                    pumpBusy, error = StatusPoller.decodeStatus(amf.getPumpStatus(), amf.PUMP_ERROR, "Pump", homing)
+                    busy = busy or pumpBusy
+                errors[address] = 0
+            except (ConnectionError, ValueError) as e:
+                errors[address] = errors.get(address, 0) + 1
+                if errors[address] > amf.maxCountError:
+                    raise Exception(f"Product {address}: lost track of the command: {e}")
+                busy, error = True, None
+                queryTime = time.monotonic()
+            if error:
+                raise Exception(f"Product {address}: {error}")
+            if busy:
+                lastBusy[address] = queryTime
+                nextPoll[address] = time.monotonic() + AMF.POLL_INTERVAL
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"Products {', '.join(pending)} still busy after {timeout} s")
+                continue
+            if move is not None and move is amf.pendingMove:
+                wakeTime = queryTime if address not in lastBusy and move['predicted'] is not None else None
+                amf.completeMove(move, lastBusy.get(address), wakeTime)
+            durations[address] = queryTime - self.lastTriggerTime
+            del pending[address]
+        return durations
+
+
+class DeviceMonitor:
+    """
+        Background watcher of the serial port enumeration: reports the USB serial ports (identified by the serial number
+        of the product or adapter) that appear or disappear, e.g. when a cable is unplugged and plugged back in.
+        The enumeration (serial.tools.list_ports.comports()) is polled, so no OS-specific hot-plug service is needed.
+        
+        INPUTS:
+            onArrival: callable(serialNumber, port) - Called from the monitor thread when a port appears (or moves to another name)
+            onRemoval: callable(serialNumber, port) - Called from the monitor thread when a port disappears
+            serialNumbers: iterable - Serial numbers to watch (None: every port that may lead to an AMF product)
+            interval: float - Enumeration period, in s
+        """
+    def __init__(self, onArrival = None, onRemoval = None, serialNumbers = None, interval: float = 1.0, autostart: bool = True) -> None:
+        self.onArrival = onArrival
+        self.onRemoval = onRemoval
+        self.serialNumbers = None if serialNumbers is None else set(serialNumbers)
+        self.interval = interval
+        self.ports = self.scan()    # Serial number -> port currently enumerated
+        self.stopEvent = threading.Event()
+        self.thread = None
+        if autostart:
+            self.start()
+
+    def match(self, serialNumber: str) -> str:
+        """
+        Watched serial number a port reports, None if it is not watched
+        """
+        if not serialNumber:
+            return None
+        if self.serialNumbers is None or serialNumber in self.serialNumbers:
+            return serialNumber
+        if os.name == 'nt':
+            # As in AMF.getSerialPort: Windows may add a letter to the serial number or cut it at a hyphen
+            for watched in self.serialNumbers:
+                if watched.upper() in serialNumber.upper() or serialNumber.upper() in watched.upper():
+                    return watched
+        return None
+
+    def scan(self) -> dict:
+        ports = {}
+        for com in serial.tools.list_ports.comports():
+            serialNumber = self.match(com.serial_number)
+            if serialNumber is not None and util.isCandidatePort(com):
+                ports[serialNumber] = com.device
+        return ports
+
+    def poll(self) -> tuple:
+        """
+        Compare the enumeration with the previous one and call the handlers. Returns (arrived, removed) as {serialNumber: port}
+        """
+        current = self.scan()
+        previous, self.ports = self.ports, current
+        removed = {sn: port for sn, port in previous.items() if current.get(sn) != port}
+        arrived = {sn: port for sn, port in current.items() if previous.get(sn) != port}
+        for serialNumber, port in removed.items():
+            self._notify(self.onRemoval, serialNumber, port)
+        for serialNumber, port in arrived.items():
+            self._notify(self.onArrival, serialNumber, port)
+        return arrived, removed
+
+    @staticmethod
+    def _notify(handler, serialNumber: str, port: str) -> None:
+        if handler is None:
+            return
+        try:
+            handler(serialNumber, port)
+        except Exception as e:
+            print(f"Warning: device monitor handler failed for {serialNumber} on {port}: {e}")
+
+    def start(self) -> None:
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopEvent.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True, name="DeviceMonitor")
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopEvent.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+        self.thread = None
+
+    def _run(self) -> None:
+        while not self.stopEvent.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Warning: device monitor could not list the serial ports: {e}")
+
+
 class util:    
     """ 
     Utilitary class used to detect AMF devices connected to the computer
     """
 
+    MAX_DISCOVERY_THREADS = 16
+    MAX_SILENT_ADDRESSES = 3    # RS485 scan of all the addresses: consecutive silent ones after which the rest are skipped
+    PROBE_POLICY = TransactionPolicy(queryRetries=0, failureThreshold=None)    # A silent port is an answer: no retry, no breaker
+    # USB vendor IDs of the AMF products (FTDI) and of the common USB/RS232/RS485 adapters
+    SERIAL_ADAPTER_VIDS = {
+        0x0403: 'FTDI',
+        0x067B: 'Prolific',
+        0x10C4: 'Silicon Labs',
+        0x1A86: 'QinHeng (CH340)',
+    }
+    EXCLUDED_PORT_DESCRIPTIONS = ('bluetooth', 'modem')
+
+    def isCandidatePort(portInfo) -> bool:
+        """
+        Whether a port listed by serial.tools.list_ports.comports() may lead to an AMF product.
+        USB ports from other vendors (keyboards, debug probes, phones...) and Bluetooth/modem ports are skipped,
+        ports with no USB information (native RS232) are kept.
+        """
+        description = f"{portInfo.description or ''} {portInfo.manufacturer or ''}".lower()
+        if any(word in description for word in util.EXCLUDED_PORT_DESCRIPTIONS):
+            return False
+        if portInfo.vid is not None and portInfo.vid not in util.SERIAL_ADAPTER_VIDS:
+            return False
+        return True
+
+    def verifyDevice(device: Device, uniqueID: str) -> bool:
+        """
+        Check with a single unique ID query (?9000) that the product described by device still answers on its port
+        """
+        product = None
+        try:
+            product = AMF(device, autoconnect = False, silentMode = True)
+            product.policy = util.PROBE_POLICY
+            product.responseTimeout = 0.1
+            product.connect(serialTimeout = 0.1, probe = False)
+            return product.getUniqueID() == uniqueID
+        except:
+            return False
+        finally:
+            try:
+                product.disconnect()
+            except:
+                pass
+
+    def probeUSBPort(port: str, product_family: str = None) -> Device:
+        """
+        Connect to the product answering on a USB/RS232 port, return its Device or None
+        """
+        product = None
+        try:
+            product = AMF(port, autoconnect = False)
+            product.policy = util.PROBE_POLICY
+            product.responseTimeout = 0.1   # Use a short timeout as the product will answer quickly to the questions sent
+            product.connect(serialTimeout = 0.1)    # This function will fail if the address does not match the product's one
+            dev = Device()
+            # If an RS232 adapter is used, it is the adapter S/N and not the AMF product S/N
+            dev.serialnumber = product.serialNumber
+            dev.comPort = port
+            dev.deviceType = product.typeProduct
+            dev.deviceFamily = product.productFamily
+            dev.connectionMode = product.connectionMode
+            dev.productAddress = product.getAddress()
+            product.disconnect()
+            if product_family is None or product_family.lower() in dev.deviceFamily.lower():
+                return dev
+        except:
+            try:
+                product.disconnect()
+            except:
+                pass
+        return None
+
+    def probeRS485Port(port: str, address_list: list, product_family: str = None, max_silent: int = None) -> list:
+        """
+        Scan the RS485 addresses of a port, return the list of Device found
+        The scan stops as soon as the port turns out to be unusable (cannot be opened, or product in USB/RS232 mode),
+        or after max_silent consecutive addresses without answer (None to scan them all)
+        """
+        found = []
+        silent = 0
+        if SerialBus.get(port) is None:
+            # Try with the broadcast address ("_") first, to ensure the products are configured in RS485 mode
+            # (a bus already open in this process is known to be in RS485 mode)
+            # We do not specify the connectionMode as RS485, in order to throw an error when trying to get answers with the broadcast address 
+            # If we specify RS485 mode, the product will not try getting answers when using the broadcast address
+            product = None
+            try:
+                product = AMF(port, autoconnect = False)
+                product.policy = util.PROBE_POLICY
+                product.responseTimeout = 0.1   # Use a short timeout as the product will answer quickly to the questions sent
+                product.connect(serialTimeout = 0.1)
+                # If we are connected and broadcast address is used, we are not in RS485 mode so we skip this serial port
+                product.disconnect()
+                return found
+            except:
+                try:
+                    product.disconnect()
+                except:
+                    pass
+                if product is None or product.productserial is None:
+                    return found    # The port could not even be opened, no need to try every address
+        
+        # Keep the bus open during the scan, every address reuses its connection
+        try:
+            bus = SerialBus.acquire(port, AMF.serialBaudrate, timeout=0.1)
+        except serial.SerialException:
+            return found
+        try:
+            for addr in address_list:
+                product = AMF(port, autoconnect = False, productAddress=addr, connectionMode="RS485")
+                product.policy = util.PROBE_POLICY
+                try:
+                    product.responseTimeout = 0.1   # Use a short timeout as the product will answer quickly to the questions sent
+                    product.connect(serialTimeout = 0.1)   
+                    dev = Device()
+                    # If an RS485 adapter is used, it is the adapter S/N and not the AMF product S/N
+                    dev.serialnumber = product.serialNumber  
+                    dev.comPort = port                             
+                    dev.deviceType = product.typeProduct
+                    dev.deviceFamily = product.productFamily
+                    dev.connectionMode = product.connectionMode
+                    dev.productAddress = product.getAddress()                            
+                    product.disconnect()                            
+                    silent = 0
+                    if product_family is None or product_family.lower() in dev.deviceFamily.lower():
+                        found.append(dev)
+                except:
+                    silent += 1
+                    try:
+                        product.disconnect()
+                    except:
+                        pass
+                if bus.serial is None or not bus.serial.is_open:
+                    break   # The adapter was unplugged during the scan
+                if max_silent is not None and silent >= max_silent:
+                    break   # Addresses are given in order: the next ones are most likely free too
+        finally:
+            bus.release()
+        return found
+
     def getProductList(connection_mode : str = None, product_family : str = None, port = None, address_list = None, silent_mode : bool = False) -> list:
         """
         Detect connected AMF devices depending on connection type and OS.
@@ -2175,7 +4173,7 @@ class util:
             connection_mode (str or None): "USB","RS232", "RS485", or None for auto-detection
             product_family (str or None): "Pump", "RVMLP", "RVMFS" or None for auto-detection
             port (str or list or None): COM port for detection (None = scan all the ports)
-            address_list (str iterable or None): Addresses to scan (only for RS485, as we browse every address possible)
+            address_list (str iterable or None): Addresses to scan (only for RS485). None scans 1 to E, stopping after MAX_SILENT_ADDRESSES silent ones in a row
             silent_mode (bool): If True, do not print the number of found devices
         Returns:
             list: List of Device instances (populated with serial number, port, type, address)
@@ -2188,16 +4186,14 @@ class util:
         if product_family is not None and product_family.lower() not in fam_keys_lower:
             raise ValueError(f"Unexpected product_family specified: {product_family}")
     
-        if address_list is None:
-            address_list  = ["1","2","3","4","5","6","7","8","9","A","B","C","D","E"]  
-            
         if port is not None:
             if isinstance(port, str):
                 port = [port]
             elif not isinstance(port, list):
                 raise TypeError("Port should be of type str, list or None")
 
-        ports_to_scan = port if port is not None else [p.device for p in serial.tools.list_ports.comports()] 
+        # Ports given by the caller are always probed, the others only if they may be an AMF product or a serial adapter
+        ports_to_scan = port if port is not None else [p.device for p in serial.tools.list_ports.comports() if util.isCandidatePort(p)] 
 
         # Auto mode if no connection_type is specified
         if connection_mode is None:
@@ -2225,28 +4221,13 @@ class util:
         if "USB" in connection_mode.upper() or "RS232" in connection_mode.upper():   
             if not silent_mode:
                 print("\nLooking for AMF devices connected by USB/RS232...")                     
-            # We check USB/RS232 together because the products will answer to broadcast address                 
-            for p in ports_to_scan:
-                try:
-                    product = AMF(p, autoconnect = False)
-                    product.responseTimeout = 0.1   # Use a short timeout as the product will answer quickly to the questions sent
-                    product.connect(serialTimeout = 0.1)    # This function will fail if the address does not match the product's one
-                    dev = Device()
-                    # If an RS232 adapter is used, it is the adapter S/N and not the AMF product S/N
-                    dev.serialnumber = product.serialNumber
-                    dev.comPort = p
-                    dev.deviceType = product.typeProduct
-                    dev.deviceFamily = product.productFamily
-                    dev.connectionMode = product.connectionMode
-                    dev.productAddress = product.getAddress()
-                    product.disconnect()
-                    if product_family is None or product_family.lower() in dev.deviceFamily.lower():
-                        result.append(dev)
-                except:
-                    try:
-                        product.disconnect()
-                    except:
-                        pass
+            # We check USB/RS232 together because the products will answer to broadcast address
+            # Every port is a separate link, so they are probed in parallel (results keep the port order)
+            if ports_to_scan:
+                with ThreadPoolExecutor(max_workers=min(len(ports_to_scan), util.MAX_DISCOVERY_THREADS)) as executor:
+                    for dev in executor.map(lambda p: util.probeUSBPort(p, product_family), ports_to_scan):
+                        if dev is not None:
+                            result.append(dev)
             
             if result and not silent_mode:
                    print(f"Found {len(result)} device{'s' if len(result) > 1 else ''}")
@@ -2257,43 +4238,18 @@ class util:
         elif "RS485" in connection_mode.upper():            
             if not silent_mode:
                 print("\nLooking for AMF devices connected by RS485...")
+            
+            # When every address is scanned, a bus stops being scanned after a few silent addresses in a row
+            max_silent = None
+            if address_list is None:
+                address_list  = ["1","2","3","4","5","6","7","8","9","A","B","C","D","E"]
+                max_silent = util.MAX_SILENT_ADDRESSES
                 
-            # We test with no address so broadcast will be used, to check that the device is not in RS232 mode
-            address_list = [None] + address_list
-            for p in ports_to_scan:
-                for addr in address_list:                    
-                    try:
-                        if addr == None: # Try with the broadcast address ("_") to ensure the product is configured in RS485 mode                
-                            # We do not specify the connectionMode as RS485, in order to throw an error when trying to get answers with the broadcast address 
-                            # If we specify RS485 mode, the product will not try getting answers when using the broadcast address
-                            product = AMF(p, autoconnect = False)
-                        else:
-                            product = AMF(p, autoconnect = False, productAddress=addr, connectionMode="RS485")
-                            
-                        product.responseTimeout = 0.1   # Use a short timeout as the product will answer quickly to the questions sent
-                        product.connect(serialTimeout = 0.1)   
-                        
-                        # If we are connected and broadcast address is used, we are not in RS485 mode so we skip this serial port
-                        if addr == None:
-                            product.disconnect()
-                            #print(f"USB/RS232 device detected on {p}, skipping it")
-                            break
-                        dev = Device()
-                        # If an RS485 adapter is used, it is the adapter S/N and not the AMF product S/N
-                        dev.serialnumber = product.serialNumber  
-                        dev.comPort = p                             
-                        dev.deviceType = product.typeProduct
-                        dev.deviceFamily = product.productFamily
-                        dev.connectionMode = product.connectionMode
-                        dev.productAddress = product.getAddress()                            
-                        product.disconnect()                            
-                        if product_family is None or product_family.lower() in dev.deviceFamily.lower():
-                            result.append(dev)
-                    except:
-                        try:
-                            product.disconnect()
-                        except:
-                            pass
+            # The addresses of a bus are scanned one after the other, independent buses in parallel
+            if ports_to_scan:
+                with ThreadPoolExecutor(max_workers=min(len(ports_to_scan), util.MAX_DISCOVERY_THREADS)) as executor:
+                    for devices in executor.map(lambda p: util.probeRS485Port(p, address_list, product_family, max_silent), ports_to_scan):
+                        result.extend(devices)
             
             if result and not silent_mode:
                 print(f"Found {len(result)} device{'s' if len(result) > 1 else ''}")
@@ -2302,6 +4258,28 @@ class util:
                 
         return result 
     
+    def getSnapshots(products : list, full : bool = True, cache : SnapshotCache = None) -> list:
+        """
+        Read the snapshots of several products concurrently (see AMF.getSnapshot), in the order of the list
+        
+        INPUTS:
+            products: list # AMF objects. Products on the same RS485 bus take turns on it
+            full: bool # Full or short device information
+            cache: SnapshotCache # Cache of the static fields (default: SnapshotCache.shared())
+        OUTPUTS:
+            list of DeviceSnapshot (None for a product whose snapshot failed)
+        """
+        def snapshot(amf):
+            try:
+                return amf.getSnapshot(full = full, cache = cache)
+            except Exception:
+                return None
+        
+        if not products:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(products), util.MAX_DISCOVERY_THREADS)) as executor:
+            return list(executor.map(snapshot, products))
+    
 
 if __name__ == "__main__":
 
@@ -2316,13 +4294,16 @@ if __name__ == "__main__":
             print(f"-> {product}")
         devices = []
         try:
-            for idx, product in enumerate(list_product):
-                amf = AMF(product)
-                devices.append(amf)
+            # Connection and snapshot of every product in parallel, printed in the order of the list
+            with ThreadPoolExecutor(max_workers=min(len(list_product), util.MAX_DISCOVERY_THREADS)) as executor:
+                for amf in executor.map(AMF, list_product):
+                    devices.append(amf)
+            for idx, snapshot in enumerate(util.getSnapshots(devices, full=False)):
                 print(f"\n***************** Data from AMF product {idx+1} ******************")
-                data = amf.getDeviceInformation(full=False)
-                for key, value in data.items():
-                    print(f"{key}: {value}")
+                if snapshot is None:
+                    print("[ERROR] Failed while reading device info")
+                else:
+                    print(snapshot)
                 print("**************************************************************")
         except Exception as e:
             print(f"\n[ERROR] Failed while reading device info: {e}")
@@ -0,0 +1,234 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#*******************************************************************************
+# File: actor.py
+# Package: AMFTools
+# Description: Thread-safe command actor wrapping one AMF product
+# Python Version: 3.11.4
+#*******************************************************************************
+
+"""
+Opt-in actor wrapper: every command for one product goes through a single worker thread.
+
+    valve = AMFActor(device)
+    move = valve.valveShortestPath(4)       # Future, resolved when the valve reports the move done
+    position = valve.getValvePosition()     # Future, runs after the move (same lane, FIFO)
+    valve.hardStop()                        # Jumps ahead of everything queued
+
+Any AMF method can be called on the actor and returns a concurrent.futures.Future. Commands run in
+submission order, except the stop lane (hardStop, halt, resume, powerOff, abort) which runs as soon as
+the command in flight has been answered. Moves (methods with a 'block' argument) are sent non-blocking
+and their completion is polled by tasks re-queued in the worker, so a stop never waits for a move to end.
+"""
+
+import inspect
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import amfTools
+
+
+class AMFActor:
+    """
+        Per-product command actor.
+
+        INPUTS:
+            product: AMF, Device or str - Product to drive (anything else than an AMF is passed to amfTools.AMF)
+            autostart: bool - Start the worker thread immediately
+            amfKwargs: Extra arguments for amfTools.AMF when product is not an AMF
+        """
+    LANE_STOP = 0       # hardStop, halt, resume, powerOff, abort
+    LANE_COMMAND = 1    # Everything else, in submission order
+    STOP_METHODS = ('hardStop', 'halt', 'resume', 'powerOff')
+
+    def __init__(self, product, autostart: bool = True, **amfKwargs) -> None:
+        self.amf = product if isinstance(product, amfTools.AMF) else amfTools.AMF(product, **amfKwargs)
+        self.lanes = {self.LANE_STOP: deque(), self.LANE_COMMAND: deque()}
+        self.cond = threading.Condition()
+        self.activeMove = None      # dict describing the move in flight (future, method, homing, pollTime, lastBusyTime)
+        self.thread = None
+        self.running = False
+        if autostart:
+            self.start()
+
+    # ------------------------------------------------------------------ lifecycle
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True, name=f"AMFActor {self.amf.serialPort}")
+        self.thread.start()
+
+    def stop(self, disconnect: bool = False) -> None:
+        """
+        Stop the worker thread once the command in flight is done. Queued commands are cancelled.
+        """
+        with self.cond:
+            self.running = False
+            self._cancelQueued(self.LANE_COMMAND)
+            self._cancelQueued(self.LANE_STOP)
+            self.cond.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+        self.thread = None
+        if disconnect:
+            self.amf.disconnect()
+
+    def __enter__(self) -> "AMFActor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop(disconnect=True)
+
+    # ------------------------------------------------------------------ submission
+
+    def submit(self, method: str, *args, lane: int = None, **kwargs) -> Future:
+        """
+        Queue a call to the AMF method 'method' and return its Future.
+        Moves resolve when the product reports they are done (or raise the product error).
+        """
+        function = getattr(self.amf, method)
+        if lane is None:
+            lane = self.LANE_STOP if method in self.STOP_METHODS else self.LANE_COMMAND
+        signature = inspect.signature(function)
+        isMove = False
+        if 'block' in signature.parameters:
+            bound = signature.bind(*args, **kwargs)     # 'block' may be given by position
+            bound.apply_defaults()
+            isMove = bool(bound.arguments['block'])
+            if isMove:
+                bound.arguments['block'] = False    # The actor polls the completion itself
+                args, kwargs = bound.args, bound.kwargs
+        future = Future()
+        with self.cond:
+            if not self.running:
+                raise RuntimeError(f"Actor of product on port {self.amf.serialPort} is stopped")
+            self.lanes[lane].append((future, method, function, args, kwargs, isMove))
+            self.cond.notify_all()
+        return future
+
+    def call(self, method: str, *args, timeout: float = None, **kwargs):
+        """
+        Submit and wait for the result
+        """
+        return self.submit(method, *args, **kwargs).result(timeout)
+
+    def abort(self) -> Future:
+        """
+        Cancel every queued command and hard stop the product (stop lane)
+        """
+        with self.cond:
+            self._cancelQueued(self.LANE_COMMAND)
+        return self.submit('hardStop')
+
+    def __getattr__(self, name: str):
+        # Proxy the AMF methods: actor.valveShortestPath(3) == actor.submit('valveShortestPath', 3)
+        amf = self.__dict__.get('amf')
+        if amf is None or name.startswith('_') or not callable(getattr(type(amf), name, None)):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.submit(name, *args, **kwargs)
+
+    def _cancelQueued(self, lane: int) -> None:
+        while self.lanes[lane]:
+            self.lanes[lane].popleft()[0].cancel()
+
+    # ------------------------------------------------------------------ worker
+
+    def _next(self):
+        """
+        Next task to run: stop lane first, then the move poll when due, then the next command once no move is in flight
+        """
+        with self.cond:
+            while self.running:
+                if self.lanes[self.LANE_STOP]:
+                    return self.lanes[self.LANE_STOP].popleft()
+                now = time.monotonic()
+                if self.activeMove is not None:
+                    if now >= self.activeMove['pollTime']:
+                        return None     # Poll the move in flight
+                    self.cond.wait(self.activeMove['pollTime'] - now)
+                elif self.lanes[self.LANE_COMMAND]:
+                    return self.lanes[self.LANE_COMMAND].popleft()
+                else:
+                    self.cond.wait()
+            return False
+
+    def _run(self) -> None:
+        while True:
+            task = self._next()
+            if task is False:
+                self._failActiveMove(RuntimeError("Actor stopped before the end of the move"))
+                return
+            if task is None:
+                self._pollMove()
+                continue
+            future, method, function, args, kwargs, isMove = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            if isMove:
+                self._startMove(future, method)
+            else:
+                if method == 'hardStop':
+                    self._failActiveMove(RuntimeError(f"Move interrupted by hardStop on port {self.amf.serialPort}"))
+                future.set_result(result)
+
+    def _startMove(self, future: Future, method: str) -> None:
+        pollTime = time.monotonic() + amfTools.AMF.POLL_INTERVAL
+        move = self.amf.pendingMove
+        if move is not None and move['predicted'] is not None:
+            pollTime = move['start'] + move['predicted'] - max(amfTools.AMF.POLL_INTERVAL, move['predicted']*amfTools.AMF.PREDICTION_MARGIN)
+        self.activeMove = {'future': future, 'method': method, 'homing': method == 'home',
+                           'pollTime': pollTime, 'lastBusyTime': None, 'errors': 0}
+
+    def _failActiveMove(self, error: Exception) -> None:
+        active, self.activeMove = self.activeMove, None
+        if active is not None and not active['future'].done():
+            active['future'].set_exception(error)
+
+    def _pollMove(self) -> None:
+        active = self.activeMove
+        amf = self.amf
+        try:
+            if amf.pendingMove is not None and amf.pendingMove.get('sequence'):
+                # Command sequence (runSequence): only the status byte stays busy until its end
+                busy, error = amfTools.StatusPoller.decodeStatusByte(amf.getCurrentStatus(), amf.ERROR_CODES)
+                queryTime = amf.lastWriteTime
+            else:
+                busy, error = amfTools.StatusPoller.decodeStatus(amf.getValveStatus(), amf.VALVE_ERROR, "Valve", active['homing'])
+                queryTime = amf.lastWriteTime
+            if amf.productFamily == "Pump" and not error:
+                pumpBusy, error = amfTools.StatusPoller.decodeStatus(amf.getPumpStatus(), amf.PUMP_ERROR, "Pump", active['homing'])
+                busy = busy or pumpBusy
+        except Exception as e:
+            active['errors'] += 1
+            if active['errors'] > amf.maxCountError:
+                self._failActiveMove(ConnectionError(f"Lost track of the move on port {amf.serialPort}: {e}"))
+            else:
+                active['pollTime'] = time.monotonic() + amfTools.AMF.POLL_INTERVAL
+            return
+        active['errors'] = 0
+        if error:
+            amf.pendingMove = None
+            self._failActiveMove(Exception(error))
+        elif busy:
+            active['lastBusyTime'] = queryTime
+            active['pollTime'] = time.monotonic() + amfTools.AMF.POLL_INTERVAL
+        else:
+            move = amf.pendingMove
+            if move is not None:
+                # Done at the first poll: only known to have ended before it (see AMF.completeMove)
+                wakeTime = queryTime if active['lastBusyTime'] is None and move['predicted'] is not None else None
+                amf.completeMove(move, active['lastBusyTime'], wakeTime)
+            if active['homing']:
+                amf.valvePosition = 1
+            self.activeMove = None
+            active['future'].set_result(None)
@@ -0,0 +1,338 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#*******************************************************************************
+# File: aio.py
+# Package: AMFTools
+# Description: asyncio client for the AMF products
+# Python Version: 3.11.4
+#*******************************************************************************
+
+"""
+asyncio-native access to AMF products: one event loop drives any number of devices.
+
+    valve = AsyncAMF(device)
+    await valve.connect()
+    await asyncio.gather(valve.valveShortestPath(3), other.valveShortestPath(5))
+    await asyncio.wait_for(valve.pullAndWait(), timeout=5)
+
+On Linux/macOS the answers are read with loop.add_reader() on the serial file descriptor, so
+waiting for a product costs no thread. Elsewhere (Windows) each transaction falls back to the
+blocking amfTools.AMF path in the default executor. Transactions are serialized per serial port
+(one RS485 bus or one USB link) by an asyncio.Lock, and all the waits can be cancelled.
+
+An AsyncAMF wraps a regular amfTools.AMF object (command set, state, move time model). Do not
+drive the same product from threads (StatusPoller, AMFActor...) while the event loop owns it.
+"""
+
+import asyncio
+import functools
+import os
+import time
+
+import amfTools
+
+
+class AsyncTransport:
+    """
+        Non-blocking reader over an open pyserial port, shared by the AsyncAMF objects using that port
+        """
+    transports = {}     # Serial port -> AsyncTransport
+
+    def __init__(self, serialObj, loop: asyncio.AbstractEventLoop) -> None:
+        self.serial = serialObj
+        self.loop = loop
+        self.lock = asyncio.Lock()  # One transaction at a time on the port
+        self.reader = amfTools.FrameReader(serialObj)
+        self.waiter = None
+        self.users = 0
+        self.previousTimeout = serialObj.timeout
+        serialObj.timeout = 0   # Reads only return what is already received
+        loop.add_reader(serialObj.fileno(), self._onReadable)
+
+    @classmethod
+    def attach(cls, serialObj) -> "AsyncTransport":
+        loop = asyncio.get_running_loop()
+        transport = cls.transports.get(serialObj.port)
+        if transport is None or transport.serial is not serialObj or transport.loop is not loop:
+            transport = cls.transports[serialObj.port] = AsyncTransport(serialObj, loop)
+        transport.users += 1
+        return transport
+
+    def detach(self) -> None:
+        self.users -= 1
+        if self.users < 1:
+            self.close()
+
+    def pause(self) -> None:
+        """
+        Hand the port back to blocking pyserial calls (the caller holds self.lock)
+        """
+        try:
+            self.loop.remove_reader(self.serial.fileno())
+        except Exception:
+            pass
+        self.serial.timeout = self.previousTimeout
+
+    def resume(self) -> None:
+        self.serial.timeout = 0
+        self.loop.add_reader(self.serial.fileno(), self._onReadable)
+
+    def close(self) -> None:
+        self.pause()
+        if AsyncTransport.transports.get(self.serial.port) is self:
+            del AsyncTransport.transports[self.serial.port]
+
+    def _onReadable(self) -> None:
+        try:
+            self.reader.append(self.serial.read(self.serial.in_waiting or 1))
+        except Exception as e:
+            if self.waiter is not None and not self.waiter.done():
+                self.waiter.set_exception(ConnectionError(f"Serial port {self.serial.port} failed: {e}"))
+            return
+        self._deliver()
+
+    def _deliver(self) -> None:
+        if self.waiter is None or self.waiter.done():
+            return
+        frame = self.reader.extract()
+        if frame is not None:
+            self.waiter.set_result(frame)
+
+    async def transact(self, payload: bytes, expectAnswer: bool, timeout: float, onWrite = None) -> amfTools.Response:
+        """
+        Write payload and return the answer frame (None if none in time). The caller holds self.lock.
+        """
+        self.reader.reset()
+        self.serial.write(payload)
+        if onWrite is not None:
+            onWrite(payload.decode())
+        if not expectAnswer:
+            return None
+        self.waiter = self.loop.create_future()
+        self._deliver()
+        try:
+            return await asyncio.wait_for(self.waiter, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.waiter = None
+
+
+class AsyncAMF:
+    """
+        asyncio counterpart of amfTools.AMF.
+
+        INPUTS:
+            product: AMF, Device or str - Product to drive (anything else than an AMF is passed to amfTools.AMF,
+                                          without connecting: call connect())
+            useReader: bool - Read the answers with loop.add_reader (default: on POSIX when the port has a file descriptor)
+            amfKwargs: Extra arguments for amfTools.AMF
+        """
+    def __init__(self, product, useReader: bool = None, **amfKwargs) -> None:
+        if isinstance(product, amfTools.AMF):
+            self.amf = product
+        else:
+            self.amf = amfTools.AMF(product, autoconnect=False, **amfKwargs)
+        self.useReader = (os.name != 'nt') if useReader is None else useReader
+        self.transport = None
+        self.fallbackLocks = {}     # Serial port -> asyncio.Lock, when the answers are read in the executor
+
+    # ------------------------------------------------------------------ connection
+
+    async def connect(self) -> None:
+        if not self.amf.connected:
+            await self._inExecutor(self.amf.connect)
+        if self.useReader and self.transport is None:
+            try:
+                self.transport = AsyncTransport.attach(self.amf.productserial)
+            except (AttributeError, NotImplementedError, OSError):
+                self.useReader = False  # No file descriptor to watch: executor fallback
+
+    async def disconnect(self) -> None:
+        if self.transport is not None:
+            self.transport.detach()
+            self.transport = None
+        await self._inExecutor(self.amf.disconnect)
+
+    async def __aenter__(self) -> "AsyncAMF":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.disconnect()
+
+    async def _inExecutor(self, function, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(function, *args, **kwargs))
+
+    def _lock(self) -> asyncio.Lock:
+        if self.transport is not None:
+            return self.transport.lock
+        return self.fallbackLocks.setdefault(self.amf.serialPort, asyncio.Lock())
+
+    # ------------------------------------------------------------------ transactions
+
+    async def send(self, command: str, data: bool = False, integer: bool = False, full_ans: bool = False, force_ans: bool = False, frame: bool = False):
+        """
+        Coroutine version of AMF.send(), same arguments
+        """
+        amf = self.amf
+        if not amf.connected or amf.productserial is None:
+            raise ConnectionError("Product is not connected")
+        if self.transport is None:
+            async with self._lock():
+                return await self._inExecutor(amf.send, command, data=data, integer=integer, full_ans=full_ans, force_ans=force_ans, frame=frame)
+
+        command = command + amf.LAST_CHAR
+        if not amf.isQueryCommand(command):
+            amf.pendingMove = None
+        expectAnswer = not amf.noAns or force_ans
+        async with self.transport.lock:
+            delay = amfTools.AMF.nextCommandTime.get(amf.serialPort, 0.0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            response = None
+            try:
+                response = await self.transport.transact(command.encode(), expectAnswer,
+                                                         max(amf.responseTimeout, amf.serialTimeout),
+                                                         onWrite = self._recordWrite)
+            finally:
+                amf.schedulePacing(command, answered = response is not None)
+        if expectAnswer:
+            return amf.parseResponse(response, data=data, integer=integer, full=full_ans, frame=frame)
+
+    def _recordWrite(self, command: str) -> None:
+        self.amf.lastWriteTime = time.monotonic()
+        if not self.amf.isQueryCommand(command):
+            self.amf.lastActionTime = self.amf.lastWriteTime
+
+    async def command(self, name: str, parameter=None, **kwargs):
+        """
+        Send a command of the AMF command set by name, e.g. await valve.command('getValvePosition', integer=True)
+        """
+        return await self.send(self.amf.prepareCommand(name, parameter), force_ans=True, **kwargs)
+
+    async def call(self, method: str, *args, **kwargs):
+        """
+        Run any blocking AMF method in the executor. The port is released by the event loop meanwhile.
+        """
+        async with self._lock():
+            if self.transport is not None:
+                self.transport.pause()
+            try:
+                return await self._inExecutor(getattr(self.amf, method), *args, **kwargs)
+            finally:
+                if self.transport is not None:
+                    self.transport.resume()
+
+    # ------------------------------------------------------------------ status
+
+    async def getValvePosition(self) -> int:
+        self.amf.valvePosition = await self.command('getValvePosition', integer=True)
+        return self.amf.valvePosition
+
+    async def getValveStatus(self) -> int:
+        return await self.command('getValveStatus', integer=True)
+
+    async def getPumpStatus(self) -> int:
+        return await self.command('getPumpStatus', integer=True)
+
+    async def getCurrentStatus(self) -> str:
+        return await self.command('getCurrentStatus')
+
+    async def getHomeStatus(self) -> bool:
+        if "RVM" in (self.amf.productFamily or ""):
+            return await self.getValvePosition() != 0
+        return await self.command('getHomedSPM', integer=True) == 1
+
+    async def pullAndWait(self, homing_mode: bool = False, timeout: float = None) -> None:
+        """
+        Wait until the product is done (detailed statuses ?9200, + ?9100 for pumps), as AMF.pullAndWait.
+        Raise the product error, or TimeoutError after timeout (s).
+        """
+        amf = self.amf
+        move = amf.pendingMove if not homing_mode else None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        wakeTime = None
+        if move is not None and move['predicted'] is not None:
+            wakeTime = move['start'] + move['predicted'] - max(amf.POLL_INTERVAL, move['predicted']*amf.PREDICTION_MARGIN)
+            await asyncio.sleep(max(0.0, wakeTime - time.monotonic()))
+        lastBusyTime = None
+        queryTime = None
+        errors = 0
+        while True:
+            try:
+                busy, error = amfTools.StatusPoller.decodeStatus(await self.getValveStatus(), amf.VALVE_ERROR, "Valve", homing_mode)
+                queryTime = amf.lastWriteTime
+                if amf.productFamily == "Pump" and not error:
+                    pumpBusy, error = amfTools.StatusPoller.decodeStatus(await self.getPumpStatus(), amf.PUMP_ERROR, "Pump", homing_mode)
+                    busy = busy or pumpBusy
+                errors = 0
+            except (ConnectionError, ValueError) as e:
+                errors += 1
+                if errors > amf.maxCountError:
+                    raise Exception(f"PullAndWait error: {e}")
+                busy, error = True, None
+            if error:
+                raise Exception(error)
+            if not busy:
+                break
+            lastBusyTime = queryTime
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Product on port {amf.serialPort} still busy after {timeout} s")
+            await asyncio.sleep(amf.POLL_INTERVAL)
+        if move is not None and move is amf.pendingMove:
+            amf.completeMove(move, lastBusyTime, wakeTime)
+
+    # ------------------------------------------------------------------ actions
+
+    async def home(self, block: bool = True) -> None:
+        self.amf.__check_status__(await self.send(self.amf.prepareCommand('home')))
+        self.amf.valvePosition = None
+        if block:
+            await self.pullAndWait(homing_mode=True)
+            self.amf.valvePosition = 1
+
+    async def valveMove(self, target: int, mode: int = 0, enforced: bool = False, block: bool = True) -> None:
+        """
+        Move the valve to the target port (mode 0: ShortestPath, 1: IncrementalMove, 2: DecrementalMove)
+        """
+        if mode not in (0, 1, 2):
+            raise ValueError("Mode must be between 0 and 2")
+        if target < 1 or target > self.amf.portnumber:
+            raise ValueError("Target must be between 1 and "+str(self.amf.portnumber))
+        name = ('ShortestPath', 'incrementalMove', 'decrementalMove')[mode]
+        if enforced:
+            name = 'enforced' + name[0].upper() + name[1:]
+        self.amf.__check_status__(await self.send(self.amf.prepareCommand(name, target)))
+        self.amf.startMove(target, mode, enforced)
+        if block:
+            await self.pullAndWait()
+
+    async def valveShortestPath(self, target: int, enforced: bool = False, block: bool = True) -> None:
+        await self.valveMove(target, 0, enforced, block)
+
+    async def valveIncrementalMove(self, target: int, enforced: bool = False, block: bool = True) -> None:
+        await self.valveMove(target, 1, enforced, block)
+
+    async def valveDecrementalMove(self, target: int, enforced: bool = False, block: bool = True) -> None:
+        await self.valveMove(target, 2, enforced, block)
+
+    async def halt(self) -> None:
+        self.amf.__check_status__(await self.send(self.amf.prepareCommand('halt')))
+
+    async def resume(self) -> None:
+        self.amf.__check_status__(await self.send(self.amf.prepareCommand('resume')))
+
+    async def hardStop(self, clear_status: bool = True) -> None:
+        """
+        Stop the product (T), see AMF.hardStop
+        """
+        self.amf.__check_status__(await self.send(self.amf.prepareCommand('hardStop')))
+        if clear_status:
+            for cnt in range(25):
+                ans = await self.send(self.amf.prepareCommand('dummyCommand'))
+                if self.amf.noAns or ans is not None and ans != '' and ans[0] == "`":
+                    return
+                await asyncio.sleep(self.amf.TIME_BETWEEN_COMMANDS)
+            print("Failed to clear busy status after hard stop.")
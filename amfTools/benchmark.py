@@ -0,0 +1,284 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#*******************************************************************************
+# File: benchmark.py
+# Package: AMFTools
+# Description: Latency benchmarks of the amfTools command path against the simulator
+# Python Version: 3.11.4
+#*******************************************************************************
+
+"""
+Repeatable latency benchmarks for amfTools, run against virtual valves from amfTools.simulator.
+
+    python -m amfTools.benchmark --output bench.json
+    python -m amfTools.benchmark --baseline bench.json --tolerance 0.1
+
+Every case reports its samples as percentiles (seconds) in a JSON document. When a
+baseline file is given, each case is compared with it and the exit code is 1 if any
+median regressed by more than the tolerance.
+"""
+
+import argparse
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+
+import amfTools
+from amfTools.simulator import AMFSimulator
+from amfTools.trace import TraceRecorder
+
+
+def percentile(sortedSamples: list, q: float) -> float:
+    """
+    Linear-interpolated percentile of an already sorted list, q in [0; 100]
+    """
+    if not sortedSamples:
+        return None
+    k = (len(sortedSamples) - 1) * q / 100
+    low, high = math.floor(k), math.ceil(k)
+    if low == high:
+        return sortedSamples[low]
+    return sortedSamples[low] + (sortedSamples[high] - sortedSamples[low]) * (k - low)
+
+
+def summarize(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        "min": ordered[0],
+        "p50": percentile(ordered, 50),
+        "p90": percentile(ordered, 90),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1],
+    }
+
+
+class Benchmark:
+    """
+        Runs the benchmark cases and collects their samples.
+
+        INPUTS:
+            repeat: int - Number of samples per case
+            timeScale: float - Simulator move-time multiplier (1.0 = realistic RVMFS timings)
+            portnumber: int - Number of positions of the simulated valves
+            discoveryCounts: list - Numbers of devices used for the discovery cases
+        """
+
+    def __init__(self, repeat: int = 20, timeScale: float = 1.0, portnumber: int = 12,
+                 discoveryCounts: list = (1, 6, 12), silent: bool = False) -> None:
+        self.repeat = repeat
+        self.timeScale = timeScale
+        self.portnumber = portnumber
+        self.discoveryCounts = list(discoveryCounts)
+        self.silent = silent
+        self.results = {}
+
+    def log(self, message: str) -> None:
+        if not self.silent:
+            print(message, file=sys.stderr)
+
+    def record(self, name: str, samples: list) -> None:
+        self.results[name] = summarize(samples)
+        self.log(f"{name:<40} p50 {self.results[name]['p50']*1000:9.2f} ms   p90 {self.results[name]['p90']*1000:9.2f} ms")
+
+    def run(self) -> dict:
+        with AMFSimulator.withValves(1, portnumber=self.portnumber, timeScale=self.timeScale) as sim:
+            device = amfTools.util.getProductList("USB", silent_mode=True)[0]
+            virtual = sim.devices()[0]
+            self.benchConnect(device)
+            self.benchFromDescriptor(device)
+            amf = amfTools.AMF(device)
+            try:
+                amf.home()
+                self.benchRoundTrip(amf)
+                self.benchShortestPath(amf)
+                self.benchPullAndWait(amf, virtual)
+                self.benchAsyncAnswers(amf, virtual)
+                self.benchDeviceInformation(amf)
+            finally:
+                amf.disconnect()
+        for count in self.discoveryCounts:
+            self.benchDiscovery(count)
+        return self.report()
+
+    def benchConnect(self, device) -> None:
+        samples = []
+        amf = amfTools.AMF(device, autoconnect=False)
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            amf.connect()
+            samples.append(time.perf_counter() - start)
+            amf.disconnect()
+        self.record("connect", samples)
+
+    def benchFromDescriptor(self, device) -> None:
+        """
+        Construction and connection of a known product, without probing
+        """
+        samples = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            amf = amfTools.AMF.fromDescriptor(device, portnumber=self.portnumber)
+            samples.append(time.perf_counter() - start)
+            amf.disconnect()
+        self.record("fromDescriptor_connect", samples)
+
+    def benchRoundTrip(self, amf) -> None:
+        samples = []
+        command = amf.prepareCommand('getValvePosition')
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            amf.send(command, integer=True, force_ans=True)
+            samples.append(time.perf_counter() - start)
+        self.record("send_receive", samples)
+
+    def benchShortestPath(self, amf) -> None:
+        # Alternate between two adjacent ports so every sample is the same one-position move
+        samples = []
+        for i in range(self.repeat):
+            target = 2 if i % 2 == 0 else 1
+            start = time.perf_counter()
+            amf.valveShortestPath(target, block=True)
+            samples.append(time.perf_counter() - start)
+        self.record("valveShortestPath_block", samples)
+
+    def benchPullAndWait(self, amf, virtual) -> None:
+        """
+        Detection lag: time between the simulated motor stop and pullAndWait returning
+        """
+        samples = []
+        far = self.portnumber // 2 + 1
+        for i in range(self.repeat):
+            target = far if i % 2 == 0 else 1
+            amf.valveShortestPath(target, block=False)
+            with virtual.lock:
+                motorStop = virtual.currentEnd
+            amf.pullAndWait()
+            samples.append(time.monotonic() - motorStop)
+        self.record("pullAndWait_detection_lag", samples)
+
+    def benchAsyncAnswers(self, amf, virtual) -> None:
+        """
+        Detection lag with the asynchronous answer mode: the valve reports the end of the move itself
+        """
+        samples = []
+        far = self.portnumber // 2 + 1
+        amf.setAnswerMode(2)
+        try:
+            for i in range(self.repeat):
+                target = far if i % 2 == 0 else 1
+                amf.valveShortestPath(target, block=False)
+                with virtual.lock:
+                    motorStop = virtual.currentEnd
+                amf.pullAndWait()
+                samples.append(time.monotonic() - motorStop)
+        finally:
+            amf.setAnswerMode(0)
+        self.record("pullAndWait_detection_lag_async", samples)
+
+    def benchDeviceInformation(self, amf) -> None:
+        samples = []
+        for _ in range(max(1, self.repeat // 4)):
+            start = time.perf_counter()
+            amf.getDeviceInformation(full=True)
+            samples.append(time.perf_counter() - start)
+        self.record("getDeviceInformation_full", samples)
+
+    def benchDiscovery(self, count: int) -> None:
+        samples = []
+        with AMFSimulator.withValves(count, portnumber=self.portnumber, timeScale=self.timeScale):
+            for _ in range(max(1, self.repeat // 10)):
+                start = time.perf_counter()
+                found = amfTools.util.getProductList("USB", silent_mode=True)
+                samples.append(time.perf_counter() - start)
+                if len(found) != count:
+                    raise RuntimeError(f"Discovery found {len(found)} of {count} virtual devices")
+        self.record(f"getProductList_{count}_devices", samples)
+
+    def report(self) -> dict:
+        return {
+            "metadata": {
+                "amfTools": amfTools.__version__,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "repeat": self.repeat,
+                "timeScale": self.timeScale,
+                "portnumber": self.portnumber,
+                "TIME_BETWEEN_COMMANDS": amfTools.AMF.TIME_BETWEEN_COMMANDS,
+            },
+            "results": self.results,
+        }
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.1) -> tuple:
+    """
+    Compare the medians of two reports. Returns (rows, regressed) where each row is
+    (case, baseline p50, current p50, ratio) and regressed lists the cases slower than 1+tolerance.
+    """
+    rows = []
+    regressed = []
+    for name, stats in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None or not base.get("p50"):
+            rows.append((name, None, stats["p50"], None))
+            continue
+        ratio = stats["p50"] / base["p50"]
+        rows.append((name, base["p50"], stats["p50"], ratio))
+        if ratio > 1 + tolerance:
+            regressed.append(name)
+    return rows, regressed
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="amfTools command-path latency benchmarks (simulated valves)")
+    parser.add_argument("-o", "--output", help="Write the JSON report to this file (default: stdout)")
+    parser.add_argument("-b", "--baseline", help="JSON report to compare against")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.1, help="Allowed p50 slowdown versus baseline (0.1 = 10%%)")
+    parser.add_argument("-r", "--repeat", type=int, default=20, help="Samples per case")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Simulator move-time multiplier")
+    parser.add_argument("--ports", type=int, default=12, help="Positions of the simulated valves")
+    parser.add_argument("--discovery", type=int, nargs="*", default=[1, 6, 12], help="Device counts for the discovery cases")
+    parser.add_argument("--trace", help="Record the command path and write a Chrome trace-event file (adds the hook overhead)")
+    args = parser.parse_args(argv)
+
+    bench = Benchmark(repeat=args.repeat, timeScale=args.time_scale, portnumber=args.ports, discoveryCounts=args.discovery)
+    if args.trace:
+        amfTools.AMF.recorder = TraceRecorder()
+    try:
+        report = bench.run()
+    finally:
+        recorder, amfTools.AMF.recorder = amfTools.AMF.recorder, None
+    if recorder is not None:
+        recorder.exportChromeTrace(args.trace)
+        print(recorder.report(), file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        rows, regressed = compare(report, baseline, args.tolerance)
+        print(f"\n{'case':<40}{'baseline p50':>14}{'current p50':>14}{'ratio':>8}", file=sys.stderr)
+        for name, base, cur, ratio in rows:
+            base_txt = f"{base*1000:11.2f} ms" if base is not None else f"{'-':>14}"
+            ratio_txt = f"{ratio:8.2f}" if ratio is not None else f"{'new':>8}"
+            print(f"{name:<40}{base_txt}{cur*1000:11.2f} ms{ratio_txt}", file=sys.stderr)
+        if regressed:
+            print(f"\nRegressed beyond {args.tolerance:.0%}: {', '.join(regressed)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
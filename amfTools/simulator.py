@@ -0,0 +1,766 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#*******************************************************************************
+# File: simulator.py
+# Package: AMFTools
+# Description: Virtual AMF rotary valves exposed as Linux pseudo-terminals
+# Python Version: 3.11.4
+#*******************************************************************************
+
+"""
+Hardware-free stand-in for AMF RVM valves.
+
+Each virtual valve speaks the DT protocol used by amfTools.AMF ("/<addr><cmd><CR>"
+in, "/0<status><data><ETX><CR><LF>" out) over a pseudo-terminal, and models
+rotation time from port distance and speed mode. Several valves may share one
+pseudo-terminal to emulate an RS485 bus.
+
+Typical use:
+
+    with AMFSimulator.fromConfig("valve_config.json"):
+        devices = amfTools.util.getProductList("USB")   # finds the virtual valves
+        valve = amfTools.AMF(devices[0])
+
+While installed, serial.tools.list_ports.comports() also reports the virtual
+ports (FTDI VID/PID, serial number), so the unmodified discovery and
+serial-number lookup code in amfTools works against them.
+
+Linux/macOS only (requires the pty module).
+"""
+
+import json
+import os
+import re
+import select
+import shutil
+import tempfile
+import threading
+import time
+import hashlib
+
+import serial.tools.list_ports
+from serial.tools.list_ports_common import ListPortInfo
+
+
+class VirtualRVM:
+    """
+        State machine of one simulated RVM valve.
+
+        INPUTS:
+            serialNumber: str - Serial number reported through the port enumeration
+            portnumber: int - Number of valve positions (!80#)
+            productAddress: str - Address [1–9, A–E] the valve answers to
+            typeProduct: str - "RVMFS" or "RVMLP"
+            timeScale: float - Multiplier applied to every simulated duration (0 = instantaneous)
+        """
+
+    # Timing model (seconds). A move costs a fixed settle time plus a time per position crossed.
+    MOVE_BASE_TIME = {"Fast": 0.08, "Slow": 0.2}
+    MOVE_STEP_TIME = {"Fast": 0.04, "Slow": 0.12}
+    HOME_TIME = 1.5
+
+    FIRMWARE_VERSION = "0.3.67"
+    FIRMWARE_CHECKSUM = "5A3C"
+    SUPPLY_VOLTAGE = 240
+
+    ERROR_NONE = 0
+    ERROR_INVALID_COMMAND = 2
+    ERROR_INVALID_OPERAND = 3
+    ERROR_MISSING_R = 4
+    ERROR_NOT_INITIALIZED = 7
+    ERROR_OVERFLOW = 15
+
+    MAX_COMMAND_LENGTH = 512
+    MAX_LOOP_DEPTH = 10
+
+    MOVE_COMMANDS = "BbIiOo"
+    TOKEN = re.compile(r"([A-Za-z+\-])(\d*)")
+
+    def __init__(self, serialNumber: str = None, portnumber: int = 6, productAddress: str = "1",
+                 typeProduct: str = "RVMFS", timeScale: float = 1.0) -> None:
+        self.serialNumber = serialNumber
+        self.portnumber = portnumber
+        self.productAddress = productAddress
+        self.typeProduct = typeProduct
+        self.timeScale = timeScale
+        self.connectionMode = "USB/RS232"
+        self.valveSpeed = "Fast"
+        self.stopOnMiddle = 1 if portnumber > 12 else 0
+        self.answerMode = 0
+        self.position = 0               # 0 until homed
+        self.valveStatus = 144          # Not homed
+        self.errorCode = self.ERROR_NONE
+        self.movements = 0
+        self.movementsSinceReport = 0
+        self.lastCommand = None
+        self.loaded = None              # Command string stored without its R, started by the next R
+        self.notifyPending = False      # Asynchronous answer modes: the end of the running string must be reported
+        self.finishedAt = None          # Simulated time at which the last string ended
+        self.offline = False            # Fault injection: powered off, commands are neither executed nor answered
+        self.dropAnswers = 0            # Fault injection: number of the next answers lost on the line (commands still executed)
+        self.garbleAnswers = 0          # Fault injection: number of the next answers cut on the line (data and <ETX> lost)
+        self.lock = threading.RLock()
+        self._clearProgram()
+
+    # ------------------------------------------------------------------ program execution
+
+    def _clearProgram(self) -> None:
+        self.program = []
+        self.pc = 0
+        self.loopStack = []
+        self.current = None             # (op, arg) being executed
+        self.currentEnd = None          # Simulated time at which the current op completes
+        self.halted = False
+        self.processed = 0              # Sub-commands processed in the current string
+
+    def isBusy(self, now: float = None) -> bool:
+        self.advance(now)
+        return self.current is not None or self.pc < len(self.program) or self.halted
+
+    def advance(self, now: float = None) -> None:
+        """
+        Bring the simulated state up to 'now'. Ops are chained on their scheduled end
+        times rather than on the wall clock, so lazy evaluation stays exact.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            guard = 0
+            while guard < 10000:
+                guard += 1
+                if self.current is not None:
+                    if now < self.currentEnd:
+                        return
+                    clock = self.currentEnd
+                    self._finish(self.current)
+                    self.current = None
+                    if self.pc >= len(self.program):
+                        self.finishedAt = clock
+                else:
+                    clock = now
+                if self.halted or self.pc >= len(self.program):
+                    return
+                op, arg = self.program[self.pc]
+                self.pc += 1
+                self._start(op, arg, clock)
+
+    def _start(self, op: str, arg: int, clock: float) -> None:
+        duration = 0.0
+        if op == "g":
+            self.loopStack.append([self.pc, None])
+        elif op == "G":
+            loop = self.loopStack[-1]
+            if loop[1] is None:
+                loop[1] = float("inf") if arg == 0 else arg - 1
+            if loop[1] > 0:
+                loop[1] -= 1
+                self.pc = loop[0]
+            else:
+                self.loopStack.pop()
+        elif op == "H":
+            self.halted = True
+        elif op == "M":
+            duration = arg / 1000
+        elif op in "ZY":
+            duration = self.HOME_TIME
+            self.valveStatus = 255
+        elif op in self.MOVE_COMMANDS:
+            distance = self.moveDistance(self.position, arg, op)
+            if distance:
+                duration = self.MOVE_BASE_TIME[self.valveSpeed] + distance * self.MOVE_STEP_TIME[self.valveSpeed]
+                self.valveStatus = 255
+        elif op == "+":
+            self.valveSpeed = "Fast"
+        elif op == "-":
+            self.valveSpeed = "Slow"
+        self.current = (op, arg)
+        self.currentEnd = clock + duration * self.timeScale
+        self.processed += 1
+
+    def _finish(self, command: tuple) -> None:
+        op, arg = command
+        if op in "ZY":
+            self.position = 1
+            self.valveStatus = 0
+        elif op in self.MOVE_COMMANDS:
+            if self.moveDistance(self.position, arg, op):
+                self.movements += 1
+                self.movementsSinceReport += 1
+            self.position = arg
+            self.valveStatus = 0
+
+    def moveDistance(self, start: int, target: int, op: str) -> int:
+        """
+        Number of positions crossed by a move command (enforced moves make a full turn on the same port)
+        """
+        n = self.portnumber
+        clockwise = (target - start) % n
+        counter = (start - target) % n
+        if op in "bB":
+            distance = min(clockwise, counter)
+        elif op in "iI":
+            distance = clockwise
+        else:
+            distance = counter
+        if distance == 0 and op.isupper():
+            distance = n
+        return distance
+
+    def hardStop(self) -> None:
+        # The interrupted move is dropped, the rest of the string waits for R or a new command
+        with self.lock:
+            self.advance()
+            if self.current is not None:
+                self.current = None
+                if self.valveStatus == 255:
+                    self.valveStatus = 0 if self.position else 144
+                self.halted = self.pc < len(self.program)
+            self.notifyPending = False  # An interrupted string is not reported as completed
+
+    def nextEvent(self) -> float:
+        """
+        Time at which the op in progress ends, when the end of the string has to be reported (else None)
+        """
+        with self.lock:
+            return self.currentEnd if self.notifyPending and self.current is not None else None
+
+    def completion(self, now: float = None) -> tuple:
+        """
+        (end time, answer payload) of the finished string in the asynchronous answer modes, reported once (else None).
+        Mode 2 adds the number of sub-commands processed.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            if not self.notifyPending or self.isBusy(now):
+                return None
+            self.notifyPending = False
+            payload = self._statusChar(now) + (str(self.processed) if self.answerMode == 2 else "")
+            return self.finishedAt if self.finishedAt is not None else now, payload
+
+    # ------------------------------------------------------------------ command handling
+
+    def handle(self, command: str, now: float = None) -> str:
+        """
+        Execute one command body (without "/<addr>" and <CR>) and return the answer payload,
+        i.e. the status character followed by the data.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            self.advance(now)
+            data = self._dispatch(command, now)
+            return self._statusChar(now) + ("" if data is None else str(data))
+
+    def _statusChar(self, now: float) -> str:
+        ready = 0x20 if not self.isBusy(now) else 0
+        return chr(0x40 | ready | self.errorCode)
+
+    def _dispatch(self, command: str, now: float):
+        if command == "":
+            return None
+        if len(command) > self.MAX_COMMAND_LENGTH:
+            self.errorCode = self.ERROR_OVERFLOW
+            return None
+
+        # Report commands (no trailing R)
+        if command in ("Q", "?29"):
+            return None
+        if command == "?6":
+            return self.position
+        if command == "?801":
+            return self.portnumber
+        if command == "?80":
+            return self.stopOnMiddle
+        if command == "?9200":
+            return 255 if self.isBusy(now) and self.valveStatus in (0, 255) else self.valveStatus
+        if command == "?17":
+            return self.movements
+        if command in ("?18", "%"):
+            count, self.movementsSinceReport = self.movementsSinceReport, 0
+            return count
+        if command == "?19":
+            return "fast mode" if self.valveSpeed == "Fast" else "slow mode"
+        if command in ("?20", "#"):
+            return self.FIRMWARE_CHECKSUM
+        if command in ("?23", "&"):
+            return self.FIRMWARE_VERSION
+        if command == "?26":
+            return self.productAddress
+        if command == "?76":
+            return f"{self.typeProduct} {self.portnumber} positions"
+        if command == "?500":
+            return ("Synchronous mode", "Asynchronous mode", "Asynchronous mode with counter")[self.answerMode]
+        if command == "?9000":
+            return self.uniqueID()
+        if command == "*":
+            return self.SUPPLY_VOLTAGE
+
+        # Configuration commands (no trailing R)
+        match = re.fullmatch(r"!50(\d)", command)
+        if match and int(match.group(1)) <= 2:
+            self.answerMode = int(match.group(1))
+            return None
+        match = re.fullmatch(r"!80(\d+)", command)
+        if match:
+            ports = int(match.group(1))
+            if ports < 1 or ports > 48:
+                self.errorCode = self.ERROR_INVALID_OPERAND
+                return None
+            self.portnumber = ports
+            self.position = 0
+            self.valveStatus = 144
+            return f"{ports} ports mode"
+        if command in ("!80", "!81"):
+            self.stopOnMiddle = int(command[-1])
+            return "Stop on middle " + ("enabled" if self.stopOnMiddle else "disabled")
+        if command == "!17":
+            self.movements = 0
+            return None
+
+        # Interrupt commands
+        if command == "T":
+            self.hardStop()
+            return None
+        if command == "H":
+            self.halted = True
+            return None
+        if command == "$":
+            self.position = 0
+            self.valveStatus = 144
+            self.loaded = None
+            self.notifyPending = False
+            self._clearProgram()
+            return None
+
+        if command == "X":
+            if self.lastCommand is None:
+                self.errorCode = self.ERROR_INVALID_COMMAND
+                return None
+            command = self.lastCommand
+
+        # Product configuration commands with trailing R
+        match = re.fullmatch(r"@ADDR=([1-9A-E])R", command)
+        if match:
+            self.productAddress = match.group(1)
+            return None
+        if command == "@RS232R":
+            self.connectionMode = "USB/RS232"
+            return None
+        if command in ("@RS485FR", "@RS485T1R"):
+            self.connectionMode = "RS485"
+            return None
+
+        # Start the stored command, or resume a halted or hard-stopped sequence
+        if command == "R" and self.loaded is not None:
+            command, self.loaded = self.loaded, None
+            return self._load(command, now)
+        if command == "R":
+            self.halted = False
+            self.advance(now)
+            return None
+
+        return self._load(command, now)
+
+    def _load(self, command: str, now: float):
+        """
+        Parse an executable command string ("b3M500b5R") and start it.
+        Without its final R the string is only stored, and started by the next R (e.g. a broadcast "/_R").
+        """
+        execute = command.endswith("R")
+        body = command[:-1] if execute else command
+        program = []
+        pos = 0
+        depth = 0
+        for match in self.TOKEN.finditer(body):
+            if match.start() != pos:
+                break
+            pos = match.end()
+            op, operand = match.group(1), match.group(2)
+            arg = int(operand) if operand else None
+            if op in self.MOVE_COMMANDS:
+                if arg is None or arg < 1 or arg > self.portnumber:
+                    self.errorCode = self.ERROR_INVALID_OPERAND
+                    return None
+            elif op in "MG":
+                arg = 0 if arg is None else arg
+                if op == "G":
+                    depth -= 1
+            elif op == "g":
+                depth += 1
+                if depth > self.MAX_LOOP_DEPTH:
+                    self.errorCode = self.ERROR_INVALID_OPERAND
+                    return None
+            elif op not in "ZYHc+-":
+                self.errorCode = self.ERROR_INVALID_COMMAND
+                return None
+            program.append((op, arg))
+        if pos != len(body) or depth != 0:
+            self.errorCode = self.ERROR_INVALID_COMMAND
+            return None
+        if not execute:
+            self.errorCode = self.ERROR_NONE
+            self.loaded = command + "R"
+            return None
+
+        # A paused (halted or hard-stopped) sequence may be replaced, a running op may not
+        self.advance(now)
+        if self.current is not None:
+            self.errorCode = self.ERROR_OVERFLOW
+            return None
+        if self.position == 0 and any(op in self.MOVE_COMMANDS for op, _ in program):
+            self.errorCode = self.ERROR_NOT_INITIALIZED
+            return None
+
+        self.errorCode = self.ERROR_NONE
+        self.lastCommand = command
+        self._clearProgram()
+        self.program = program
+        self.notifyPending = self.answerMode > 0
+        self.finishedAt = None
+        self.advance(now)
+        return None
+
+    def uniqueID(self) -> str:
+        return hashlib.sha1(str(self.serialNumber).encode()).hexdigest()[:24].upper()
+
+
+class VirtualBus:
+    """
+        One pseudo-terminal carrying one valve (USB/RS232) or several addressed valves (RS485).
+        The slave side is what amfTools opens; the master side is served by a background thread.
+        """
+
+    ETX = "\x03"
+
+    def __init__(self, devices: list, connectionMode: str = "USB/RS232", baudrate: int = 9600,
+                 simulateWireTime: bool = True, processingTime: float = 0.002) -> None:
+        self.devices = list(devices)
+        self.connectionMode = connectionMode
+        self.baudrate = baudrate
+        self.simulateWireTime = simulateWireTime
+        self.processingTime = processingTime
+        self.masterFd = None
+        self.slaveFd = None
+        self.slaveName = None
+        self.device = None              # Path handed to amfTools (a 'dev/tty...' symlink)
+        self._thread = None
+        self._running = False
+        self._outgoing = []             # [(due time, bytes)]
+        for dev in self.devices:
+            dev.connectionMode = connectionMode
+
+    def open(self, linkPath: str) -> None:
+        import pty
+        import tty
+        self.masterFd, self.slaveFd = pty.openpty()
+        tty.setraw(self.slaveFd)
+        self.slaveName = os.ttyname(self.slaveFd)
+        os.symlink(self.slaveName, linkPath)
+        self.device = linkPath
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True, name=f"VirtualBus {linkPath}")
+        self._thread.start()
+
+    def close(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        for fd in (self.masterFd, self.slaveFd):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.masterFd = self.slaveFd = None
+
+    def wireTime(self, nbytes: int) -> float:
+        # 10 bits per byte on an 8N1 line
+        return nbytes * 10 / self.baudrate if self.simulateWireTime else 0.0
+
+    def _serve(self) -> None:
+        buffer = b""
+        while self._running:
+            now = time.monotonic()
+            timeout = 0.05
+            if self._outgoing:
+                timeout = max(0.0, min(min(due for due, _ in self._outgoing) - now, timeout))
+            for dev in self.devices:
+                end = dev.nextEvent()
+                if end is not None:
+                    timeout = max(0.0, min(end - now, timeout))
+            try:
+                readable, _, _ = select.select([self.masterFd], [], [], timeout)
+            except (OSError, ValueError):
+                return
+            if readable:
+                try:
+                    buffer += os.read(self.masterFd, 1024)
+                except OSError:
+                    # No client has the slave open; keep serving
+                    time.sleep(0.01)
+                    continue
+                while b"\r" in buffer:
+                    line, buffer = buffer.split(b"\r", 1)
+                    self._dispatch(line.decode("ascii", errors="ignore"))
+            self._notify()
+            self._flush()
+
+    def _dispatch(self, line: str) -> None:
+        start = line.rfind("/")
+        if start < 0 or len(line) < start + 2:
+            return
+        address, body = line[start + 1], line[start + 2:]
+        now = time.monotonic()
+        for dev in self.devices:
+            broadcast = address == "_"
+            if not broadcast and address.upper() != str(dev.productAddress).upper():
+                continue
+            if dev.offline:
+                if not broadcast:
+                    break
+                continue
+            answer = dev.handle(body, now)
+            # In RS485 mode, broadcast commands are executed but never answered
+            if broadcast and self.connectionMode == "RS485":
+                continue
+            if dev.dropAnswers:
+                dev.dropAnswers -= 1
+                if not broadcast:
+                    break
+                continue
+            if dev.garbleAnswers:
+                dev.garbleAnswers -= 1
+                answer = answer[:1]
+                frame = ("/0" + answer + "\r\n").encode("ascii")
+            else:
+                frame = ("/0" + answer + self.ETX + "\r\n").encode("ascii")
+            due = now + self.processingTime + self.wireTime(len(line) + 1 + len(frame))
+            self._outgoing.append((due, frame))
+            if not broadcast:
+                break
+
+    def _notify(self) -> None:
+        # Unrequested answers of the strings that ended (asynchronous answer modes)
+        for dev in self.devices:
+            event = dev.completion()
+            if event is not None:
+                end, answer = event
+                frame = ("/0" + answer + self.ETX + "\r\n").encode("ascii")
+                # Never before the answers already queued (the immediate answer of the same command comes first)
+                due = max([end + self.processingTime + self.wireTime(len(frame))] + [due for due, _ in self._outgoing])
+                self._outgoing.append((due, frame))
+
+    def _flush(self) -> None:
+        now = time.monotonic()
+        ready = [item for item in self._outgoing if item[0] <= now]
+        if not ready:
+            return
+        self._outgoing = [item for item in self._outgoing if item[0] > now]
+        for _, frame in sorted(ready, key=lambda item: item[0]):
+            try:
+                os.write(self.masterFd, frame)
+            except OSError:
+                pass
+
+
+class AMFSimulator:
+    """
+        Collection of virtual buses, with optional integration into serial.tools.list_ports.
+
+        INPUTS:
+            timeScale: float - Multiplier applied to the simulated move durations (0 = instantaneous)
+            simulateWireTime: bool - If True, answers are delayed by their 9600 baud transmission time
+        """
+
+    FTDI_VID = 0x0403
+    FTDI_PID = 0x6015
+    SERIAL_PREFIX = "P201-O9"
+
+    def __init__(self, timeScale: float = 1.0, simulateWireTime: bool = True) -> None:
+        self.timeScale = timeScale
+        self.simulateWireTime = simulateWireTime
+        self.buses = []
+        self.linkDir = None
+        self._originalComports = None
+        self._started = False
+        self._links = 0                 # Pseudo-terminal links created, a replugged bus gets a new port name
+
+    @classmethod
+    def withValves(cls, count: int, portnumber: int = 6, **kwargs) -> "AMFSimulator":
+        """
+        Simulator exposing 'count' USB-connected valves with generated serial numbers
+        """
+        sim = cls(**kwargs)
+        for i in range(count):
+            sim.addValve(portnumber=portnumber)
+        return sim
+
+    @classmethod
+    def fromConfig(cls, configFile: str, **kwargs) -> "AMFSimulator":
+        """
+        Simulator exposing the valves listed in a valve_config.json file ({label: {"sn", "ports"}})
+        """
+        with open(configFile, "r") as f:
+            config = json.load(f)
+        sim = cls(**kwargs)
+        for label, data in config.items():
+            sim.addValve(serialNumber=data["sn"], portnumber=data["ports"])
+        return sim
+
+    def addValve(self, serialNumber: str = None, portnumber: int = 6, **kwargs) -> VirtualRVM:
+        """
+        Add a valve on its own USB/RS232 port
+        """
+        if serialNumber is None:
+            serialNumber = f"{self.SERIAL_PREFIX}{len(self.devices()) + 1:07d}"
+        valve = VirtualRVM(serialNumber, portnumber, timeScale=self.timeScale, **kwargs)
+        self.addBus([valve], connectionMode="USB/RS232")
+        return valve
+
+    def addBus(self, devices: list, connectionMode: str = "RS485", serialNumber: str = None) -> VirtualBus:
+        """
+        Add a bus carrying several addressed valves. For RS485 buses the port reports the serial
+        number of the (virtual) USB adapter, as with a real converter cable.
+        """
+        bus = VirtualBus(devices, connectionMode=connectionMode, simulateWireTime=self.simulateWireTime)
+        bus.serialNumber = serialNumber or (devices[0].serialNumber if len(devices) == 1
+                                            else f"SIMBUS{len(self.buses) + 1:04d}")
+        self.buses.append(bus)
+        if self._started:
+            self._openBus(bus)
+        return bus
+
+    def devices(self) -> list:
+        return [dev for bus in self.buses for dev in bus.devices]
+
+    def ports(self) -> list:
+        return [bus.device for bus in self.buses]
+
+    def start(self) -> "AMFSimulator":
+        if os.name == "nt":
+            raise OSError("The AMF simulator needs pseudo-terminals and is not available on Windows")
+        if self._started:
+            return self
+        # amfTools recognises serial ports by a 'dev/tty' substring, so we hand out symlinks shaped like that
+        self.linkDir = tempfile.mkdtemp(prefix="amfsim-")
+        os.makedirs(os.path.join(self.linkDir, "dev"))
+        self._started = True
+        for bus in self.buses:
+            self._openBus(bus)
+        return self
+
+    def _openBus(self, bus: VirtualBus) -> None:
+        bus.open(os.path.join(self.linkDir, "dev", f"ttyAMF{self._links}"))
+        self._links += 1
+
+    def busOf(self, valve) -> VirtualBus:
+        return valve if isinstance(valve, VirtualBus) else next(bus for bus in self.buses if valve in bus.devices)
+
+    def unplug(self, valve) -> None:
+        """
+        Simulate a USB cable pulled out: the port disappears from the enumeration and open connections fail.
+        The valves keep their state (they are powered separately).
+        """
+        bus = self.busOf(valve)
+        if bus.device is None:
+            return
+        link, bus.device = bus.device, None
+        bus.close()
+        try:
+            os.unlink(link)
+        except OSError:
+            pass
+
+    def replug(self, valve) -> str:
+        """
+        Simulate the cable plugged back in: the bus reappears under a new port name, which is returned
+        """
+        bus = self.busOf(valve)
+        if bus.device is None:
+            self._openBus(bus)
+        return bus.device
+
+    def stop(self) -> None:
+        self.uninstall()
+        for bus in self.buses:
+            bus.close()
+        if self.linkDir is not None:
+            shutil.rmtree(self.linkDir, ignore_errors=True)
+            self.linkDir = None
+        self._started = False
+
+    def portInfo(self) -> list:
+        """
+        ListPortInfo entries describing the virtual ports, as a USB-serial adapter would report them
+        """
+        result = []
+        for bus in self.buses:
+            if bus.device is None:
+                continue
+            info = ListPortInfo(bus.device, skip_link_detection=True)
+            info.serial_number = bus.serialNumber
+            info.vid = self.FTDI_VID
+            info.pid = self.FTDI_PID
+            info.manufacturer = "FTDI"
+            info.product = "AMF virtual valve"
+            info.description = f"AMF virtual valve ({bus.connectionMode})"
+            info.hwid = f"USB VID:PID={self.FTDI_VID:04X}:{self.FTDI_PID:04X} SER={bus.serialNumber}"
+            result.append(info)
+        return result
+
+    def install(self) -> None:
+        """
+        Make serial.tools.list_ports.comports() report the virtual ports alongside the real ones
+        """
+        if self._originalComports is not None:
+            return
+        original = serial.tools.list_ports.comports
+        self._originalComports = original
+
+        def comports(*args, **kwargs):
+            return list(original(*args, **kwargs)) + self.portInfo()
+
+        serial.tools.list_ports.comports = comports
+
+    def uninstall(self) -> None:
+        if self._originalComports is not None:
+            serial.tools.list_ports.comports = self._originalComports
+            self._originalComports = None
+
+    def __enter__(self) -> "AMFSimulator":
+        self.start()
+        self.install()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Expose virtual AMF rotary valves as pseudo-terminals")
+    parser.add_argument("-n", "--valves", type=int, default=6, help="Number of USB valves to simulate")
+    parser.add_argument("-p", "--ports", type=int, default=12, help="Number of positions per valve")
+    parser.add_argument("-c", "--config", help="valve_config.json to take serial numbers and port counts from")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiplier applied to move durations")
+    args = parser.parse_args()
+
+    if args.config:
+        simulator = AMFSimulator.fromConfig(args.config, timeScale=args.time_scale)
+    else:
+        simulator = AMFSimulator.withValves(args.valves, portnumber=args.ports, timeScale=args.time_scale)
+    simulator.start()
+    for bus in simulator.buses:
+        for dev in bus.devices:
+            print(f"{dev.serialNumber}: {bus.device} -> {bus.slaveName} ({dev.portnumber} positions)")
+    print("Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
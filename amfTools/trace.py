@@ -0,0 +1,232 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#*******************************************************************************
+# File: trace.py
+# Package: AMFTools
+# Description: Opt-in instrumentation of the AMF command path and Chrome trace export
+# Python Version: 3.11.4
+#*******************************************************************************
+
+"""
+Where the time goes between a command and the product answering, per device.
+
+    recorder = TraceRecorder()
+    amfTools.AMF.recorder = recorder        # every product (or amf.recorder = recorder for one)
+    ...                                     # run the protocol
+    amfTools.AMF.recorder = None
+    print(recorder.report())
+    recorder.exportChromeTrace("run.json")  # open in chrome://tracing or https://ui.perfetto.dev
+
+Once installed, AMF.send, AMF.receive, AMF.connect and AMF.pullAndWait report to the recorder:
+pacing sleeps, write time, first answer byte and full frame latency of every command, connection
+times, and the polls and retries of every wait. The values are aggregated in per-device histograms
+and the spans are kept, up to maxEvents, for the timeline. With no recorder installed (the default)
+the hooks cost one attribute test per call.
+"""
+
+import json
+import math
+import threading
+import time
+from collections import deque
+
+
+class Histogram:
+    """
+        Log-scale histogram (8 buckets per octave, 9 % resolution) of positive values: durations in s or counts.
+        """
+    BUCKETS_PER_OCTAVE = 8
+    SMALLEST = 1e-6     # Values below fall in the first bucket
+
+    def __init__(self) -> None:
+        self.buckets = {}   # Bucket index -> count
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def bucket(self, value: float) -> int:
+        if value <= self.SMALLEST:
+            return 0
+        return int(math.log2(value / self.SMALLEST) * self.BUCKETS_PER_OCTAVE) + 1
+
+    def bound(self, index: int) -> float:
+        """
+        Upper bound of a bucket
+        """
+        return self.SMALLEST * 2 ** (index / self.BUCKETS_PER_OCTAVE)
+
+    def add(self, value: float) -> None:
+        index = self.bucket(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th percentile (q in [0; 100]), clamped to the observed range
+        """
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(max(self.bound(index), self.min), self.max)
+        return self.max
+
+    def toDict(self) -> dict:
+        return {"n": self.count, "mean": self.total / self.count if self.count else None, "min": self.min,
+                "p50": self.percentile(50), "p90": self.percentile(90), "p99": self.percentile(99), "max": self.max}
+
+
+class TraceRecorder:
+    """
+        Collects the timings reported by the AMF hooks.
+
+        INPUTS:
+            maxEvents: int - Number of timeline events kept for the trace export (the oldest are dropped), 0 for histograms only
+        """
+    def __init__(self, maxEvents: int = 200000) -> None:
+        self.lock = threading.Lock()
+        self.origin = time.monotonic()  # Time 0 of the trace
+        self.events = deque(maxlen=maxEvents) if maxEvents else None
+        self.histograms = {}    # Device -> metric -> Histogram
+        self.counters = {}      # Device -> counter -> int
+        self.labels = {}        # Device -> display name
+        self.tids = {}          # Device -> thread id of its timeline row
+
+    # ------------------------------------------------------------------ devices
+
+    @staticmethod
+    def deviceKey(amf) -> str:
+        if amf.connectionMode == "RS485":
+            return f"{amf.serialPort}/{amf.productAddress}"
+        return amf.serialNumber or amf.serialPort
+
+    def setLabel(self, amf, label: str) -> None:
+        """
+        Name of the product in the report and on the timeline (e.g. the valve letter)
+        """
+        with self.lock:
+            self.labels[self.deviceKey(amf)] = label
+
+    def name(self, key: str) -> str:
+        return self.labels.get(key, key)
+
+    # ------------------------------------------------------------------ recording
+
+    def record(self, amf, metric: str, value: float) -> None:
+        with self.lock:
+            self._record(self.deviceKey(amf), metric, value)
+
+    def count(self, amf, counter: str, n: int = 1) -> None:
+        with self.lock:
+            counters = self.counters.setdefault(self.deviceKey(amf), {})
+            counters[counter] = counters.get(counter, 0) + n
+
+    def span(self, amf, name: str, start: float, end: float, args: dict = None) -> None:
+        """
+        One timed operation: added to the histogram 'name' and to the timeline
+        """
+        with self.lock:
+            key = self.deviceKey(amf)
+            self._record(key, name, end - start)
+            self._event(key, name, start, end, args)
+
+    def transaction(self, amf, command: str, pacingStart: float, writeStart: float, writeEnd: float,
+                    firstByte: float, frameEnd: float) -> None:
+        """
+        One command sent by AMF.send. firstByte and frameEnd are None when no answer was read.
+        """
+        command = command.strip()
+        with self.lock:
+            key = self.deviceKey(amf)
+            counters = self.counters.setdefault(key, {})
+            counters['commands'] = counters.get('commands', 0) + 1
+            if writeStart - pacingStart > 0:
+                self._record(key, 'pacing', writeStart - pacingStart)
+                self._event(key, 'pacing', pacingStart, writeStart, None)
+            self._record(key, 'write', writeEnd - writeStart)
+            args = {'command': command}
+            if firstByte is not None:
+                self._record(key, 'firstByte', firstByte - writeEnd)
+                args['firstByte_ms'] = round((firstByte - writeEnd) * 1000, 3)
+            if frameEnd is not None:
+                self._record(key, 'frame', frameEnd - writeEnd)
+            else:
+                counters['unanswered'] = counters.get('unanswered', 0) + 1
+            self._event(key, command[2:] if len(command) > 2 else command, writeStart,
+                        frameEnd if frameEnd is not None else writeEnd, args)
+
+    def _record(self, key: str, metric: str, value: float) -> None:
+        # Caller holds self.lock
+        histograms = self.histograms.setdefault(key, {})
+        histogram = histograms.get(metric)
+        if histogram is None:
+            histogram = histograms[metric] = Histogram()
+        histogram.add(value)
+
+    def _event(self, key: str, name: str, start: float, end: float, args: dict) -> None:
+        # Caller holds self.lock
+        if self.events is None:
+            return
+        tid = self.tids.setdefault(key, len(self.tids) + 1)
+        event = {"name": name, "ph": "X", "pid": 1, "tid": tid,
+                 "ts": round((start - self.origin) * 1e6, 1), "dur": round((end - start) * 1e6, 1)}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def clear(self) -> None:
+        with self.lock:
+            if self.events is not None:
+                self.events.clear()
+            self.histograms = {}
+            self.counters = {}
+            self.origin = time.monotonic()
+
+    # ------------------------------------------------------------------ export
+
+    def summary(self) -> dict:
+        """
+        Device name -> {'histograms': metric -> statistics, 'counters': counter -> int}
+        """
+        with self.lock:
+            keys = list(dict.fromkeys(list(self.histograms) + list(self.counters)))
+            return {self.name(key): {"histograms": {metric: histogram.toDict() for metric, histogram in self.histograms.get(key, {}).items()},
+                                     "counters": dict(self.counters.get(key, {}))} for key in keys}
+
+    def report(self) -> str:
+        """
+        Text table of the summary, durations in ms
+        """
+        lines = []
+        for device, data in self.summary().items():
+            counters = ", ".join(f"{name} {value}" for name, value in data["counters"].items())
+            lines.append(f"{device}" + (f" ({counters})" if counters else ""))
+            for metric, stats in data["histograms"].items():
+                scale = 1 if metric in ('polls', 'retries') else 1000
+                unit = "" if scale == 1 else " ms"
+                lines.append(f"    {metric:<14} n {stats['n']:>6}   p50 {stats['p50']*scale:9.2f}{unit}   "
+                             f"p90 {stats['p90']*scale:9.2f}{unit}   max {stats['max']*scale:9.2f}{unit}")
+        return "\n".join(lines)
+
+    def toChromeTrace(self) -> dict:
+        """
+        Trace-event document (chrome://tracing, Perfetto): one timeline row per device
+        """
+        with self.lock:
+            events = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "amfTools"}}]
+            events += [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": self.name(key)}}
+                       for key, tid in self.tids.items()]
+            events += list(self.events or ())
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def exportChromeTrace(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.toChromeTrace(), f)
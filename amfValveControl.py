@@ -2,29 +2,90 @@ import amfTools
 import json
 import time
 import os
+import serial.tools.list_ports
+import threading
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from amfTools.aio import AsyncAMF
 
 project_root = os.path.dirname(os.path.abspath(__file__))  # Get the directory where THIS script is currently sitting
 local_dll_path = os.path.join(project_root, 'drivers')
-if os.path.exists(local_dll_path):
-    os.add_dll_directory(local_dll_path)
-    print(f"Loaded local FTDI drivers from: {local_dll_path}")
-else:
-    print("Warning: Local driver folder not found. Falling back to System32.")
+if os.name == 'nt':  # The FTDI DLL is only needed (and os.add_dll_directory only exists) on Windows
+    if os.path.exists(local_dll_path):
+        os.add_dll_directory(local_dll_path)
+        print(f"Loaded local FTDI drivers from: {local_dll_path}")
+    else:
+        print("Warning: Local driver folder not found. Falling back to System32.")
 
 
 
+class ValveShadow:
+    """Controller-side record of the last port commanded to a valve and of the last port the valve confirmed."""
+    def __init__(self):
+        self.commanded = None           # last port commanded, None if unknown (e.g. after a sequence)
+        self.confirmed = None           # last port read back from the valve, None while moving or unknown
+        self.confirmedAt = None         # time.monotonic() of the last confirmation
+        self.moving = False             # a move was commanded and has not been confirmed yet
+        self.moves = 0                  # moves commanded so far: a ?6 read is discarded if a move started meanwhile
+    def inPlace(self, port):
+        """True if the valve is known to be at port already (moves there can be dropped)."""
+        return not self.moving and self.confirmed == port and self.commanded in (None, port)
+
+
+class TransitionHandle:
+    """Completion handle of a multi-valve move started by amfValveControl.setValvePorts."""
+    def __init__(self, targets):
+        self.targets = dict(targets)    # label -> port
+        self.skipped = []               # labels that were already at their target
+        self.startTimes = {}            # label -> time.monotonic() at which the move was sent
+        self.durations = {}             # label -> s between the move command and the valve reporting done
+        self.positions = {}             # label -> port read back at the end of the move
+        self.startTime = time.monotonic()
+        self.endTime = None
+        self.future = Future()
+    def done(self):
+        return self.future.done()
+    def wait(self, timeout=None):
+        """Block until every valve reports done, return the per-valve durations (raises the first valve error)."""
+        return self.future.result(timeout)
+    def addDoneCallback(self, callback):
+        self.future.add_done_callback(lambda future: callback(self))
+    @property
+    def elapsed(self):
+        return (self.endTime or time.monotonic()) - self.startTime
+    @property
+    def slowest(self):
+        return max(self.durations, key=self.durations.get) if self.durations else None
+
+
 class amfValveControl:
     def __init__(self,status_callback=None):
         self.status_callback = status_callback
+        self.logLock = threading.Lock()  # startup phases log from several threads
+        self.sessions = {}  # label -> open amfTools.AMF, kept for the life of the controller
+        self.sessionLock = threading.RLock()  # (re)binding of the sessions, from the protocol and the device monitor
+        self.offlineValves = set()  # labels whose USB port disappeared, until the device monitor sees it back
+        self.deviceMonitor = None
+        self.shadows = {}  # label -> ValveShadow, kept across reconnections
+        self.shadowLock = threading.Lock()
+        self.reconcileStop = threading.Event()
+        self.poller = amfTools.StatusPoller()  # one shared status stream for every valve
+        self.executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix="valve")
+        self.configFingerprints = {}  # label -> firmware configuration fingerprint (e.g. "portnumber=12;stopOnMiddle=1")
+        self.cacheFilePath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "discovery_cache.json")
+        self.startupReport = {'phases': {}, 'valves': {}}  # phase -> s, label -> {phase -> s}
+        startupStart = time.monotonic()
         self.log("Initializing Hardware...")
         configFile = "valve_config.json" 
-        # 1 get the list of connected valves
-        self.valveList = self.getValveList()
-        # print("1. Connected valves discovered.")
-        self.log("1. Discovering connected valves.")
-        # 2. load a valve configuration (serial# to letter association)
+        # 1. load a valve configuration (serial# to letter association)
         self.serialMap = {}
         self.loadConfig(configFile)
+        # 2 get the list of connected valves (cached ports first, full scan only for the missing ones)
+        phaseStart = time.monotonic()
+        self.valveList = self.discoverValves()
+        self.startupReport['phases']['discovery'] = time.monotonic() - phaseStart
+        # print("1. Connected valves discovered.")
+        self.log("1. Discovering connected valves.")
         # print("2. Valve map loaded.")
         self.log("2. Valve map loaded.")
         # 3. be sure all valves are present
@@ -38,6 +99,7 @@ class amfValveControl:
         self.log("3. All valves confirmed.")
         # 4. associate the letters with the serial number and object
         self.initializeValves(self.valveList)
+        self.updateDiscoveryCache()
         # print("4. Letter mapping to hardware completed.")
         self.log("4. Letter mapping to hardware completed.")
         
@@ -47,6 +109,13 @@ class amfValveControl:
         
         # print("5. All valves homed.")
         self.log("5. All valves homed.")
+        # 6. read where every valve is, moves to the port a valve is already at are dropped from now on
+        self.runOnAllValves('reconciliation', self.reconcileValve)
+        self.startupReport['phases']['total'] = time.monotonic() - startupStart
+        self.logStartupReport()
+        # 7. watch the USB ports, a valve unplugged and plugged back in is recovered on the fly
+        self.startDeviceMonitor()
+        self.startReconciliation()
         
     def loadConfig(self,configFile):
         thisFolder = os.path.dirname(__file__)
@@ -64,65 +133,573 @@ class amfValveControl:
             for hardwareItem in valveList:
                 if hardwareItem.serialnumber == sn:
                     self.valves[label] = hardwareItem
-                    nPorts = self.portCounts[label]       
-                    self.setNumberOfPorts(label,nPorts)
-                    state = 1
-                    self.configureStopOnMiddle(label,state) 
         if len(self.valves) != len(self.serialMap):
             raise RuntimeError("Valves found and valves expected do not match!")
+        self.runOnAllValves('configuration', self.configureValve)
+    def configureValve(self, label):
+        """Apply the valve_config.json settings of label (port count, stop on middle)."""
+        state = 1
+        self.syncValveConfig(label, nPorts=self.portCounts[label], stopOnMiddle=state)
+    def runOnAllValves(self, phase, action):
+        """Run action(label) on every valve concurrently, timing each valve and the whole phase for the startup report."""
+        def timed(label):
+            start = time.monotonic()
+            try:
+                return action(label)
+            finally:
+                self.startupReport['valves'].setdefault(label, {})[phase] = time.monotonic() - start
+        phaseStart = time.monotonic()
+        futures = {label: self.executor.submit(timed, label) for label in self.valves}
+        results = {}
+        errors = []
+        for label, future in futures.items():
+            try:
+                results[label] = future.result()
+            except Exception as e:
+                errors.append(f"{label}: {e}")
+        self.startupReport['phases'][phase] = time.monotonic() - phaseStart
+        if errors:
+            raise RuntimeError(f"{phase} failed for " + "; ".join(errors))
+        return results
+    def logStartupReport(self):
+        report = self.startupReport
+        phases = [phase for phase in report['phases'] if phase != 'total']
+        self.log("Startup report: " + ", ".join(f"{phase} {report['phases'][phase]:.2f}s" for phase in phases)
+                 + f", total {report['phases'].get('total', 0):.2f}s")
+        for label in [label for label in self.valves if label in report['valves']]:
+            timings = report['valves'][label]
+            self.log(f"  {label}: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items()))
         
     def setNumberOfPorts(self, valveID, nPorts):
-        thisValve = amfTools.AMF(self.valves.get(valveID))
-        self.log(f"Configuring {valveID} firmware: {nPorts} ports.")
-        thisValve.setPortNumber(nPorts)
-        thisValve.disconnect() # Clean close
+        self.syncValveConfig(valveID, nPorts=nPorts)
         
     def configureStopOnMiddle(self, valveID, state):
-        # 1. Connect to the raw hardware
-        thisValve = amfTools.AMF(self.valves.get(valveID))
+        self.syncValveConfig(valveID, stopOnMiddle=state)
         
-        self.log(f"Setting StopOnMiddle for {valveID} to {state}.")
-        
-        # 2. Call the new library method
-        thisValve.setStopOnMiddle(state)
+    def syncValveConfig(self, valveID, nPorts=None, stopOnMiddle=None):
+        """Write only the firmware settings that differ from the requested ones, and record the resulting fingerprint."""
+        device = self.valves.get(valveID)
+        cachedFingerprint = getattr(self, 'discoveryCache', {}).get(device.serialnumber, {}).get('config') if device is not None else None
+        def sync(thisValve):
+            thisValve.loadConfigFingerprint(cachedFingerprint)  # settings the valve cannot report, as written at an earlier launch
+            return thisValve.syncConfiguration(portnumber=nPorts, stopOnMiddle=stopOnMiddle)
+        written = self.runOnValve(valveID, sync)
+        if written:
+            self.log(f"Configuring {valveID} firmware: {', '.join(written)}.")
+        else:
+            self.log(f"{valveID} firmware configuration already in effect.")
+        self.configFingerprints[valveID] = self.getValve(valveID).getConfigFingerprint()
+        return written
         
-        # 3. Disconnect to keep the serial bus clean
-        thisValve.disconnect()
+    def getValve(self, valveID, reconnect=False):
+        """Return the open session for valveID, (re)connecting only when needed."""
+        thisValve = self.sessions.get(valveID)
+        if thisValve is not None and not reconnect and self.isSessionHealthy(thisValve):
+            return thisValve
+        with self.sessionLock:
+            return self.openSession(valveID, reconnect)
+    def openSession(self, valveID, reconnect):
+        thisValve = self.sessions.get(valveID)
+        if thisValve is not None and not reconnect and self.isSessionHealthy(thisValve):
+            return thisValve  # opened by another thread meanwhile
+        if thisValve is not None:
+            self.poller.unregister(thisValve)
+            thisValve.disconnect()
+        device = self.valves.get(valveID)
+        if device is None:
+            raise KeyError(f"Unknown valve: {valveID}")
+        if valveID in self.offlineValves:
+            raise ConnectionError(f"{valveID} is unplugged, waiting for it to come back")
+        portCount = getattr(self, 'portCounts', {}).get(valveID)
+        if portCount is None:
+            thisValve = amfTools.AMF(device)  # reads the port count from the valve
+        else:
+            thisValve = amfTools.AMF.fromDescriptor(device, portnumber=portCount)  # no probing, syncValveConfig checks the configuration
+        shadow = self.shadows.get(valveID)
+        if shadow is not None and not shadow.moving:
+            thisValve.valvePosition = shadow.confirmed  # lets the session predict its next move
+        self.sessions[valveID] = thisValve
+        if amfTools.AMF.recorder is not None:
+            amfTools.AMF.recorder.setLabel(thisValve, valveID)  # valve letter on the trace timeline
+        self.poller.register(thisValve)
+        return thisValve
+    
+    @staticmethod
+    def isSessionHealthy(thisValve):
+        return thisValve.connected and thisValve.productserial is not None and thisValve.productserial.is_open
+    
+    def runOnValve(self, valveID, action):
+        """Run action(session) on valveID, reconnecting once if the port dropped."""
+        try:
+            return action(self.getValve(valveID))
+        except amfTools.DeadlineExceeded:
+            raise  # out of time: a reconnection would only run past the deadline
+        except amfTools.CircuitOpenError:
+            raise  # the breaker failed fast, the session itself is fine: reconnecting would only hit the breaker again
+        except OSError as e:  # SerialException and ConnectionError are both OSErrors
+            self.log(f"{valveID} connection lost ({e}), reconnecting.")
+            return action(self.getValve(valveID, reconnect=True))
         
+    def close(self):
+        self.reconcileStop.set()
+        if self.deviceMonitor is not None:
+            self.deviceMonitor.stop()
+        self.poller.stop()
+        self.executor.shutdown(wait=False)
+        for thisValve in self.sessions.values():
+            thisValve.disconnect()
+        self.sessions = {}
         
     def log(self, message):
-        print(message)
-        if self.status_callback:
-            self.status_callback(message)
+        with self.logLock:
+            print(message)
+            if self.status_callback:
+                self.status_callback(message)
     @staticmethod
-    def getValveList():
-        return amfTools.util.getProductList("USB")
+    def getValveList(ports=None):
+        return amfTools.util.getProductList("USB", port=ports)
+    def loadDiscoveryCache(self):
+        try:
+            with open(self.cacheFilePath, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    def discoverValves(self):
+        """Use the ports cached at the last launch, each checked with one query, and scan only for the valves not found there."""
+        self.discoveryCache = self.loadDiscoveryCache()
+        cached = {sn: self.discoveryCache[sn] for sn in self.serialMap.values() if sn in self.discoveryCache}
+        devices = {sn: amfTools.Device.fromDict(entry) for sn, entry in cached.items()}
+        checks = {sn: self.executor.submit(amfTools.util.verifyDevice, devices[sn], entry.get('uniqueID')) for sn, entry in cached.items()}
+        valveList = [devices[sn] for sn, check in checks.items() if check.result()]
+        missing = set(self.serialMap.values()) - {v.serialnumber for v in valveList}
+        if missing:
+            self.log(f"Scanning for {len(missing)} valve(s) not found at their cached port.")
+            verifiedPorts = {v.comPort for v in valveList}
+            ports = [p.device for p in serial.tools.list_ports.comports()
+                     if p.device not in verifiedPorts and amfTools.util.isCandidatePort(p)]
+            valveList += [v for v in self.getValveList(ports) if v.serialnumber in missing] if ports else []
+        return valveList
+    def updateDiscoveryCache(self):
+        """Record the port and unique ID of every valve, for the next launch."""
+        changed = False
+        for label, device in self.valves.items():
+            entry = self.discoveryCache.get(device.serialnumber)
+            fingerprint = self.configFingerprints.get(label)
+            if entry is not None and entry.get('comPort') == device.comPort and entry.get('uniqueID'):
+                if entry.get('config') != fingerprint:
+                    entry['config'] = fingerprint
+                    changed = True
+                continue
+            entry = device.toDict()
+            entry['config'] = fingerprint
+            try:
+                entry['uniqueID'] = self.runOnValve(label, lambda thisValve: thisValve.getUniqueID())
+            except Exception as e:
+                self.log(f"Could not read the unique ID of {label}: {e}")
+                continue
+            self.discoveryCache[device.serialnumber] = entry
+            changed = True
+        if changed:
+            try:
+                with open(self.cacheFilePath, 'w') as f:
+                    json.dump(self.discoveryCache, f, indent=4)
+            except OSError as e:
+                self.log(f"Could not save the discovery cache: {e}")
     def setValveHome(self, valveID):
-        thisValve = amfTools.AMF(self.valves.get(valveID))
-        if not thisValve.getHomeStatus():
-            self.log(f"Homing Valve {valveID}.")
-            thisValve.home()
-            time.sleep(0.01) # 10ms is usually a very safe minimum (according to google. test?)
-        else:
-            self.log(f"{valveID} already home.")    
-        thisValve.disconnect()
+        def home(thisValve):
+            if not thisValve.getHomeStatus():
+                self.log(f"Homing Valve {valveID}.")
+                self.commandShadow(valveID, 1)
+                thisValve.home()
+                self.confirmShadow(valveID, 1)
+            else:
+                self.log(f"{valveID} already home.")
+        self.runOnValve(valveID, home)
     def setAllValvesHome(self):
-        for label in self.valves:
-            self.setValveHome(label)
-    def setValvePort(self, valveID, portID):
-        thisValve = amfTools.AMF(self.valves.get(valveID))
-        thisValve.valveShortestPath(portID, block= False)  # Non blocking function
-        time.sleep(0.01)
-        self.log(f"Valve {valveID} given command: move to port {portID}")
-        thisValve.disconnect()
+        """Home all the valves that need it at the same time, and wait for the slowest one."""
+        def startHoming(label):
+            def home(thisValve):
+                if thisValve.getHomeStatus():
+                    self.log(f"{label} already home.")
+                    return None
+                self.log(f"Homing Valve {label}.")
+                self.commandShadow(label, 1)
+                thisValve.home(block=False)
+                return thisValve
+            return self.runOnValve(label, home)
+        homing = {label: thisValve for label, thisValve in self.runOnAllValves('homing', startHoming).items() if thisValve is not None}
+        if not homing:
+            return
+        phaseStart = time.monotonic() - self.startupReport['phases']['homing']
+        statuses = self.poller.waitAll(list(homing.values()), timeout=60, homing=True)
+        for (label, thisValve), status in zip(homing.items(), statuses):
+            thisValve.valvePosition = 1
+            self.confirmShadow(label, 1)
+            homeTime = status.doneTime if status.doneTime and status.doneTime > thisValve.lastActionTime else status.queryTime
+            self.startupReport['valves'][label]['homing'] = homeTime - phaseStart
+        self.startupReport['phases']['homing'] = time.monotonic() - phaseStart
+    def setValvePort(self, valveID, portID, timeout=30):
+        """Move one valve, return a TransitionHandle whose wait() gives {valveID: duration} once ?6 reads portID (raises the valve error)."""
+        return self.setValvePorts({valveID: portID}, timeout)
+    def setValvePorts(self, targets, timeout=30):
+        """Move several valves at once ({label: port}) and return a TransitionHandle that completes when all are done."""
+        handle = TransitionHandle(targets)
+        dispatches = {}
+        buses = {}  # RS485 serial port -> {label: port}, valves sharing a bus are started by one broadcast
+        for label, portID in targets.items():
+            if self.shadowOf(label).inPlace(portID):
+                handle.skipped.append(label)
+                continue
+            thisValve = self.getValve(label)
+            if thisValve.valvePosition == portID and thisValve.pendingMove is None:
+                self.confirmShadow(label, portID)
+                handle.skipped.append(label)
+            elif thisValve.connectionMode == "RS485" and thisValve.productAddress != "_":
+                buses.setdefault(thisValve.serialPort, {})[label] = portID
+            else:
+                dispatches[label] = self.executor.submit(self.dispatchMove, label, portID)
+        for busTargets in buses.values():
+            if len(busTargets) == 1:
+                (label, portID), = busTargets.items()
+                dispatches[label] = self.executor.submit(self.dispatchMove, label, portID)
+                continue
+            groupDispatch = self.executor.submit(self.dispatchGroupMove, busTargets)
+            for label in busTargets:
+                dispatches[label] = groupDispatch
+        moves = ", ".join(f"{label}->{targets[label]}" for label in dispatches) or "none"
+        self.log(f"Valves given command: {moves}" + (f" ({', '.join(handle.skipped)} already in place)" if handle.skipped else ""))
+        threading.Thread(target=self.completeTransition, args=(handle, dispatches, timeout), daemon=True).start()
+        return handle
+    def dispatchMove(self, valveID, portID):
+        self.commandShadow(valveID, portID)
+        def move(thisValve):
+            thisValve.valveShortestPath(portID, block=False)
+            return {valveID: (thisValve, thisValve.lastActionTime)}
+        return self.runOnValve(valveID, move)
+    def dispatchGroupMove(self, busTargets):
+        """Load the moves of valves sharing an RS485 bus and start them with one broadcast, {label: (session, start time)}."""
+        sessions = {label: self.getValve(label) for label in busTargets}
+        for label, portID in busTargets.items():
+            self.commandShadow(label, portID)
+        group = amfTools.BroadcastGroup(sessions.values())
+        group.valveShortestPath({sessions[label]: portID for label, portID in busTargets.items()}, block=False)
+        return {label: (thisValve, thisValve.lastActionTime) for label, thisValve in sessions.items()}
+    def completeTransition(self, handle, dispatches, timeout):
+        try:
+            started = {}
+            for dispatch in dict.fromkeys(dispatches.values()):  # valves of one RS485 bus share their dispatch
+                started.update(dispatch.result())
+            for label, (thisValve, startTime) in started.items():
+                handle.startTimes[label] = startTime
+            sessions = [thisValve for thisValve, _ in started.values()]
+            statuses = self.poller.waitAll(sessions, timeout=timeout, after=dict(started.values()))
+            for (label, (thisValve, startTime)), status in zip(started.items(), statuses):
+                doneTime = status.doneTime if status.doneTime and status.doneTime > startTime else status.queryTime
+                handle.durations[label] = doneTime - startTime
+                handle.positions[label] = self.confirmArrival(label, thisValve, handle.targets[label])
+            handle.endTime = time.monotonic()
+            handle.future.set_result(handle.durations)
+        except Exception as e:
+            for label in dispatches:
+                self.confirmShadow(label, None)  # position unknown until the next ?6
+            handle.endTime = time.monotonic()
+            handle.future.set_exception(e)
+    def confirmArrival(self, label, thisValve, portID):
+        """Read the port of a valve that reported its move done (?6), raise if it is not portID."""
+        position = thisValve.getValvePosition()
+        self.confirmShadow(label, position)
+        if position != portID:
+            raise RuntimeError(f"Valve {label} reported its move done at port {position} instead of port {portID}")
+        return position
     def getValvePort(self, valveID):
-        thisValve = amfTools.AMF(self.valves.get(valveID))
-        portOut = thisValve.getValvePosition()
-        time.sleep(0.01)
-        thisValve.disconnect()
-        return portOut
+        with self.shadowLock:
+            moves = self.shadowOf(valveID).moves
+        position = self.runOnValve(valveID, lambda thisValve: thisValve.getValvePosition())
+        self.confirmShadow(valveID, position, moves)
+        return position
+    def shadowOf(self, label):
+        return self.shadows.setdefault(label, ValveShadow())
+    def commandShadow(self, label, portID):
+        """Record a move of label to portID (None: a command whose final port is not known)."""
+        with self.shadowLock:
+            shadow = self.shadowOf(label)
+            shadow.commanded = portID
+            shadow.confirmed = None
+            shadow.moving = True
+            shadow.moves += 1
+    def confirmShadow(self, label, portID, moves=None):
+        """Record the port label reported (None: unknown), ignored if a move was commanded after the read (moves)."""
+        with self.shadowLock:
+            shadow = self.shadowOf(label)
+            if moves is not None and (shadow.moves != moves or shadow.moving):
+                return False
+            shadow.confirmed = portID
+            shadow.confirmedAt = time.monotonic() if portID is not None else None
+            shadow.moving = False
+            return True
+    def reconcileValve(self, label):
+        """Read the port of an idle valve with ?6 and correct its shadow, True if it was not where the shadow said."""
+        expectation = self.reconcileExpectation(label)
+        if expectation is None:
+            return False
+        position = self.runOnValve(label, lambda thisValve: thisValve.getValvePosition())
+        return self.reconcileResult(label, position, *expectation)
+    def reconcileExpectation(self, label):
+        """(moves, expected port) to check label against, None if it is moving or unplugged (see reconcileResult)."""
+        with self.shadowLock:
+            shadow = self.shadowOf(label)
+            if shadow.moving or label in self.offlineValves:
+                return None
+            return shadow.moves, shadow.confirmed if shadow.confirmed is not None else shadow.commanded
+    def reconcileResult(self, label, position, moves, expected):
+        """Correct the shadow of label with the port it reported, True if it was not the expected one."""
+        if not self.confirmShadow(label, position, moves):
+            return False  # a move started meanwhile
+        if expected is not None and position != expected:
+            self.log(f"{label} is at port {position}, expected port {expected}.")
+            return True
+        return False
+    def reconcileValves(self):
+        """Reconcile every valve (see reconcileValve), return the labels found elsewhere than expected."""
+        mismatched = []
+        for label in list(self.valves):
+            try:
+                if self.reconcileValve(label):
+                    mismatched.append(label)
+            except Exception as e:
+                self.log(f"Could not read the port of {label}: {e}")
+        return mismatched
+    def startReconciliation(self, interval=30.0):
+        """Reconcile the shadows with the valves every interval s, in the background."""
+        def run():
+            while not self.reconcileStop.wait(interval):
+                self.reconcileValves()
+        self.reconcileStop.clear()
+        threading.Thread(target=run, daemon=True, name="ValveReconciliation").start()
+    def startDeviceMonitor(self, interval=1.0):
+        """Watch the USB ports of the configured valves (see onValveRemoval / onValveArrival)."""
+        self.deviceMonitor = amfTools.DeviceMonitor(onArrival=self.onValveArrival, onRemoval=self.onValveRemoval,
+                                                    serialNumbers=self.serialMap.values(), interval=interval)
+    def labelOf(self, serialNumber):
+        return next((label for label, sn in self.serialMap.items() if sn == serialNumber), None)
+    def onValveRemoval(self, serialNumber, port):
+        """The USB port of a valve disappeared: drop its session until it comes back."""
+        label = self.labelOf(serialNumber)
+        if label is None or label not in self.valves:
+            return
+        with self.sessionLock:
+            self.offlineValves.add(label)
+            thisValve = self.sessions.pop(label, None)
+        if thisValve is not None:
+            self.poller.unregister(thisValve)
+            thisValve.disconnect()
+        self.log(f"{label} disconnected from {port}.")
+    def onValveArrival(self, serialNumber, port):
+        label = self.labelOf(serialNumber)
+        if label is None or label not in self.valves:
+            return
+        if label in self.offlineValves or self.valves[label].comPort != port:
+            self.executor.submit(self.recoverValve, label, port)
+    def recoverValve(self, label, port):
+        """Re-bind label to the port it came back on, re-apply its configuration and check its position with ?6 (True if it worked)."""
+        start = time.monotonic()
+        try:
+            with self.sessionLock:
+                self.offlineValves.discard(label)
+                self.valves[label].comPort = port
+                thisValve = self.getValve(label, reconnect=True)
+            thisValve.getCircuitBreaker().reset()  # failures before the replug say nothing about the new connection
+            self.configureValve(label)
+            position = thisValve.getValvePosition()
+            if position == 0:  # the valve lost its homing (power cut)
+                self.log(f"{label} is not homed any more, homing it.")
+                self.commandShadow(label, 1)
+                thisValve.home()
+                position = thisValve.getValvePosition()
+            thisValve.valvePosition = position
+            self.confirmShadow(label, position)
+            self.updateDiscoveryCache()
+            self.log(f"{label} recovered on {port} at port {position} in {time.monotonic() - start:.2f}s.")
+            return True
+        except Exception as e:  # the next command on the valve reconnects to the new port again
+            self.log(f"{label} reappeared on {port} but could not be recovered: {e}")
+            return False
+    def valveSequence(self, valveID):
+        """New on-device command sequence (moves, delays, loops) for valveID, run it with runValveSequence."""
+        return self.getValve(valveID).sequence()
+    def runValveSequence(self, valveID, sequence, block=True, timeout=None):
+        """Send a whole sequence to valveID in one write, the valve times its steps itself (returns a Future if not block)."""
+        self.log(f"Valve {valveID} given sequence: {sequence.build()}")
+        thisValve = self.getValve(valveID)  # a dropped port is reopened before the write only: a sequence is never sent twice
+        self.commandShadow(valveID, None)
+        with self.shadowLock:
+            moves = self.shadowOf(valveID).moves
+        try:
+            thisValve.runSequence(sequence, block=False)
+        except Exception:
+            self.confirmShadow(valveID, None)
+            raise
+        if block:
+            return self.finishSequence(valveID, thisValve, moves, timeout)
+        return self.executor.submit(self.finishSequence, valveID, thisValve, moves, timeout)
+    def finishSequence(self, valveID, thisValve, moves, timeout=None):
+        """Wait for the end of a sequence started by runValveSequence, then read the port it left the valve at."""
+        try:
+            self.poller.waitAll([thisValve], timeout=timeout)
+        finally:
+            with self.shadowLock:
+                shadow = self.shadowOf(valveID)
+                if shadow.moves == moves:  # not superseded by a later command
+                    shadow.moving = False
+                    shadow.confirmed = None
+        self.reconcileValve(valveID)
     def getAllValves(self):
         for label in self.valves:
             # print(f"Valve: {label} at port {self.getValvePort(label)}.")
             self.log(f"Valve: {label} at port {self.getValvePort(label)}.")
 
+
+
+class amfAsyncValveControl:
+    """asyncio facade over an initialized amfValveControl: the event loop drives every valve, no thread per move."""
+    def __init__(self, controller):
+        self.controller = controller
+        controller.reconcileStop.set()  # its thread would share the serial ports with the event loop: reconciled on the loop instead
+        if controller.deviceMonitor is not None:
+            controller.deviceMonitor.stop()  # its recovery would bind the new session to the poller, the facade rebinds it to the loop
+            controller.deviceMonitor = None
+        self.deviceMonitor = None
+        self.reconcileTask = None
+        self.valves = {}  # label -> AsyncAMF wrapping the controller session
+        for label in controller.valves:
+            thisValve = controller.getValve(label)
+            controller.poller.unregister(thisValve)  # the event loop polls these sessions from now on
+            self.valves[label] = AsyncAMF(thisValve)
+    @classmethod
+    async def create(cls, status_callback=None):
+        """Run the (blocking) discovery, configuration and homing in the executor, then connect the async sessions."""
+        controller = await asyncio.get_running_loop().run_in_executor(None, amfValveControl, status_callback)
+        self = cls(controller)
+        await self.connect()
+        return self
+    async def connect(self):
+        await asyncio.gather(*(thisValve.connect() for thisValve in self.valves.values()))
+        if self.reconcileTask is None:
+            self.startReconciliation()
+        if self.deviceMonitor is None:
+            self.startDeviceMonitor()
+    def log(self, message):
+        self.controller.log(message)
+    async def setValvePort(self, valveID, portID, timeout=30):
+        """Move one valve and return the s between the command and the valve reporting done (once ?6 reads portID)."""
+        thisValve = self.valves[valveID]
+        self.controller.commandShadow(valveID, portID)
+        try:
+            await thisValve.valveShortestPath(portID, block=False)
+            startTime = thisValve.amf.lastActionTime
+            await thisValve.pullAndWait(timeout=timeout)
+            duration = time.monotonic() - startTime
+            position = await thisValve.getValvePosition()
+        except BaseException:
+            self.controller.confirmShadow(valveID, None)
+            raise
+        self.controller.confirmShadow(valveID, position)
+        if position != portID:
+            raise RuntimeError(f"Valve {valveID} reported its move done at port {position} instead of port {portID}")
+        return duration
+    async def setValvePorts(self, targets, timeout=30):
+        """Move several valves at once ({label: port}), return {label: duration}. Cancelling it hard-stops the valves still moving."""
+        moves = {label: portID for label, portID in targets.items() if not self.controller.shadowOf(label).inPlace(portID)}
+        skipped = [label for label in targets if label not in moves]
+        self.log(f"Valves given command: {', '.join(f'{label}->{portID}' for label, portID in moves.items()) or 'none'}"
+                 + (f" ({', '.join(skipped)} already in place)" if skipped else ""))
+        tasks = {label: asyncio.ensure_future(self.setValvePort(label, portID, timeout)) for label, portID in moves.items()}
+        try:
+            durations = await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*(self.valves[label].hardStop() for label, task in tasks.items() if not task.done() or task.cancelled()),
+                                 return_exceptions=True)
+            raise
+        return dict(zip(tasks, durations))
+    async def getValvePort(self, valveID):
+        return await self.valves[valveID].getValvePosition()
+    async def reconcileValve(self, label):
+        """Read the port of an idle valve on the event loop and correct its shadow (see amfValveControl.reconcileValve)."""
+        expectation = self.controller.reconcileExpectation(label)
+        if expectation is None:
+            return False
+        position = await self.valves[label].getValvePosition()
+        return self.controller.reconcileResult(label, position, *expectation)
+    async def reconcileValves(self):
+        mismatched = []
+        for label in list(self.valves):
+            try:
+                if await self.reconcileValve(label):
+                    mismatched.append(label)
+            except Exception as e:
+                self.log(f"Could not read the port of {label}: {e}")
+        return mismatched
+    def startReconciliation(self, interval=30.0):
+        """Reconcile the shadows with the valves every interval s, as a task of the running loop."""
+        async def run():
+            while True:
+                await asyncio.sleep(interval)
+                await self.reconcileValves()
+        self.reconcileTask = asyncio.ensure_future(run())
+    def startDeviceMonitor(self, interval=1.0):
+        """Watch the USB ports of the valves, the monitor thread hands its events to the running loop."""
+        loop = asyncio.get_running_loop()
+        self.deviceMonitor = amfTools.DeviceMonitor(
+            onArrival=lambda serialNumber, port: asyncio.run_coroutine_threadsafe(self.onValveArrival(serialNumber, port), loop),
+            onRemoval=lambda serialNumber, port: asyncio.run_coroutine_threadsafe(self.onValveRemoval(serialNumber, port), loop),
+            serialNumbers=self.controller.serialMap.values(), interval=interval)
+    async def onValveRemoval(self, serialNumber, port):
+        label = self.controller.labelOf(serialNumber)
+        if label is None or label not in self.valves:
+            return
+        with self.controller.sessionLock:
+            self.controller.offlineValves.add(label)
+            self.controller.sessions.pop(label, None)
+        try:
+            await self.valves[label].disconnect()
+        except Exception:
+            pass  # the port is gone already
+        self.log(f"{label} disconnected from {port}.")
+    async def onValveArrival(self, serialNumber, port):
+        """Recover the valve in the executor (see amfValveControl.recoverValve), then drive its new session from the loop."""
+        label = self.controller.labelOf(serialNumber)
+        if label is None or label not in self.valves:
+            return
+        if label not in self.controller.offlineValves and self.controller.valves[label].comPort == port:
+            return
+        try:
+            await self.valves[label].disconnect()  # still open if the port was renamed without a removal
+        except Exception:
+            pass
+        thisValve = await asyncio.get_running_loop().run_in_executor(None, self.recoverSession, label, port)
+        if thisValve is None:
+            return
+        asyncValve = AsyncAMF(thisValve)
+        await asyncValve.connect()
+        self.valves[label] = asyncValve
+    def recoverSession(self, label, port):
+        if not self.controller.recoverValve(label, port):
+            return None
+        thisValve = self.controller.getValve(label)
+        self.controller.poller.unregister(thisValve)
+        with thisValve.transactionLock():
+            pass  # a poll already in flight ends before the loop takes the port
+        return thisValve
+    async def close(self):
+        if self.deviceMonitor is not None:
+            self.deviceMonitor.stop()
+            self.deviceMonitor = None
+        if self.reconcileTask is not None:
+            self.reconcileTask.cancel()
+            self.reconcileTask = None
+        await asyncio.gather(*(thisValve.disconnect() for thisValve in self.valves.values()), return_exceptions=True)
+        self.valves = {}
+        self.controller.sessions = {}
+        self.controller.close()
@@ -0,0 +1,127 @@
+import os
+
+import pytest
+
+import amfTools
+from amfTools.simulator import AMFSimulator, VirtualRVM
+
+
+@pytest.fixture
+def valve():
+    """
+    (AMF, VirtualRVM) of one simulated 12-port valve, homed, with a fresh circuit breaker and move-time model
+    """
+    if os.name == "nt":
+        pytest.skip("The AMF simulator needs pseudo-terminals")
+    amfTools.AMF.circuitBreakers.clear()
+    amfTools.AMF.moveTimeModels.clear()     # Same simulated serial number in every test
+    with AMFSimulator.withValves(1, portnumber=12, timeScale=0.2) as sim:
+        virtual = sim.devices()[0]
+        amf = amfTools.AMF(amfTools.util.getProductList("USB", silent_mode=True)[0])
+        amf.home()
+        try:
+            yield amf, virtual
+        finally:
+            amf.disconnect()
+            amfTools.AMF.circuitBreakers.clear()
+
+
+@pytest.fixture
+def received(valve):
+    """
+    Command bodies received by the simulated valve (e.g. "b3R", "?6") from now on
+    """
+    _, virtual = valve
+    return recordCommands(virtual)
+
+
+def recordCommands(virtual):
+    """
+    Record the command bodies received by a VirtualRVM from now on, in the returned list
+    """
+    bodies = []
+    handle = virtual.handle
+
+    def recording(command, now=None):
+        bodies.append(command)
+        return handle(command, now)
+
+    virtual.handle = recording
+    return bodies
+
+
+@pytest.fixture
+def simulatedValves():
+    """
+    Started AMFSimulator exposing the valves of valve_config.json, with no discovery cache (restored afterwards)
+    """
+    if os.name == "nt":
+        pytest.skip("The AMF simulator needs pseudo-terminals")
+    import amfValveControl
+    root = os.path.dirname(os.path.abspath(amfValveControl.__file__))
+    cachePath = os.path.join(root, "discovery_cache.json")
+    savedCache = None
+    if os.path.exists(cachePath):
+        with open(cachePath, "rb") as f:
+            savedCache = f.read()
+        os.remove(cachePath)
+    amfTools.AMF.circuitBreakers.clear()
+    amfTools.AMF.moveTimeModels.clear()
+    try:
+        with AMFSimulator.fromConfig(os.path.join(root, "valve_config.json"), timeScale=0.2) as sim:
+            yield sim
+    finally:
+        if savedCache is not None:
+            with open(cachePath, "wb") as f:
+                f.write(savedCache)
+        elif os.path.exists(cachePath):
+            os.remove(cachePath)
+        amfTools.AMF.circuitBreakers.clear()
+
+
+@pytest.fixture
+def controller(simulatedValves):
+    """
+    (amfValveControl, AMFSimulator) started as at a launch: valves discovered, configured, homed and reconciled
+    """
+    import amfValveControl
+    vc = amfValveControl.amfValveControl()
+    try:
+        yield vc, simulatedValves
+    finally:
+        vc.close()
+
+
+def virtualValve(vc, sim, label):
+    """
+    VirtualRVM behind the valve label of a controller
+    """
+    return next(valve for valve in sim.devices() if valve.serialNumber == vc.serialMap[label])
+
+
+@pytest.fixture
+def rs485():
+    """
+    ([AMF, ...], [VirtualRVM, ...]) of three 6-port valves: addresses 1 and 2 on one RS485 bus, address 1 on another
+    """
+    if os.name == "nt":
+        pytest.skip("The AMF simulator needs pseudo-terminals")
+    amfTools.AMF.circuitBreakers.clear()
+    amfTools.AMF.moveTimeModels.clear()
+    sim = AMFSimulator(timeScale=0.2)
+    virtuals = []
+    for bus, addresses in enumerate(("12", "1")):
+        valves = [VirtualRVM(f"SIMBUS{bus}{address}", 6, productAddress=address, timeScale=0.2) for address in addresses]
+        for valve in valves:
+            valve.connectionMode = "RS485"
+        sim.addBus(valves)
+        virtuals += valves
+    with sim:
+        devices = amfTools.util.getProductList("RS485", port=sim.ports(), silent_mode=True)
+        amfs = [amfTools.AMF(device) for device in sorted(devices, key=lambda d: (sim.ports().index(d.comPort), d.productAddress))]
+        try:
+            yield amfs, virtuals
+        finally:
+            for amf in amfs:
+                amf.disconnect()
+            amfTools.AMF.circuitBreakers.clear()
@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+from amfTools.actor import AMFActor
+
+
+@pytest.fixture
+def actor(valve):
+    amf, _ = valve
+    actor = AMFActor(amf)
+    try:
+        yield actor
+    finally:
+        actor.stop()
+
+
+def test_moveResolvesWhenDone(actor, valve, received):
+    amf, virtual = valve
+    assert actor.valveShortestPath(4).result(5) is None
+    assert virtual.position == 4 and not virtual.isBusy()
+    assert "b4R" in received
+
+
+def test_positionalBlock(actor, valve):
+    amf, virtual = valve
+    move = actor.valveShortestPath(7, False, True)     # target, enforced, block
+    assert move.result(5) is None
+    assert virtual.position == 7 and not virtual.isBusy()
+    assert actor.valveShortestPath(3, False, False).result(5) is None     # Sent without waiting for its end
+
+
+def test_stopLaneJumpsQueue(actor, valve, received):
+    amf, virtual = valve
+    move = actor.valveShortestPath(7)
+    deadline = time.monotonic() + 5
+    while "b7R" not in received and time.monotonic() < deadline:    # Move in flight
+        time.sleep(0.001)
+    position = actor.getValvePosition()
+    stop = actor.hardStop()
+    stop.result(5)
+    with pytest.raises(RuntimeError, match="hardStop"):
+        move.result(5)
+    position.result(5)
+    commands = [body for body in received if not body.startswith("?9200")]
+    assert commands.index("T") < commands.index("?6")   # The hard stop ran before the queued query
@@ -0,0 +1,32 @@
+import pytest
+
+from amfTools import AnswerReader
+
+
+@pytest.mark.parametrize("mode", [1, 2])
+def test_completionReported(valve, received, mode):
+    amf, virtual = valve
+    amf.setAnswerMode(mode)
+    received.clear()
+    amf.valveShortestPath(9, block=False)
+    assert amf.getValvePosition() is not None   # Immediate answer, while the completion is pending
+    amf.waitForCompletion(timeout=5)
+    assert virtual.position == 9 and not virtual.isBusy()
+    assert "?9200" not in received and "Q" not in received     # Not polled
+    assert amf.answerReader.unsolicited == 0
+    amf.setAnswerMode(0)
+    assert amf.answerReader is None
+
+
+def test_blockingMoveInAnswerMode(valve):
+    amf, virtual = valve
+    amf.setAnswerMode(1)
+    amf.valveShortestPath(4)
+    assert virtual.position == 4 and not virtual.isBusy()
+    assert amf.getValvePosition() == 4
+    amf.setAnswerMode(0)
+
+
+def test_subcommandCount():
+    assert AnswerReader.subcommandCount("b3M100b5R") == 3
+    assert AnswerReader.subcommandCount("gb3b5G2R") is None     # Depends on the repeats
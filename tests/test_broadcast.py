@@ -0,0 +1,25 @@
+import pytest
+
+from amfTools import BroadcastGroup
+from conftest import recordCommands
+
+
+def test_broadcastStart(rs485):
+    (first, second, other), (virtualFirst, virtualSecond, virtualOther) = rs485
+    group = BroadcastGroup([first, second])
+    group.home(timeout=10)
+    received = [recordCommands(virtual) for virtual in (virtualFirst, virtualSecond, virtualOther)]
+    durations = group.valveShortestPath({first: 3, "2": 5}, timeout=10)
+    assert set(durations) == {"1", "2"}
+    assert (virtualFirst.position, virtualSecond.position) == (3, 5)
+    # Each move is stored without its R, then one broadcast R starts both
+    assert [body for body in received[0] if not body.startswith("?")] == ["b3", "R"]
+    assert [body for body in received[1] if not body.startswith("?")] == ["b5", "R"]
+    assert received[2] == []    # Other bus untouched
+    assert first.lastActionTime == second.lastActionTime == group.lastTriggerTime
+
+
+def test_groupOnOneBus(rs485):
+    (first, second, other), _ = rs485
+    with pytest.raises(ValueError):
+        BroadcastGroup([first, other])
@@ -0,0 +1,40 @@
+import threading
+
+from amfTools import SerialBus
+
+
+def test_busSharedByItsProducts(rs485):
+    (first, second, other), _ = rs485
+    assert first.bus is second.bus and first.bus.refCount == 2
+    assert first.transactionLock() is second.transactionLock()
+    assert other.bus is not first.bus
+    assert other.transactionLock() is not first.transactionLock()   # Independent buses work in parallel
+
+
+def test_concurrentQueriesOnOneBus(rs485):
+    amfs, virtuals = rs485
+    for position, virtual in zip((3, 5, 2), virtuals):
+        with virtual.lock:
+            virtual.position = position
+    results = {id(amf): [] for amf in amfs}
+
+    def query(amf):
+        for _ in range(10):
+            results[id(amf)].append(amf.getValvePosition())
+
+    threads = [threading.Thread(target=query, args=(amf,)) for amf in amfs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [set(results[id(amf)]) for amf in amfs] == [{3}, {5}, {2}]  # No answer went to another product
+
+
+def test_busClosedWithLastProduct(rs485):
+    (first, second, other), _ = rs485
+    port = first.serialPort
+    first.disconnect()
+    assert SerialBus.get(port) is second.bus and second.bus.refCount == 1
+    assert second.getValvePosition() is not None
+    second.disconnect()
+    assert SerialBus.get(port) is None
@@ -0,0 +1,41 @@
+def configurationWrites(received):
+    return [body for body in received if body.startswith("!")]
+
+
+def test_syncConfigurationIdempotent(valve, received):
+    amf, virtual = valve
+    assert amf.syncConfiguration(portnumber=8, stopOnMiddle=1) == ["portnumber=8", "stopOnMiddle=1"]
+    assert configurationWrites(received) == ["!808", "!81"]
+    assert virtual.portnumber == 8 and virtual.stopOnMiddle == 1
+    received.clear()
+    assert amf.syncConfiguration(portnumber=8, stopOnMiddle=1) == []
+    assert configurationWrites(received) == []
+    assert "?80" not in received    # Written by this object: known
+    assert amf.getConfigFingerprint() == "portnumber=8;stopOnMiddle=1"
+
+
+def test_syncConfigurationUnreadableState(valve, received):
+    amf, virtual = valve
+    handle = virtual.handle
+
+    def noStopOnMiddleQuery(command, now=None):
+        if command == "?80":
+            handle(command, now)    # Recorded, its answer replaced
+            virtual.errorCode = virtual.ERROR_INVALID_COMMAND
+            return handle("Q", now)[0]  # Status byte only, no data
+        return handle(command, now)
+
+    virtual.handle = noStopOnMiddleQuery
+    assert amf.getStopOnMiddle() is None
+    assert received.count("?80") == 1   # An error answer is not asked again
+    assert amf.syncConfiguration(stopOnMiddle=1) == ["stopOnMiddle=1"]
+    assert configurationWrites(received) == ["!81"]
+    assert "stopOnMiddle=1" in amf.getConfigFingerprint()    # Recorded for the next launch
+
+
+def test_syncConfigurationFromFingerprint(valve, received):
+    amf, virtual = valve
+    amf.loadConfigFingerprint("portnumber=12;stopOnMiddle=1")   # As recorded at an earlier launch
+    assert amf.syncConfiguration(portnumber=12, stopOnMiddle=1) == []
+    assert configurationWrites(received) == []
+    assert "?80" not in received
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+from serial.tools.list_ports_common import ListPortInfo
+
+import amfTools
+from amfTools.simulator import AMFSimulator, VirtualRVM
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="The AMF simulator needs pseudo-terminals")
+
+
+def portInfo(vid=None, description="n/a", manufacturer=None):
+    info = ListPortInfo("/dev/ttyTEST0", skip_link_detection=True)
+    info.vid, info.description, info.manufacturer = vid, description, manufacturer
+    return info
+
+
+def test_candidatePorts():
+    assert amfTools.util.isCandidatePort(portInfo(0x0403, "FT230X Basic UART", "FTDI"))
+    assert amfTools.util.isCandidatePort(portInfo(None, "ttyS0"))   # Native RS232
+    assert not amfTools.util.isCandidatePort(portInfo(0x046D, "USB Receiver", "Logitech"))
+    assert not amfTools.util.isCandidatePort(portInfo(None, "Standard Serial over Bluetooth link"))
+
+
+def test_usbPortsProbedInParallel():
+    with AMFSimulator.withValves(3, timeScale=0.2) as sim:
+        devices = amfTools.util.getProductList("USB", port=sim.ports(), silent_mode=True)
+        assert [device.comPort for device in devices] == sim.ports()     # Port order kept
+        assert [device.serialnumber for device in devices] == [valve.serialNumber for valve in sim.devices()]
+
+
+def test_rs485ScanStopsAfterSilentAddresses(monkeypatch):
+    sim = AMFSimulator(timeScale=0.2)
+    valves = [VirtualRVM(f"SIM000{address}", 6, productAddress=address) for address in "12"]
+    for valve in valves:
+        valve.connectionMode = "RS485"
+    sim.addBus(valves)
+    probed = []
+    connect = amfTools.AMF.connect
+
+    def recording(self, *args, **kwargs):
+        probed.append(self.productAddress)
+        return connect(self, *args, **kwargs)
+
+    monkeypatch.setattr(amfTools.AMF, "connect", recording)
+    with sim:
+        devices = amfTools.util.getProductList("RS485", port=sim.ports(), silent_mode=True)
+        assert sorted(device.productAddress for device in devices) == ["1", "2"]
+        silent = [str(address) for address in range(3, 3 + amfTools.util.MAX_SILENT_ADDRESSES)]
+        assert probed[-(len(silent) + 2):] == ["1", "2"] + silent
+        probed.clear()
+        amfTools.util.getProductList("RS485", port=sim.ports(), address_list=["1", "3", "4", "5", "9"], silent_mode=True)
+        assert probed[-5:] == ["1", "3", "4", "5", "9"]   # Explicit addresses are all probed
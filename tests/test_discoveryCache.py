@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+import amfValveControl
+from conftest import virtualValve
+
+
+@pytest.fixture
+def scans(monkeypatch):
+    """
+    Port lists given to the full discovery scan of amfValveControl
+    """
+    calls = []
+    getValveList = amfValveControl.amfValveControl.getValveList
+
+    def recording(ports=None):
+        calls.append(ports)
+        return getValveList(ports)
+
+    monkeypatch.setattr(amfValveControl.amfValveControl, "getValveList", staticmethod(recording))
+    return calls
+
+
+def launch():
+    vc = amfValveControl.amfValveControl()
+    vc.close()
+    return vc
+
+
+def test_cacheHit(simulatedValves, scans):
+    first = launch()
+    assert len(scans) == 1      # No cache yet: full scan
+    with open(first.cacheFilePath) as f:
+        cache = json.load(f)
+    assert set(cache) == set(first.serialMap.values())
+    assert all(entry['uniqueID'] and entry['config'] for entry in cache.values())
+    scans.clear()
+    second = launch()
+    assert scans == []          # Every valve answered at its cached port
+    assert {label: device.comPort for label, device in second.valves.items()} == \
+           {label: device.comPort for label, device in first.valves.items()}
+
+
+def test_cacheMissScansOnlyMissingValve(simulatedValves, scans):
+    first = launch()
+    valve = virtualValve(first, simulatedValves, "A")
+    simulatedValves.unplug(valve)
+    newPort = simulatedValves.replug(valve)     # Back under another port name
+    scans.clear()
+    second = launch()
+    assert len(scans) == 1 and newPort in scans[0]
+    assert not set(scans[0]) & (set(simulatedValves.ports()) - {newPort})  # The other valves were verified, not scanned
+    assert second.valves["A"].comPort == newPort
+    with open(second.cacheFilePath) as f:
+        assert json.load(f)[second.serialMap["A"]]['comPort'] == newPort
@@ -0,0 +1,59 @@
+import pytest
+
+from amfTools import FrameReader, Response
+
+
+def test_responseFields():
+    response = Response(b"/0`12\x03\r\n")
+    assert response.ready
+    assert response.errorCode == 0
+    assert response.data == "12"
+    assert response.integer == 12
+
+
+def test_responseNegativeInteger():
+    assert Response(b"/0`-250\x03\r\n").integer == -250
+
+
+def test_responseWithoutNumber():
+    with pytest.raises(ValueError):
+        Response(b"/0`fast mode\x03\r\n").integer
+
+
+def test_responseError():
+    response = Response(b"/0b\x03\r\n")
+    assert response.errorCode == 2
+    assert response.data == ""
+
+
+def test_frameSplitAcrossReads():
+    reader = FrameReader(None)
+    reader.append(b"/0`1")
+    assert reader.extract() is None
+    reader.append(b"2\x03\r")
+    assert reader.extract().integer == 12
+    reader.append(b"\n")
+    assert reader.extract() is None
+
+
+def test_framesConcatenated():
+    reader = FrameReader(None)
+    reader.append(b"/0`1\x03\r\n/0@\x03\r\n/0`-3\x03")
+    assert reader.extract().integer == 1
+    assert not reader.extract().ready
+    assert reader.extract() is None
+    reader.append(b"\r\n")
+    assert reader.extract().integer == -3
+    assert reader.length == 0
+
+
+def test_frameAfterNoise():
+    reader = FrameReader(None)
+    reader.append(b"\x00\n/0`7\x03\r\n")
+    assert reader.extract().integer == 7
+
+
+def test_frameBufferGrows():
+    reader = FrameReader(None, size=8)
+    reader.append(b"/0`" + b"9" * 40 + b"\x03\r\n")
+    assert reader.extract().data == "9" * 40
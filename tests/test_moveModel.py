@@ -0,0 +1,31 @@
+import time
+
+from amfTools import MoveTimeModel
+
+
+def samples(amf):
+    return list(amf.moveTimeModel.samples.get((amf.portnumber, amf.valveSpeed), ()))
+
+
+def test_doneAtFirstPollNotLearnt(valve):
+    amf, _ = valve
+    amf.valveShortestPath(2, block=False)
+    time.sleep(1.0)     # Certainly done before the first poll
+    amf.pullAndWait()
+    assert amf.valvePosition == 2
+    assert samples(amf) == []
+
+
+def test_bracketedMovesCalibrate(valve):
+    amf, virtual = valve
+    for i in range(MoveTimeModel.MIN_SAMPLES + 1):
+        target = 7 if i % 2 == 0 else 1
+        amf.valveShortestPath(target, block=False)
+        start = amf.lastActionTime
+        with virtual.lock:
+            motorStop = virtual.currentEnd
+        amf.pullAndWait()
+        assert time.monotonic() - motorStop < 0.1      # Polled densely from the start, not every 200 ms
+        learnt = samples(amf)[-1][1]
+        assert abs(learnt - (motorStop - start)) < 0.05
+    assert amf.moveTimeModel.predict(6, amf.portnumber, amf.valveSpeed) is not None
@@ -0,0 +1,134 @@
+import time
+
+import pytest
+
+import amfTools
+from amfTools import CircuitBreaker, CircuitOpenError, TransactionPolicy
+
+
+def test_breakerOpensAfterThreshold():
+    breaker = CircuitBreaker(failureThreshold=2, resetTime=10)
+    breaker.check()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_breakerSuccessResetsCount():
+    breaker = CircuitBreaker(failureThreshold=2, resetTime=10)
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breakerHalfOpenTrial():
+    breaker = CircuitBreaker(failureThreshold=1, resetTime=0.05)
+    breaker.failure()
+    time.sleep(0.06)
+    breaker.check()     # The trial transaction goes through
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.check()     # Only one trial at a time
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    time.sleep(0.06)
+    breaker.check()
+    breaker.success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.check()
+
+
+def test_policyPerProduct(valve):
+    amf, virtual = valve
+    assert amf.policy is not amfTools.AMF.policy
+    assert amf.policy.attemptTimeout is None    # The response and serial timeouts apply
+    assert amf.answerTimeout() == max(amf.responseTimeout, amf.serialTimeout)
+
+
+def test_queryRetried(valve, received):
+    amf, virtual = valve
+    amf.policy.attemptTimeout = 0.1
+    position = amf.getValvePosition()
+    received.clear()
+    virtual.dropAnswers = 1
+    assert amf.getValvePosition() == position
+    assert received == ["?6", "?6"]
+
+
+def test_garbledAnswerRetried(valve, received):
+    amf, virtual = valve
+    position = amf.getValvePosition()
+    received.clear()
+    virtual.garbleAnswers = 1
+    assert amf.getValvePosition() == position
+    assert received == ["?6", "?6"]
+
+
+def test_errorAnswerNotRetried(valve, received):
+    amf, virtual = valve
+    with pytest.raises(ValueError):
+        amf.send(amf.prepareCommand("?9999", customCmd=True), integer=True, force_ans=True)
+    assert received == ["?9999"]
+    assert amf.getCircuitBreaker().failures == 0
+
+
+def test_oneFailurePerCall(valve, received):
+    amf, virtual = valve
+    amf.policy = TransactionPolicy(attemptTimeout=0.05, failureThreshold=2, resetTime=10)
+    amf.circuitBreaker = None
+    amfTools.AMF.circuitBreakers.clear()
+    virtual.dropAnswers = 3
+    with pytest.raises(ConnectionError):
+        amf.getValvePosition()
+    assert received == ["?6"] * 3   # All the attempts of the call went out
+    assert amf.getCircuitBreaker().failures == 1
+    assert amf.getCircuitBreaker().state == CircuitBreaker.CLOSED
+
+
+def test_pullAndWaitCountsOpenBreaker(valve):
+    amf, virtual = valve
+    amf.policy = TransactionPolicy(queryRetries=0, attemptTimeout=0.05, failureThreshold=1, resetTime=10)
+    amf.circuitBreaker = None
+    amfTools.AMF.circuitBreakers.clear()
+    amf.valveShortestPath(3, block=False)
+    virtual.offline = True
+    with pytest.raises(CircuitOpenError):
+        amf.pullAndWait(warning_error=False)
+
+
+def test_actionSentOnce(valve, received):
+    amf, virtual = valve
+    amf.policy.attemptTimeout = 0.1
+    virtual.dropAnswers = 1
+    with pytest.raises(ConnectionError):
+        amf.valveShortestPath(3, block=False)
+    assert [body for body in received if not body.startswith("?")] == ["b3R"]
+    amf.pullAndWait()
+    assert amf.getValvePosition() == 3
+
+
+def test_breakerFailsFast(valve, received):
+    amf, virtual = valve
+    amf.policy = TransactionPolicy(queryRetries=0, attemptTimeout=0.05, callTimeout=0.2, failureThreshold=2, resetTime=0.3)
+    amf.circuitBreaker = None
+    amfTools.AMF.circuitBreakers.clear()
+    virtual.offline = True
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            amf.getValvePosition()
+    received.clear()
+    start = time.monotonic()
+    with pytest.raises(CircuitOpenError):
+        amf.getValvePosition()
+    assert time.monotonic() - start < 0.05
+    assert received == []   # Nothing was sent
+    virtual.offline = False
+    time.sleep(0.35)
+    assert amf.getValvePosition() == 1
+    assert amf.getCircuitBreaker().state == CircuitBreaker.CLOSED
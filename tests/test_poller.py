@@ -0,0 +1,53 @@
+import threading
+import time
+
+import pytest
+
+from amfTools import StatusPoller
+
+
+@pytest.fixture
+def poller():
+    poller = StatusPoller()
+    try:
+        yield poller
+    finally:
+        poller.stop()
+
+
+def test_waitForMove(valve, poller):
+    amf, virtual = valve
+    events = []
+    poller.subscribe(lambda event, product, status: events.append(event))
+    amf.valveShortestPath(7, block=False)
+    status = poller.waitForMove(amf, timeout=5)
+    assert not status.busy and status.error is None
+    assert status.position == 7
+    assert status.queryTime > amf.lastActionTime
+    assert "moveDone" in events
+
+
+def test_waitReportsError(valve, poller):
+    amf, virtual = valve
+    with virtual.lock:
+        virtual.valveStatus = 224   # Blocked
+    with pytest.raises(Exception, match="Blocked"):
+        poller.waitForMove(amf, timeout=5, after=0.0)
+
+
+def test_idleProductNotPolled(valve, poller, received):
+    amf, virtual = valve
+    poller.waitForMove(amf, timeout=5, after=0.0)
+    received.clear()
+    time.sleep(0.5)
+    assert received == []   # Done and not waited on: left alone
+
+
+def test_unwaitedMoveNoticed(valve, poller):
+    amf, virtual = valve
+    poller.waitForMove(amf, timeout=5, after=0.0)
+    done = threading.Event()
+    poller.subscribe(lambda event, product, status: event == "moveDone" and done.set())
+    amf.valveShortestPath(4, block=False)
+    assert done.wait(2)
+    assert poller.status(amf).position == 4
@@ -0,0 +1,50 @@
+import json
+import time
+
+import pytest
+
+from conftest import virtualValve
+
+
+def waitUntil(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Condition not met in time")
+        time.sleep(0.02)
+
+
+def test_replugRecovery(controller):
+    vc, sim = controller
+    vc.deviceMonitor.interval = 0.1
+    messages = []
+    vc.status_callback = messages.append
+    vc.setValvePorts({"A": 3, "B": 5}).wait(10)
+    valve = virtualValve(vc, sim, "A")
+    sim.unplug(valve)
+    waitUntil(lambda: "A" in vc.offlineValves)
+    with pytest.raises(ConnectionError):
+        vc.setValvePorts({"A": 4}).wait(5)
+    port = sim.replug(valve)
+    waitUntil(lambda: any(message.startswith(f"A recovered on {port} at port 3") for message in messages))
+    handle = vc.setValvePorts({"A": 6, "B": 2})
+    handle.wait(10)
+    assert handle.positions == {"A": 6, "B": 2}
+    with open(vc.cacheFilePath) as f:
+        assert json.load(f)[vc.serialMap["A"]]['comPort'] == port
+
+
+def test_replugAfterPowerCut(controller):
+    vc, sim = controller
+    vc.deviceMonitor.interval = 0.1
+    messages = []
+    vc.status_callback = messages.append
+    valve = virtualValve(vc, sim, "C")
+    sim.unplug(valve)
+    waitUntil(lambda: "C" in vc.offlineValves)
+    with valve.lock:
+        valve.position = 0      # Lost its homing
+    sim.replug(valve)
+    waitUntil(lambda: any(message.startswith("C recovered on") for message in messages))
+    assert valve.position == 1
+    assert vc.setValvePorts({"C": 7}).wait(10)
@@ -0,0 +1,54 @@
+import pytest
+
+from amfTools import CommandSequence, MoveTimeModel
+
+
+def calibratedModel():
+    model = MoveTimeModel()
+    for distance in (1, 2, 3):
+        model.record(distance, 12, "Fast", 0.1 + 0.05 * distance)
+    return model
+
+
+def test_sequenceNestedLoops():
+    seq = (CommandSequence(12).shortestPath(2)
+           .beginLoop().beginLoop().delay(100).endLoop(3).shortestPath(3).shortestPath(2).endLoop(2))
+    assert seq.build() == "b2ggM100G3b3b2G2R"
+    assert len(seq) == len(seq.build())
+    assert seq.finalTarget() == 2
+    # 1 -> 2, then twice (3 x 100 ms, 2 -> 3, 3 -> 2): one-position moves of 0.15 s
+    assert seq.predictDuration(1, 12, calibratedModel(), "Fast") == pytest.approx(0.15 + 2 * (0.3 + 0.15 + 0.15))
+
+
+def test_sequenceEndlessLoopNotPredicted():
+    seq = CommandSequence(12).beginLoop().shortestPath(2).shortestPath(1).endLoop(0)
+    assert seq.predictDuration(1, 12, calibratedModel(), "Fast") is None
+
+
+def test_sequenceUncalibratedNotPredicted():
+    assert CommandSequence(12).shortestPath(4).predictDuration(1, 12, MoveTimeModel(), "Fast") is None
+
+
+def test_sequenceLengthLimit():
+    seq = CommandSequence(12)
+    with pytest.raises(ValueError):
+        while True:
+            seq.delay(1000)
+    assert len(seq) <= CommandSequence.MAX_LENGTH
+    assert len(seq.build()) == len(seq)
+
+
+def test_sequenceLoopChecks():
+    seq = CommandSequence(12)
+    for _ in range(CommandSequence.MAX_LOOP_DEPTH):
+        seq.beginLoop()
+    with pytest.raises(ValueError):
+        seq.beginLoop()
+    with pytest.raises(ValueError):
+        seq.build()     # Loops not closed
+    with pytest.raises(ValueError):
+        CommandSequence(12).endLoop(2)
+    with pytest.raises(ValueError):
+        CommandSequence(12).shortestPath(13)
+    with pytest.raises(ValueError):
+        CommandSequence(12).build()
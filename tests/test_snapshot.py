@@ -0,0 +1,44 @@
+import json
+
+from amfTools import SnapshotCache
+
+STATIC_QUERIES = ("?9000", "?23", "?26")    # Unique ID, firmware version, address
+
+
+def test_staticFieldsCached(valve, received, tmp_path):
+    amf, virtual = valve
+    path = str(tmp_path / "snapshot_cache.json")
+    first = amf.getSnapshot(cache=SnapshotCache(path))
+    assert not first.fromCache and not first.errors
+    assert all(query in received for query in STATIC_QUERIES)
+    received.clear()
+    second = amf.getSnapshot(cache=SnapshotCache(path))     # As at the next launch
+    assert second.fromCache
+    assert second.static == first.static
+    assert "?20" in received    # The firmware checksum validates the entry
+    assert not any(query in received for query in STATIC_QUERIES)
+
+
+def test_firmwareChangeInvalidates(valve, received, tmp_path):
+    amf, virtual = valve
+    path = str(tmp_path / "snapshot_cache.json")
+    amf.getSnapshot(cache=SnapshotCache(path))
+    with open(path) as f:
+        entries = json.load(f)
+    for entry in entries.values():
+        entry['firmwareChecksum'] = "0"
+    with open(path, 'w') as f:
+        json.dump(entries, f)
+    received.clear()
+    assert not amf.getSnapshot(cache=SnapshotCache(path)).fromCache
+    assert "?9000" in received
+
+
+def test_portNumberNeverCached(valve, tmp_path):
+    amf, virtual = valve
+    cache = SnapshotCache(str(tmp_path / "snapshot_cache.json"))
+    assert amf.getSnapshot(cache=cache).dynamic["portNumber"] == 12
+    amf.setPortNumber(8)
+    snapshot = amf.getSnapshot(cache=cache)
+    assert snapshot.fromCache
+    assert snapshot.dynamic["portNumber"] == 8
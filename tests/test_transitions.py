@@ -0,0 +1,74 @@
+import pytest
+
+from conftest import recordCommands, virtualValve
+
+
+def test_transitionBarrier(controller):
+    vc, sim = controller
+    handle = vc.setValvePorts({label: 4 for label in vc.valves})
+    durations = handle.wait(10)
+    assert handle.done()
+    assert set(durations) == set(vc.valves)
+    assert all(valve.position == 4 and not valve.isBusy() for valve in sim.devices())
+    assert handle.elapsed < sum(durations.values())     # The valves moved at the same time
+    assert handle.slowest in vc.valves
+
+
+def test_transitionRaisesValveError(controller):
+    vc, sim = controller
+    handle = vc.setValvePorts({"A": 9, "B": 3})     # A has 8 ports
+    with pytest.raises(ValueError):
+        handle.wait(10)
+    assert handle.done()
+    assert vc.shadowOf("A").confirmed is None   # Position unknown until the next ?6
+
+
+def test_redundantMovesDropped(controller):
+    vc, sim = controller
+    vc.setValvePorts({label: 4 for label in vc.valves}).wait(10)
+    received = [recordCommands(valve) for valve in sim.devices()]
+    handle = vc.setValvePorts({label: 4 for label in vc.valves})
+    assert handle.wait(1) == {}
+    assert sorted(handle.skipped) == sorted(vc.valves)
+    assert received == [[] for _ in received]   # Nothing sent, not even a query
+
+
+def test_shadowReconciled(controller):
+    vc, sim = controller
+    vc.setValvePorts({"A": 4}).wait(10)
+    valve = virtualValve(vc, sim, "A")
+    with valve.lock:
+        valve.position = 7      # Moved behind the controller's back
+    assert vc.reconcileValves() == ["A"]
+    assert vc.shadowOf("A").confirmed == 7
+    handle = vc.setValvePorts({"A": 4})
+    handle.wait(10)
+    assert handle.skipped == [] and valve.position == 4
+
+
+def test_handleConfirmedByPositionQuery(controller):
+    vc, sim = controller
+    valve = virtualValve(vc, sim, "B")
+    received = recordCommands(valve)
+    completed = []
+    handle = vc.setValvePort("B", 7)
+    handle.addDoneCallback(completed.append)
+    durations = handle.wait(10)
+    assert durations["B"] > 0 and handle.positions == {"B": 7}
+    assert received[-1] == "?6"     # Read back once the valve reported done
+    assert completed == [handle]
+
+
+def test_handleRaisesOnWrongPort(controller):
+    vc, sim = controller
+    valve = virtualValve(vc, sim, "B")
+    handle = valve.handle
+
+    def wrongPort(command, now=None):
+        answer = handle(command, now)
+        return answer[0] + "5" if command == "?6" else answer
+
+    valve.handle = wrongPort
+    with pytest.raises(RuntimeError, match="instead of port 2"):
+        vc.setValvePort("B", 2).wait(10)
+    assert vc.shadowOf("B").confirmed is None and not vc.shadowOf("B").moving    # Not trusted: the next move is sent